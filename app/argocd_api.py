@@ -0,0 +1,222 @@
+import base64
+import json
+import threading
+import time
+from concurrent.futures import TimeoutError
+import requests
+from app.logger import LoggerFactory
+from app.exceptions import UpgradeAbortedError
+from app.argocd_watcher import ArgoCDAppWatcher, app_status
+from app import cancellation, tracing
+
+logger = LoggerFactory.get_logger("argocd-api")
+
+# Log in again this long before the session token expires
+TOKEN_REFRESH_MARGIN_SECONDS = 60
+
+APP_FIELDS = (
+    "items.metadata.name,items.metadata.labels,items.status.sync.status,"
+    "items.status.health.status,items.status.operationState.phase,"
+    "items.status.operationState.startedAt"
+)
+
+
+class ArgoCDAPIClient:
+    """
+    ArgoCD API server client over one pooled, authenticated session.
+
+    Same interface as the CLI client (sync_cluster, register_cluster,
+    wait_for_apps_healthy), which stays as the fallback when the API
+    server cannot be reached.
+    """
+
+    def __init__(self, base_url, token=None, username=None, password=None,
+                 session=None, eks=None, role_arn=None, fallback=None,
+                 watch_selector=None, health_timeout_seconds=600):
+        self.base_url = base_url.rstrip("/")
+        self.username = username
+        self.password = password
+        self.http = session or requests.Session()
+        self.eks = eks
+        self.role_arn = role_arn
+        self.fallback = fallback
+        self.health_timeout_seconds = health_timeout_seconds
+        self.watcher = ArgoCDAppWatcher(self, selector=watch_selector)
+
+        # cluster -> {app: operation start before our sync}, for the health wait
+        self._synced = {}
+        self._synced_lock = threading.Lock()
+
+        self._token = token
+        self._token_expires = self._expiry(token) if token else 0
+        self._token_lock = threading.Lock()
+
+    # -------------------------
+    # Auth
+    # -------------------------
+    def _auth_headers(self, refresh=False):
+
+        with self._token_lock:
+            expiring = self._token_expires and self._token_expires - TOKEN_REFRESH_MARGIN_SECONDS < time.time()
+
+            if self.username and (refresh or not self._token or expiring):
+                response = self.http.post(
+                    f"{self.base_url}/api/v1/session",
+                    json={"username": self.username, "password": self.password},
+                    timeout=10
+                )
+                response.raise_for_status()
+                self._token = response.json()["token"]
+                self._token_expires = self._expiry(self._token)
+                logger.info("Logged in to ArgoCD")
+
+            return {"Authorization": f"Bearer {self._token}"}
+
+    @staticmethod
+    def _expiry(token):
+        # Session tokens are JWTs; a missing or unreadable exp means "never"
+        try:
+            payload = token.split(".")[1]
+            payload += "=" * (-len(payload) % 4)
+            return json.loads(base64.urlsafe_b64decode(payload)).get("exp", 0)
+        except (IndexError, ValueError):
+            return 0
+
+    def _request(self, method, path, timeout=30, **kwargs):
+
+        url = f"{self.base_url}{path}"
+        response = self.http.request(method, url, headers=self._auth_headers(), timeout=timeout, **kwargs)
+
+        if response.status_code == 401 and self.username:
+            logger.info("ArgoCD token rejected, logging in again")
+            response.close()
+            response = self.http.request(
+                method, url, headers=self._auth_headers(refresh=True), timeout=timeout, **kwargs
+            )
+
+        return response
+
+    def stream(self, path, params=None, read_timeout=60):
+        """Streaming GET; iterate the response with iter_lines()."""
+        return self._request("GET", path, timeout=(10, read_timeout), params=params, stream=True)
+
+    # -------------------------
+    # Applications
+    # -------------------------
+    def list_app_items(self, selector):
+
+        response = self._request(
+            "GET", "/api/v1/applications",
+            params={"selector": selector, "fields": APP_FIELDS}
+        )
+        response.raise_for_status()
+        return response.json().get("items") or []
+
+    def list_apps(self, selector):
+        """{app name: (sync status, health status)} for apps matching a label selector."""
+
+        return {
+            item["metadata"]["name"]: app_status(item)[1:3]
+            for item in self.list_app_items(selector)
+        }
+
+    def app_health(self, cluster_name):
+        return self.list_apps(f"cluster={cluster_name}")
+
+    @tracing.traced("argocd.sync")
+    def sync_cluster(self, cluster_name):
+        logger.info(f"Syncing all apps for cluster {cluster_name}")
+
+        try:
+            apps = self.list_app_items(f"cluster={cluster_name}")
+        except requests.ConnectionError as e:
+            return self._fall_back("sync_cluster", e, cluster_name)
+
+        synced = {}
+
+        for app in apps:
+            name = app["metadata"]["name"]
+            response = self._request("POST", f"/api/v1/applications/{name}/sync", json={"prune": True})
+
+            if response.status_code == 400 and "already in progress" in response.text:
+                # The running operation is the one to wait for
+                logger.info(f"Sync already running for {name}")
+                continue
+
+            if not response.ok:
+                logger.error(f"ArgoCD Sync failed for {name}! Error: {response.text}")
+                raise Exception(f"Aborting upgrade: Sync failed for {cluster_name}")
+
+            synced[name] = app_status(app)[4]
+
+        with self._synced_lock:
+            self._synced[cluster_name] = synced
+
+        logger.info(f"ArgoCD Sync triggered for {len(apps)} apps")
+
+    @tracing.traced("argocd.health")
+    def wait_for_apps_healthy(self, cluster_name):
+
+        logger.info(f"Waiting for apps healthy on {cluster_name}")
+
+        with self._synced_lock:
+            synced = self._synced.pop(cluster_name, None)
+
+        try:
+            future = self.watcher.wait(cluster_name, synced)
+        except requests.ConnectionError as e:
+            return self._fall_back("wait_for_apps_healthy", e, cluster_name)
+
+        try:
+            return cancellation.current().result(future, timeout=self.health_timeout_seconds)
+        except UpgradeAbortedError:
+            self.watcher.cancel(cluster_name, future)
+            raise
+        except TimeoutError:
+            self.watcher.cancel(cluster_name, future)
+            logger.error(f"Apps on {cluster_name} not healthy after {self.health_timeout_seconds}s")
+            return False
+
+    # -------------------------
+    # Clusters
+    # -------------------------
+    @tracing.traced("argocd.register")
+    def register_cluster(self, cluster_name, labels):
+
+        if self.eks is None:
+            return self._fall_back("register_cluster", "no EKS service to look up the endpoint",
+                                   cluster_name, labels)
+
+        cluster = self.eks.describe_cluster(cluster_name)
+        if not cluster:
+            raise Exception(f"EKS cluster {cluster_name} not found")
+
+        aws_auth = {"clusterName": cluster_name}
+        if self.role_arn:
+            aws_auth["roleARN"] = self.role_arn
+
+        body = {
+            "name": cluster_name,
+            "server": cluster["endpoint"],
+            "labels": labels,
+            "config": {
+                "awsAuthConfig": aws_auth,
+                "tlsClientConfig": {"caData": cluster["certificateAuthority"]["data"]}
+            }
+        }
+
+        try:
+            response = self._request("POST", "/api/v1/clusters", params={"upsert": "true"}, json=body)
+        except requests.ConnectionError as e:
+            return self._fall_back("register_cluster", e, cluster_name, labels)
+
+        response.raise_for_status()
+        logger.info(f"Registered {cluster_name} in ArgoCD with labels {labels}")
+
+    def _fall_back(self, method, reason, *args):
+
+        if self.fallback is None:
+            raise Exception(f"ArgoCD API unavailable for {method}: {reason}")
+
+        logger.warning(f"ArgoCD API unavailable ({reason}), using CLI for {method}")
+        return getattr(self.fallback, method)(*args)
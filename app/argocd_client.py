@@ -1,8 +1,11 @@
 import subprocess
-import time
 from app.logger import LoggerFactory
+from app import cancellation, tracing
+
+logger = LoggerFactory.get_logger("argocd")
 
 class ArgoCDCLient:
+    @tracing.traced("argocd.sync")
     def sync_cluster(self, cluster_name):
         logger.info(f"Syncing all apps for cluster {cluster_name}")
 
@@ -24,20 +27,21 @@ class ArgoCDCLient:
             # Since this is a Blue-Green strategy, we MUST stop if this fails
             raise Exception(f"Aborting upgrade: Sync failed for {cluster_name}")
 
+    @tracing.traced("argocd.register")
     def register_cluster(self, cluster_name, labels):
 
-        label_args = []
+        cmd = ["argocd", "cluster", "add", cluster_name, "--yes"]
         for k, v in labels.items():
-            label_args.append(f"--label {k}={v}")
+            cmd += ["--label", f"{k}={v}"]
 
-        cmd = f"argocd cluster add {cluster_name} {' '.join(label_args)}"
-        subprocess.run(cmd, shell=True, check=True)
+        subprocess.run(cmd, check=True)
 
+    @tracing.traced("argocd.health")
     def wait_for_apps_healthy(self, cluster_name):
 
         logger.info(f"Waiting for apps healthy on {cluster_name}")
 
         # Placeholder
         # In production use argocd API to check health
-        time.sleep(30)
+        cancellation.current().sleep(30)
         return True
\ No newline at end of file
@@ -0,0 +1,200 @@
+import json
+import threading
+import time
+from concurrent.futures import Future
+import requests
+from app.logger import LoggerFactory
+
+logger = LoggerFactory.get_logger("argocd-watcher")
+
+# Operation phases that mean a sync is still being applied / has failed
+RUNNING_PHASES = ("Running", "Terminating")
+FAILED_PHASES = ("Failed", "Error")
+
+
+def app_status(app):
+    """(cluster label, sync, health, operation phase, operation start) of an Application."""
+
+    status = app.get("status") or {}
+    operation = status.get("operationState") or {}
+    return (
+        (app["metadata"].get("labels") or {}).get("cluster"),
+        (status.get("sync") or {}).get("status"),
+        (status.get("health") or {}).get("status"),
+        operation.get("phase"),
+        operation.get("startedAt")
+    )
+
+
+class ArgoCDAppWatcher:
+    """
+    Resolves every cluster waiting on ArgoCD health from one application
+    watch stream.
+
+    A waiter is seeded with a single list call and then driven by stream
+    events, so it resolves as soon as all of its cluster's apps are
+    Synced/Healthy and fails on the first Degraded app or failed sync,
+    however many clusters are waiting.
+
+    Apps the caller just synced only count once ArgoCD reports an
+    operation other than the one they had before the sync (by
+    operationState.startedAt); until then their status is the previous
+    sync's. A cluster with no apps yet is not ready.
+    """
+
+    def __init__(self, client, selector=None, read_timeout=60, reconnect_seconds=5):
+        self.client = client
+        self.selector = selector
+        self.read_timeout = read_timeout
+        self.reconnect_seconds = reconnect_seconds
+
+        self._lock = threading.Lock()
+        self._apps = {}
+        self._waiters = {}
+        self._thread = None
+
+    def wait(self, cluster_name, synced=None) -> Future:
+        """
+        Returns a future resolving to True (all healthy) or False
+        (degraded). synced maps app name -> operation start before the
+        sync was requested, for apps whose new operation must be waited for.
+        """
+
+        seed = self.client.list_app_items(f"cluster={cluster_name}")
+        future = Future()
+
+        with self._lock:
+            for app in seed:
+                # The stream's copy, if any, is at least as recent
+                self._apps.setdefault(app["metadata"]["name"], app_status(app))
+
+            self._waiters.setdefault(cluster_name, []).append((future, synced or {}))
+
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._loop,
+                    name="argocd-watcher",
+                    daemon=True
+                )
+                self._thread.start()
+
+        logger.info(f"Watching ArgoCD apps for {cluster_name}")
+        self._evaluate(cluster_name)
+        return future
+
+    def cancel(self, cluster_name, future):
+        with self._lock:
+            waiters = [w for w in self._waiters.get(cluster_name, []) if w[0] is not future]
+            self._waiters[cluster_name] = waiters
+            if not waiters:
+                self._waiters.pop(cluster_name, None)
+
+    def pending(self):
+        with self._lock:
+            return sum(len(w) for w in self._waiters.values())
+
+    def _loop(self):
+
+        while True:
+            try:
+                self._stream()
+            except requests.ConnectionError as e:
+                # Includes read timeouts; a quiet stream with nobody
+                # waiting is how the watcher winds down between runs.
+                logger.info(f"ArgoCD watch stream closed: {e}")
+            except Exception as e:
+                logger.warning(f"ArgoCD watch stream failed, reconnecting: {e}")
+                time.sleep(self.reconnect_seconds)
+
+            with self._lock:
+                if not self._waiters:
+                    # Nothing to keep fresh; the next wait() reseeds
+                    self._apps.clear()
+                    self._thread = None
+                    return
+
+    def _stream(self):
+
+        params = {"selector": self.selector} if self.selector else None
+
+        with self.client.stream("/api/v1/stream/applications", params, self.read_timeout) as response:
+            response.raise_for_status()
+
+            # chunk_size=None hands over each event as soon as it arrives
+            for line in response.iter_lines(chunk_size=None):
+                if not line:
+                    continue
+
+                event = json.loads(line).get("result") or {}
+                app = event.get("application")
+                if app:
+                    self._apply(event.get("type"), app)
+
+    def _apply(self, event_type, app):
+
+        name = app["metadata"]["name"]
+
+        with self._lock:
+            previous = self._apps.pop(name, None)
+            if event_type != "DELETED":
+                self._apps[name] = app_status(app)
+
+        cluster = app_status(app)[0]
+        self._evaluate(cluster)
+
+        if previous and previous[0] != cluster:
+            self._evaluate(previous[0])
+
+    def _evaluate(self, cluster_name):
+
+        with self._lock:
+            if cluster_name not in self._waiters:
+                return
+
+            apps = {
+                name: status for name, status in self._apps.items()
+                if status[0] == cluster_name
+            }
+
+            decided, waiting = [], []
+            for future, synced in self._waiters[cluster_name]:
+                outcome = self._outcome(apps, synced)
+                (waiting if outcome is None else decided).append((future, synced, outcome))
+
+            if not decided:
+                return
+
+            self._waiters[cluster_name] = [(future, synced) for future, synced, _ in waiting]
+            if not waiting:
+                del self._waiters[cluster_name]
+
+        for future, _, (healthy, detail) in decided:
+            if healthy:
+                logger.info(f"All {len(apps)} apps Synced/Healthy on {cluster_name}")
+            else:
+                logger.error(f"Degraded apps on {cluster_name}: {detail}")
+            future.set_result(healthy)
+
+    @staticmethod
+    def _outcome(apps, synced):
+        """(healthy, detail) once decided; None while still waiting."""
+
+        if not apps:
+            return None
+
+        # Still showing the operation from before the sync
+        stale = {name for name, status in apps.items() if name in synced and status[4] == synced[name]}
+        current = {name: status for name, status in apps.items() if name not in stale}
+
+        failed = [
+            name for name, (_, _, health, phase, _) in current.items()
+            if health == "Degraded" or phase in FAILED_PHASES
+        ]
+        if failed:
+            return False, ", ".join(sorted(failed))
+
+        healthy = not stale and all(
+            sync == "Synced" and health == "Healthy" and phase not in RUNNING_PHASES
+            for _, sync, health, phase, _ in current.values()
+        )
+        return (True, None) if healthy else None
@@ -0,0 +1,165 @@
+import re
+import time
+from app.logger import LoggerFactory
+from app.exceptions import ValidationError
+from app.services.metrics_service import PrometheusClient
+from app import cancellation
+
+logger = LoggerFactory.get_logger("bake")
+
+# Per-cluster health signals; $clusters becomes a regex of the baked clusters
+DEFAULT_QUERIES = {
+    "error_rate": (
+        'sum by (cluster) (rate(http_requests_total{cluster=~"$clusters",code=~"5.."}[5m]))'
+        ' / sum by (cluster) (rate(http_requests_total{cluster=~"$clusters"}[5m]))'
+    ),
+    "pod_restarts": (
+        'sum by (cluster) (increase(kube_pod_container_status_restarts_total{cluster=~"$clusters"}[5m]))'
+    ),
+    "nodes_not_ready": (
+        'sum by (cluster) (kube_node_status_condition{cluster=~"$clusters",condition="Ready",status!="true"})'
+    )
+}
+
+# A signal above its threshold on any cluster is unhealthy
+DEFAULT_THRESHOLDS = {
+    "error_rate": 0.01,
+    "pod_restarts": 5,
+    "nodes_not_ready": 0
+}
+
+# Unhealthy signals that fail the bake at once; the others (e.g. nodes still
+# joining) only hold the bake open until max_seconds
+DEFAULT_ABORT_SIGNALS = ["error_rate", "pod_restarts"]
+
+
+class FixedBake:
+    """Waits a fixed number of seconds."""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+    def bake(self, stage, clusters):
+        logger.info(f"Baking after {stage} for {self.seconds} seconds...")
+        cancellation.current().sleep(self.seconds)
+        logger.info("Bake complete")
+
+
+class MetricGatedBake:
+    """
+    Bakes until the just-upgraded clusters have looked healthy for
+    stable_polls consecutive polls (but at least min_seconds). A breached
+    abort signal fails the bake immediately; any other unhealthy signal
+    still present at max_seconds fails it then.
+
+    All signals for all clusters are fetched in a single query per poll.
+    A cluster missing a signal (it stopped reporting) counts as unhealthy:
+    the bake cannot pass on it and fails at max_seconds if it never shows.
+    """
+
+    def __init__(self, prometheus, min_seconds=60, max_seconds=600, poll_seconds=15,
+                 stable_polls=3, thresholds=None, queries=None, abort_signals=None,
+                 cluster_label="cluster"):
+
+        self.prometheus = prometheus
+        self.min_seconds = min_seconds
+        self.max_seconds = max_seconds
+        self.poll_seconds = poll_seconds
+        self.stable_polls = stable_polls
+        self.thresholds = {**DEFAULT_THRESHOLDS, **(thresholds or {})}
+        self.queries = {**DEFAULT_QUERIES, **(queries or {})}
+        self.abort_signals = set(abort_signals or DEFAULT_ABORT_SIGNALS)
+        self.cluster_label = cluster_label
+
+    @classmethod
+    def from_config(cls, bake_config, session=None):
+        return cls(
+            prometheus=PrometheusClient(bake_config["prometheus_url"], session=session),
+            min_seconds=bake_config.get("min_seconds", 60),
+            max_seconds=bake_config.get("max_seconds", 600),
+            poll_seconds=bake_config.get("poll_seconds", 15),
+            stable_polls=bake_config.get("stable_polls", 3),
+            thresholds=bake_config.get("thresholds"),
+            queries=bake_config.get("queries"),
+            abort_signals=bake_config.get("abort_signals"),
+            cluster_label=bake_config.get("cluster_label", "cluster")
+        )
+
+    def signals(self):
+        return [signal for signal in self.queries if signal in self.thresholds]
+
+    def batched_query(self, clusters):
+        """One PromQL expression returning every signal, tagged by a signal label."""
+
+        # Backslashes from re.escape must themselves be escaped in PromQL strings
+        regex = "|".join(re.escape(c.name).replace("\\", "\\\\") for c in clusters)
+
+        return " or ".join(
+            f'label_replace({self.queries[signal].replace("$clusters", regex)}, "signal", "{signal}", "", "")'
+            for signal in self.signals()
+        )
+
+    def unhealthy(self, clusters):
+        """
+        [(signal, description), ...] for every threshold breach, and a
+        ("no_data", ...) entry for every cluster and signal with no sample.
+        """
+
+        breaches = []
+        reported = set()
+
+        for labels, value in self.prometheus.query(self.batched_query(clusters)):
+            signal = labels.get("signal")
+            threshold = self.thresholds.get(signal)
+            cluster = labels.get(self.cluster_label, "?")
+            reported.add((cluster, signal))
+
+            if threshold is not None and value > threshold:
+                breaches.append((signal, f"{cluster} {signal}={value:g} (> {threshold:g})"))
+
+        for cluster in clusters:
+            missing = [signal for signal in self.signals() if (cluster.name, signal) not in reported]
+            if missing:
+                breaches.append(("no_data", f"{cluster.name} reports no {', '.join(missing)}"))
+
+        return breaches
+
+    def bake(self, stage, clusters):
+
+        logger.info(
+            f"Metric-gated bake after {stage} for {len(clusters)} clusters "
+            f"(min {self.min_seconds}s, max {self.max_seconds}s)"
+        )
+
+        started = time.monotonic()
+        healthy_polls = 0
+
+        while True:
+            breaches = self.unhealthy(clusters)
+            elapsed = time.monotonic() - started
+
+            regressions = [text for signal, text in breaches if signal in self.abort_signals]
+            if regressions:
+                logger.error(f"Regression during bake after {stage}: {'; '.join(regressions)}")
+                raise ValidationError(f"Bake after {stage} failed: {'; '.join(regressions)}")
+
+            if breaches:
+                healthy_polls = 0
+                logger.info(f"Not stable yet: {'; '.join(text for _, text in breaches)}")
+            else:
+                healthy_polls += 1
+
+            if healthy_polls >= self.stable_polls and elapsed >= self.min_seconds:
+                logger.info(f"Bake complete after {elapsed:.0f}s (stable)")
+                return
+
+            if elapsed >= self.max_seconds:
+                if breaches:
+                    raise ValidationError(
+                        f"Bake after {stage} not stable after {self.max_seconds}s: "
+                        f"{'; '.join(text for _, text in breaches)}"
+                    )
+                logger.info(f"Bake complete after {elapsed:.0f}s (max bake time)")
+                return
+
+            cancellation.current().sleep(self.poll_seconds)
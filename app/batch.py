@@ -0,0 +1,155 @@
+import argparse
+import glob
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from app.logger import LoggerFactory
+from app.config_loader import ConfigLoader
+from app.concurrency import ConcurrencyBudget
+from app.client_registry import ClientRegistry
+from app.exceptions import FleetUpgradeException
+from app.orchestrator import FleetOrchestrator
+
+
+logger = LoggerFactory.get_logger("batch")
+
+
+class BatchRunner:
+    """
+    Upgrades every tenant blueprint under a directory tree in one process.
+
+    All tenants share one ClientRegistry (so one pooled session and build
+    watcher per Jenkins) and one ConcurrencyBudget, which carries the global
+    cap plus optional per-account and per-region caps.
+    """
+
+    def __init__(self, root: str, pattern="*/*/*.yaml", env=None, region=None,
+                 global_max_parallel=20, account_max_parallel=None,
+                 region_max_parallel=None, load_workers=16):
+
+        self.root = root
+        self.pattern = pattern
+        self.env = env
+        self.region = region
+        self.global_max_parallel = global_max_parallel
+        self.account_max_parallel = account_max_parallel
+        self.region_max_parallel = region_max_parallel
+        self.load_workers = load_workers
+
+        self.registry = ClientRegistry.default()
+        self.registry.ensure_pool_size(global_max_parallel)
+
+        self.budget = ConcurrencyBudget()
+        self.budget.set_limit("global", global_max_parallel)
+
+    def discover(self):
+
+        paths = sorted(glob.glob(os.path.join(self.root, self.pattern)))
+
+        if not paths:
+            raise FleetUpgradeException(f"No blueprints match {self.root}/{self.pattern}")
+
+        logger.info(f"Found {len(paths)} blueprints under {self.root}")
+        return paths
+
+    def load(self, paths):
+
+        with ThreadPoolExecutor(max_workers=self.load_workers) as executor:
+            configs = list(executor.map(ConfigLoader.load, paths))
+
+        selected = [
+            (path, config) for path, config in zip(paths, configs)
+            if (not self.env or config["env"] == self.env)
+            and (not self.region or config["region"] == self.region)
+        ]
+
+        logger.info(f"Selected {len(selected)} of {len(configs)} blueprints")
+        return selected
+
+    def run(self):
+
+        blueprints = self.load(self.discover())
+
+        orchestrators = {}
+
+        # Built one at a time: boto3 resource creation is not thread-safe
+        for path, config in blueprints:
+
+            if self.account_max_parallel:
+                self.budget.set_limit(f"account:{config['account_id']}", self.account_max_parallel)
+
+            if self.region_max_parallel:
+                self.budget.set_limit(f"region:{config['region']}", self.region_max_parallel)
+
+            orchestrators[path] = FleetOrchestrator(
+                config,
+                registry=self.registry,
+                budget=self.budget
+            )
+
+        failures = {}
+
+        with ThreadPoolExecutor(max_workers=len(orchestrators) or 1) as executor:
+
+            future_to_path = {
+                executor.submit(orchestrator.run): path
+                for path, orchestrator in orchestrators.items()
+            }
+
+            for future, path in future_to_path.items():
+                try:
+                    future.result()
+                    logger.info(f"Blueprint {path} completed successfully")
+                except Exception as e:
+                    logger.error(f"Blueprint {path} failed: {e}")
+                    failures[path] = e
+
+        logger.info(
+            f"Batch finished: {len(orchestrators) - len(failures)} succeeded, "
+            f"{len(failures)} failed"
+        )
+
+        if failures:
+            raise FleetUpgradeException(f"{len(failures)} blueprint(s) failed")
+
+
+def main():
+
+    parser = argparse.ArgumentParser(
+        prog="python -m app.batch",
+        description="Upgrade every tenant blueprint under a directory in one process"
+    )
+    parser.add_argument("root", help="Blueprint root, e.g. blueprints/tenants")
+    parser.add_argument("--pattern", default="*/*/*.yaml",
+                        help="Glob below root (default: <tenant>/<env>/<region>.yaml)")
+    parser.add_argument("--env", help="Only blueprints for this env")
+    parser.add_argument("--region", help="Only blueprints for this region")
+    parser.add_argument("--global-max-parallel", type=int, default=20)
+    parser.add_argument("--account-max-parallel", type=int)
+    parser.add_argument("--region-max-parallel", type=int)
+    args = parser.parse_args()
+
+    try:
+        BatchRunner(
+            root=args.root,
+            pattern=args.pattern,
+            env=args.env,
+            region=args.region,
+            global_max_parallel=args.global_max_parallel,
+            account_max_parallel=args.account_max_parallel,
+            region_max_parallel=args.region_max_parallel
+        ).run()
+
+        logger.info("Batch orchestration completed successfully")
+
+    except FleetUpgradeException as e:
+        logger.error(f"Batch upgrade failed: {e}")
+        sys.exit(1)
+
+    except Exception:
+        logger.exception("Unexpected error occurred")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+import contextvars
+import itertools
+import threading
+import time
+from concurrent.futures import TimeoutError
+from contextlib import contextmanager
+from app.logger import LoggerFactory
+from app.exceptions import UpgradeAbortedError
+
+logger = LoggerFactory.get_logger("cancellation")
+
+_current = contextvars.ContextVar("cancellation", default=None)
+
+
+class CancellationToken:
+    """
+    Cooperative cancellation for a run, or for one isolated fleet (a child
+    of the run's token). cancel() wakes every wait(), sleep() and result()
+    on the token at once and runs the registered callbacks; whoever was
+    waiting then cleans up (stops its Jenkins build, ...) and raises
+    UpgradeAbortedError.
+    """
+
+    def __init__(self, parent=None):
+        self.reason = None
+        self.cancelled_at = None
+
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = {}
+        self._ids = itertools.count()
+
+        if parent is not None:
+            parent.on_cancel(lambda: self.cancel(parent.reason))
+
+    def cancel(self, reason="cancelled"):
+        """Cancels once; returns False if already cancelled."""
+
+        with self._lock:
+            if self._event.is_set():
+                return False
+
+            self.reason = reason
+            self.cancelled_at = time.monotonic()
+            self._event.set()
+
+            callbacks = list(self._callbacks.values())
+            self._callbacks.clear()
+
+        logger.warning(f"Cancelling: {reason}")
+
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.warning(f"Cancellation callback failed: {e}")
+
+        return True
+
+    def is_cancelled(self):
+        return self._event.is_set()
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise UpgradeAbortedError(f"Aborted: {self.reason}")
+
+    def on_cancel(self, callback):
+        """Registers callback (run at once if already cancelled); returns a handle for remove()."""
+
+        with self._lock:
+            if not self._event.is_set():
+                handle = next(self._ids)
+                self._callbacks[handle] = callback
+                return handle
+
+        callback()
+        return None
+
+    def remove(self, handle):
+        with self._lock:
+            self._callbacks.pop(handle, None)
+
+    def wait(self, seconds):
+        """Sleeps up to seconds; True if woken by cancellation."""
+        return self._event.wait(seconds)
+
+    def sleep(self, seconds):
+        """Sleeps seconds, raising UpgradeAbortedError as soon as cancelled."""
+        self.wait(seconds)
+        self.raise_if_cancelled()
+
+    def result(self, future, timeout=None):
+        """future.result(), but raises UpgradeAbortedError once cancelled."""
+
+        woken = threading.Event()
+        future.add_done_callback(lambda _: woken.set())
+        handle = self.on_cancel(woken.set)
+
+        try:
+            woken.wait(timeout)
+        finally:
+            self.remove(handle)
+
+        if future.done():
+            return future.result()
+
+        self.raise_if_cancelled()
+        raise TimeoutError()
+
+
+# What current() hands out when no run is active: never cancelled
+NEVER = CancellationToken()
+
+
+def current() -> CancellationToken:
+    return _current.get() or NEVER
+
+
+@contextmanager
+def activate(token):
+    """Makes token current here and in pool threads started via tracing.submit."""
+
+    reset = _current.set(token)
+    try:
+        yield token
+    finally:
+        _current.reset(reset)
@@ -0,0 +1,217 @@
+import os
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from app.logger import LoggerFactory
+from app.jenkins_client import JenkinsClient
+from app.jenkins_watcher import JenkinsBuildWatcher
+from app.jenkins_admission import JenkinsAdmissionController
+from app.jenkins_webhook import JenkinsWebhookListener
+from app.argocd_client import ArgoCDCLient
+from app.argocd_api import ArgoCDAPIClient
+from app.services.traffic_service import Route53ChangeBatcher
+
+logger = LoggerFactory.get_logger("client-registry")
+
+
+class ClientRegistry:
+    """
+    Process-wide home for HTTP sessions and API clients.
+
+    Holds one pooled keep-alive session per endpoint and one client per
+    Jenkins/ArgoCD endpoint, so strategies share connections, CSRF crumbs
+    and the build watcher instead of rebuilding them per cluster.
+    """
+
+    _default = None
+    _default_lock = threading.Lock()
+
+    # Headroom on top of max_parallel for the watcher and admin calls
+    POOL_HEADROOM = 2
+
+    def __init__(self, pool_size=10, retries=3, backoff_factor=0.5):
+        self.pool_size = pool_size
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self._jenkins = {}
+        self._argocd = {}
+        self._route53 = {}
+
+    @classmethod
+    def default(cls):
+        with cls._default_lock:
+            if cls._default is None:
+                cls._default = cls()
+            return cls._default
+
+    def ensure_pool_size(self, max_parallel):
+        """Grows every pool so max_parallel workers never wait on a connection."""
+
+        wanted = max_parallel + self.POOL_HEADROOM
+
+        with self._lock:
+            if wanted <= self.pool_size:
+                return
+
+            logger.info(f"Resizing HTTP pools from {self.pool_size} to {wanted}")
+            self.pool_size = wanted
+
+            for session in self._sessions.values():
+                self._mount(session)
+
+    def session(self, endpoint: str) -> requests.Session:
+
+        key = endpoint.rstrip("/")
+
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                session = requests.Session()
+                self._mount(session)
+                self._pin_environment(session, key)
+                self._sessions[key] = session
+            return session
+
+    def jenkins(self, jenkins_config: dict) -> JenkinsClient:
+
+        base_url = jenkins_config["url"].rstrip("/")
+        key = (base_url, jenkins_config["user"])
+        session = self.session(base_url)
+
+        with self._lock:
+            client = self._jenkins.get(key)
+            if client is None:
+                auth = (jenkins_config["user"], jenkins_config["token"])
+                # One listener per process, bound at the first build wait
+                webhook_config = jenkins_config.get("webhook", {})
+                listener = None
+                if webhook_config.get("enabled", False):
+                    listener = JenkinsWebhookListener.shared(webhook_config)
+
+                watcher = JenkinsBuildWatcher(
+                    base_url=base_url,
+                    auth=auth,
+                    poll_interval=jenkins_config.get("poll_interval_seconds", 5),
+                    http=session,
+                    listener=listener,
+                    notified_poll_interval=webhook_config.get("poll_interval_seconds", 60)
+                )
+
+                admission_config = jenkins_config.get("admission", {})
+                admission = None
+                if admission_config.get("enabled", False):
+                    admission = JenkinsAdmissionController.from_config(
+                        base_url, auth, admission_config, http=session
+                    )
+                client = JenkinsClient(
+                    base_url=base_url,
+                    user=jenkins_config["user"],
+                    token=jenkins_config["token"],
+                    watcher=watcher,
+                    session=session,
+                    admission=admission
+                )
+                self._jenkins[key] = client
+            return client
+
+    def argocd(self, argocd_config=None, eks=None):
+        """
+        REST client when the blueprint names an ArgoCD url, with the CLI
+        as its fallback; the CLI alone otherwise.
+        """
+
+        argocd_config = argocd_config or {}
+        url = argocd_config.get("url")
+        key = (url.rstrip("/"), eks.region if eks else None) if url else "cli"
+        session = self.session(url) if url else None
+
+        with self._lock:
+            client = self._argocd.get(key)
+            if client is None:
+                if url:
+                    client = ArgoCDAPIClient(
+                        base_url=url,
+                        token=argocd_config.get("token") or os.environ.get("ARGOCD_AUTH_TOKEN"),
+                        username=argocd_config.get("username"),
+                        password=argocd_config.get("password"),
+                        session=session,
+                        eks=eks,
+                        role_arn=argocd_config.get("role_arn"),
+                        fallback=ArgoCDCLient(),
+                        watch_selector=argocd_config.get("watch_selector"),
+                        health_timeout_seconds=argocd_config.get("health_timeout_seconds", 600)
+                    )
+                else:
+                    client = ArgoCDCLient()
+                self._argocd[key] = client
+            return client
+
+    def route53(self, route53_config=None, client=None) -> Route53ChangeBatcher:
+        """One change batcher per Route53 endpoint, so every tenant's records share change sets."""
+
+        route53_config = route53_config or {}
+        key = route53_config.get("endpoint_url") or "aws"
+
+        with self._lock:
+            batcher = self._route53.get(key)
+            if batcher is None:
+                batcher = Route53ChangeBatcher.from_config(route53_config, client=client)
+                self._route53[key] = batcher
+            return batcher
+
+    def close(self):
+        with self._lock:
+            for client in self._jenkins.values():
+                if client.watcher.listener:
+                    client.watcher.listener.stop()
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+            self._jenkins.clear()
+            self._argocd.clear()
+            self._route53.clear()
+
+    @staticmethod
+    def _pin_environment(session, endpoint):
+        # requests re-reads proxy and CA settings from os.environ on every
+        # request, which showed up as the top CPU cost under load. A URL
+        # session only ever talks to its endpoint, so resolve them once.
+        if not endpoint.startswith(("http://", "https://")):
+            return
+
+        session.proxies = requests.utils.get_environ_proxies(endpoint)
+        session.verify = os.environ.get("REQUESTS_CA_BUNDLE") or os.environ.get("CURL_CA_BUNDLE") or True
+        session.trust_env = False
+
+    def _mount(self, session):
+
+        # Connect errors are retried for every method; read/status retries
+        # only for idempotent ones so a POST never triggers a job twice.
+        retry = Retry(
+            total=self.retries,
+            connect=self.retries,
+            read=self.retries,
+            status=self.retries,
+            backoff_factor=self.backoff_factor,
+            status_forcelist=(429, 502, 503, 504),
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_size,
+            pool_maxsize=self.pool_size,
+            max_retries=retry
+        )
+
+        previous = set(session.adapters.values())
+
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+
+        for old in previous:
+            old.close()
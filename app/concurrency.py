@@ -0,0 +1,57 @@
+import threading
+from contextlib import contextmanager
+from app.logger import LoggerFactory
+
+logger = LoggerFactory.get_logger("concurrency")
+
+
+class ConcurrencyBudget:
+    """
+    Named caps on in-flight cluster upgrades, e.g. "global" or "fleet:cpu".
+
+    A cluster holds one slot of every key it is subject to for the whole
+    upgrade. Keys without a limit are unbounded, and the first limit set for
+    a key wins (a different one later is logged and ignored), so a batch
+    run can pin limits before tenants set defaults.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._limits = {}
+        self._semaphores = {}
+
+    def set_limit(self, key: str, limit: int):
+
+        with self._lock:
+            if key in self._semaphores:
+                if self._limits[key] != limit:
+                    logger.warning(
+                        f"Ignoring new limit {limit} for '{key}', keeping {self._limits[key]}"
+                    )
+                return
+
+            logger.info(f"Concurrency limit for '{key}': {limit}")
+            self._limits[key] = limit
+            self._semaphores[key] = threading.BoundedSemaphore(limit)
+
+    def limit(self, key: str):
+        return self._limits.get(key)
+
+    @contextmanager
+    def slot(self, keys):
+
+        # Fixed acquisition order so two callers never wait on each other
+        with self._lock:
+            semaphores = [
+                self._semaphores[k] for k in sorted(set(keys)) if k in self._semaphores
+            ]
+
+        acquired = []
+        try:
+            for semaphore in semaphores:
+                semaphore.acquire()
+                acquired.append(semaphore)
+            yield
+        finally:
+            for semaphore in reversed(acquired):
+                semaphore.release()
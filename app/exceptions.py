@@ -21,3 +21,8 @@ class UpgradeFailedError(FleetUpgradeException):
 class StateLockError(FleetUpgradeException):
     """Raised when cluster is already locked."""
     pass
+
+
+class UpgradeAbortedError(FleetUpgradeException):
+    """Raised when an upgrade is cancelled because the run is stopping."""
+    pass
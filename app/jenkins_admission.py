@@ -0,0 +1,143 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+import requests
+from app.logger import LoggerFactory
+from app import cancellation, tracing
+
+logger = LoggerFactory.get_logger("jenkins-admission")
+
+COMPUTER_TREE = "busyExecutors,totalExecutors"
+QUEUE_TREE = "items[id]"
+
+
+class CapacitySnapshot:
+    """Idle executors and queue length as last read; idle is None if they could not be read."""
+
+    def __init__(self, idle, queued, fetched_at):
+        self.idle = idle
+        self.queued = queued
+        self.fetched_at = fetched_at
+
+
+class JenkinsAdmissionController:
+    """
+    Gates buildWithParameters on Jenkins capacity: a build is only
+    triggered while an executor is idle that nobody (us or other teams)
+    is already queued for, so wave builds don't pile up in the Jenkins
+    queue. reserve_executors stay free for other teams; max_queued lets
+    that many items wait on top so executors never idle between checks.
+
+    Executor and queue counts are cached for ttl_seconds. Triggers made
+    since the cached counts were read are subtracted, as Jenkins has not
+    counted them yet. If the capacity API cannot be read, builds are
+    admitted (fail open).
+    """
+
+    def __init__(self, base_url, auth, http=None, ttl_seconds=2, reserve_executors=0, max_queued=0):
+        self.base_url = base_url.rstrip("/")
+        self.auth = auth
+        self.http = http or requests
+        self.ttl_seconds = ttl_seconds
+        self.reserve_executors = reserve_executors
+        self.max_queued = max_queued
+
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._posting = 0
+        self._triggered = deque()
+
+    @classmethod
+    def from_config(cls, base_url, auth, admission_config, http=None):
+        return cls(
+            base_url,
+            auth,
+            http=http,
+            ttl_seconds=admission_config.get("ttl_seconds", 2),
+            reserve_executors=admission_config.get("reserve_executors", 0),
+            max_queued=admission_config.get("max_queued", 0)
+        )
+
+    @contextmanager
+    def admit(self, job_name):
+        """Blocks until Jenkins has room for one more build, then holds it while the trigger is posted."""
+
+        waiting = time.time_ns()
+        token = cancellation.current()
+        logged = False
+
+        while not self._try_admit():
+            if not logged:
+                logger.info(f"Jenkins at capacity, holding {job_name}")
+                logged = True
+            token.sleep(self.ttl_seconds)
+
+        tracing.record("jenkins.admission", waiting, time.time_ns(), job=job_name)
+
+        if logged:
+            logger.info(f"Admitted {job_name} after {(time.time_ns() - waiting) / 1e9:.1f}s")
+
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._posting -= 1
+                self._triggered.append(time.monotonic())
+
+    def headroom(self):
+        """Builds Jenkins could start right now, by the cached counts."""
+
+        with self._lock:
+            return self._headroom()
+
+    def _try_admit(self):
+
+        with self._lock:
+            if self._headroom() <= 0:
+                return False
+
+            self._posting += 1
+            return True
+
+    def _headroom(self):
+
+        snapshot = self._current()
+        if snapshot.idle is None:
+            return 1
+
+        # Posted after the counts were read, so not in them yet
+        while self._triggered and self._triggered[0] <= snapshot.fetched_at:
+            self._triggered.popleft()
+
+        unseen = self._posting + len(self._triggered)
+        return snapshot.idle - self.reserve_executors + self.max_queued - snapshot.queued - unseen
+
+    def _current(self):
+
+        if self._snapshot and time.monotonic() - self._snapshot.fetched_at < self.ttl_seconds:
+            return self._snapshot
+
+        # Marked before the calls, so a trigger landing while they run is
+        # counted twice at worst, never missed
+        fetched_at = time.monotonic()
+
+        try:
+            computers = self._get_json(f"{self.base_url}/computer/api/json", COMPUTER_TREE)
+            queue = self._get_json(f"{self.base_url}/queue/api/json", QUEUE_TREE)
+        except (requests.RequestException, ValueError) as e:
+            logger.warning(f"Cannot read Jenkins capacity, admitting builds: {e}")
+            self._snapshot = CapacitySnapshot(idle=None, queued=0, fetched_at=fetched_at)
+            return self._snapshot
+
+        self._snapshot = CapacitySnapshot(
+            idle=computers.get("totalExecutors", 0) - computers.get("busyExecutors", 0),
+            queued=len(queue.get("items", [])),
+            fetched_at=fetched_at
+        )
+        return self._snapshot
+
+    def _get_json(self, url, tree):
+        response = self.http.get(url, params={"tree": tree}, auth=self.auth, timeout=10)
+        response.raise_for_status()
+        return response.json()
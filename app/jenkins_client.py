@@ -1,57 +1,186 @@
+import threading
+from contextlib import nullcontext
 import requests
 import time
 from app.logger import LoggerFactory
+from app.jenkins_watcher import INTERNAL_JENKINS_URL, JenkinsBuildWatcher
+from app.exceptions import UpgradeAbortedError
+from app import cancellation, tracing
 
 logger = LoggerFactory.get_logger("jenkins")
 
 class JenkinsClient:
-    def __init__(self, base_url: str, user, token):
+
+    QUEUE_POLL_SECONDS = 5
+    BUILD_POLL_SECONDS = 10
+
+    def __init__(self, base_url: str, user, token, watcher=None, session=None, admission=None):
         self.base_url = base_url
         self.auth = (user, token)
+        self.http = session or requests.Session()
+        # Shared per run by the orchestrator; a private one otherwise
+        self.watcher = watcher or JenkinsBuildWatcher(base_url, self.auth, http=self.http)
+        # Optional JenkinsAdmissionController: trigger only with executors free
+        self.admission = admission
+
+        self._crumb = None
+        self._crumb_lock = threading.Lock()
+
+    def _crumb_headers(self, refresh=False):
+        """
+        CSRF crumb for POSTs, fetched once per session. Jenkins ties crumbs
+        to the session cookie, so it stays valid until we get a 403.
+        """
+        with self._crumb_lock:
+            if self._crumb is None or refresh:
+                response = self.http.get(
+                    f"{self.base_url}/crumbIssuer/api/json",
+                    auth=self.auth
+                )
+
+                if response.status_code == 404:
+                    # CSRF protection disabled
+                    self._crumb = {}
+                else:
+                    response.raise_for_status()
+                    data = response.json()
+                    self._crumb = {data["crumbRequestField"]: data["crumb"]}
+
+            return self._crumb
+
+    def _post(self, url, **kwargs):
+
+        response = self.http.post(url, auth=self.auth, headers=self._crumb_headers(), **kwargs)
+
+        if response.status_code == 403:
+            logger.info("Jenkins rejected crumb, refreshing")
+            response = self.http.post(
+                url, auth=self.auth, headers=self._crumb_headers(refresh=True), **kwargs
+            )
+
+        return response
 
     def trigger_job(self, job_name, params):
         url = f"{self.base_url}/job/{job_name}/buildWithParameters"
         logger.info(f"Triggering Jenkins job: {job_name}")
 
-        response = requests.post(url, params=params, auth=self.auth)
+        admitted = self.admission.admit(job_name) if self.admission else nullcontext()
+
+        with admitted, tracing.span("jenkins.trigger", job=job_name):
+            response = self._post(url, params=params)
 
         if response.status_code not in [200, 201]:
             raise Exception("Failed to trigger Jenkins job")
-        
+
         return response.headers["Location"]
 
-    def wait_for_completion(self, queue_url):
+    def watch(self, job_name, queue_url):
+        """Future resolving to the build result of a triggered job."""
+        return self.watcher.watch(job_name, queue_url)
+
+    def wait_for_completion(self, queue_url, job_name=None):
+
+        waiting = time.time_ns()
+
+        if job_name:
+            logger.info("Waiting for Jenkins build to complete")
+            future = self.watch(job_name, queue_url)
+
+            try:
+                result = cancellation.current().result(future)
+            except UpgradeAbortedError:
+                self.abort_build(queue_url, future.build_url)
+                self._record_build(job_name, waiting, future.started_ns, "ABORTED")
+                raise
+
+            self._record_build(job_name, waiting, future.started_ns, result)
+            return result
+
+        # Without the job name the build can't be found in bulk, so poll the
+        # queue item and then the build directly.
+        started = []
+        result = self._poll_until_complete(queue_url, started)
+        self._record_build(job_name, waiting, started[0] if started else None, result)
+        return result
+
+    def abort_build(self, queue_url, build_url=None):
+        """
+        Stops a triggered job's build, or takes it off the queue if it has
+        not started yet. Best effort: the run is stopping either way.
+        """
+
+        queue_url = queue_url.replace(INTERNAL_JENKINS_URL, self.base_url)
+        queue_id = queue_url.rstrip("/").rsplit("/", 1)[-1]
+
+        try:
+            if not build_url:
+                self._post(f"{self.base_url}/queue/cancelItem", params={"id": queue_id})
+
+                # It may have got an executor since we last looked
+                response = self.http.get(f"{queue_url}api/json", auth=self.auth)
+                executable = response.json().get("executable") if response.ok else None
+
+                if not executable:
+                    logger.warning(f"Cancelled queued Jenkins item {queue_id}")
+                    return
+
+                build_url = executable["url"].replace(INTERNAL_JENKINS_URL, self.base_url)
+
+            self._post(f"{build_url}stop")
+            logger.warning(f"Stopped Jenkins build {build_url}")
+
+        except (requests.RequestException, ValueError) as e:
+            logger.error(f"Could not abort Jenkins queue item {queue_id}: {e}")
+
+    def _record_build(self, job_name, waiting, started, result):
+
+        finished = time.time_ns()
+        # Jenkins' clock is not ours; keep the split inside what we observed
+        started = min(max(started or finished, waiting), finished)
+
+        tracing.record("jenkins.queue_wait", waiting, started, job=job_name)
+        tracing.record("jenkins.build", started, finished, job=job_name, result=result)
+
+    def _poll_until_complete(self, queue_url, started=None):
 
         # Fix internal Jenkins URL issue
-        queue_url = queue_url.replace("http://jenkins:8080", self.base_url)
+        queue_url = queue_url.replace(INTERNAL_JENKINS_URL, self.base_url)
 
         logger.info("Waiting for Jenkins build to start")
 
+        token = cancellation.current()
         build_url = None
 
-        while not build_url:
-            queue_info = requests.get(
-                f"{queue_url}api/json",
-                auth=self.auth
-            ).json()
+        try:
+            while not build_url:
+                queue_info = self.http.get(
+                    f"{queue_url}api/json",
+                    auth=self.auth
+                ).json()
+
+                executable = queue_info.get("executable")
 
-            executable = queue_info.get("executable")
+                if executable:
+                    build_url = executable["url"]
+                    build_url = build_url.replace(INTERNAL_JENKINS_URL, self.base_url)
+                    if started is not None:
+                        started.append(time.time_ns())
 
-            if executable:
-                build_url = executable["url"]
-                build_url = build_url.replace("http://jenkins:8080", self.base_url)
+                token.sleep(self.QUEUE_POLL_SECONDS)
 
-            time.sleep(5)
+            logger.info("Monitoring build")
 
-        logger.info("Monitoring build")
+            while True:
+                build_info = self.http.get(
+                    f"{build_url}api/json",
+                    auth=self.auth
+                ).json()
 
-        while True:
-            build_info = requests.get(
-                f"{build_url}api/json",
-                auth=self.auth
-            ).json()
+                if build_info["result"]:
+                    return build_info["result"]
 
-            if build_info["result"]:
-                return build_info["result"]
+                token.sleep(self.BUILD_POLL_SECONDS)
 
-            time.sleep(10)
+        except UpgradeAbortedError:
+            self.abort_build(queue_url, build_url)
+            raise
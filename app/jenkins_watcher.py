@@ -0,0 +1,263 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+import requests
+from app.logger import LoggerFactory
+
+logger = LoggerFactory.get_logger("jenkins-watcher")
+
+INTERNAL_JENKINS_URL = "http://jenkins:8080"
+
+# Jenkins drops a queue item from /queue/api/json as soon as it gets an
+# executor, so anything we are watching that is no longer queued is looked
+# up in its job's recent builds by queueId.
+QUEUE_TREE = "items[id]"
+BUILDS_TREE = "builds[number,url,result,queueId,timestamp]{0,%d}"
+
+# Cycles an item may be missing from both the queue and the builds window
+# before we ask Jenkins about that single item directly.
+MAX_MISSES = 3
+
+# Build notifications kept for queue items not watched yet (the build
+# finished before watch() was called)
+MAX_EARLY_NOTIFICATIONS = 1000
+
+
+class BuildFuture(Future):
+    """
+    Future of a build result that also knows its queue item, its build
+    (once started) and when the build started, so it can be aborted.
+    """
+
+    def __init__(self, queue_id=None, queue_url=None):
+        super().__init__()
+        self.queue_id = queue_id
+        self.queue_url = queue_url
+        self.build_url = None
+        self.started_ns = None
+
+
+class _Watch:
+
+    def __init__(self, job_name, queue_id, queue_url):
+        self.job_name = job_name
+        self.queue_id = queue_id
+        self.queue_url = queue_url
+        self.build_url = None
+        self.misses = 0
+        self.future = BuildFuture(queue_id, queue_url)
+
+
+class JenkinsBuildWatcher:
+    """
+    Resolves every outstanding Jenkins queue item / build of a run from a
+    single polling thread.
+
+    Each cycle costs one tree-filtered /queue/api/json call plus one builds
+    call per job with builds outstanding, however many clusters are in flight.
+
+    Build notifications (see JenkinsWebhookListener) make the watcher
+    read an item's result from the API the moment Jenkins reports it
+    through notify(); polling then only catches what a lost notification
+    missed.
+    """
+
+    def __init__(self, base_url: str, auth, poll_interval=5, builds_window=50, http=None,
+                 listener=None, notified_poll_interval=60):
+        self.base_url = base_url.rstrip("/")
+        self.auth = auth
+        self.poll_interval = poll_interval
+        self.builds_window = builds_window
+        self.http = http or requests
+        # JenkinsWebhookListener, if build notifications are received;
+        # polling is then only the safety net, every notified_poll_interval
+        self.listener = listener.add(self) if listener else None
+        self.notified_poll_interval = notified_poll_interval
+
+        self._lock = threading.Lock()
+        self._watches = {}
+        self._early = OrderedDict()
+        self._thread = None
+
+    def watch(self, job_name, queue_url) -> Future:
+        """Returns a future resolving to the build result (e.g. SUCCESS)."""
+
+        queue_url = queue_url.replace(INTERNAL_JENKINS_URL, self.base_url)
+        queue_id = int(queue_url.rstrip("/").rsplit("/", 1)[-1])
+
+        watch = _Watch(job_name, queue_id, queue_url)
+
+        if self.listener:
+            self.listener.start()
+
+        with self._lock:
+            self._watches[queue_id] = watch
+            early = self._early.pop(queue_id, None)
+
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._loop,
+                    name="jenkins-watcher",
+                    daemon=True
+                )
+                self._thread.start()
+
+        logger.info(f"Watching Jenkins queue item {queue_id} ({job_name})")
+
+        if early:
+            self._confirm(watch)
+
+        return watch.future
+
+    def notify(self, queue_id=None, build_url=None, result=None, timestamp=None):
+        """
+        Applies a build notification. Notifications are unauthenticated
+        hints: they only make the watcher read the item's state from the
+        Jenkins API now, rather than at the next poll. Returns False if no
+        watched item matches.
+        """
+
+        if build_url:
+            build_url = build_url.replace(INTERNAL_JENKINS_URL, self.base_url)
+
+        with self._lock:
+            watch = self._watches.get(queue_id)
+
+            if watch is None and build_url:
+                # Only build urls learned from the API are matched
+                watch = next((w for w in self._watches.values() if w.build_url == build_url), None)
+
+            if watch is None:
+                if queue_id is not None and result:
+                    self._early[queue_id] = True
+                    while len(self._early) > MAX_EARLY_NOTIFICATIONS:
+                        self._early.popitem(last=False)
+                return False
+
+        # A start is read with the result (the build's own timestamp)
+        if result:
+            self._confirm(watch)
+        return True
+
+    def _confirm(self, watch):
+
+        try:
+            self._poll_single(watch)
+        except Exception as e:
+            logger.warning(f"Could not read Jenkins queue item {watch.queue_id}, leaving it to polling: {e}")
+
+    def pending(self):
+        with self._lock:
+            return len(self._watches)
+
+    def _loop(self):
+
+        while True:
+            time.sleep(self._interval())
+
+            with self._lock:
+                watches = list(self._watches.values())
+
+            try:
+                self._poll(watches)
+            except Exception as e:
+                logger.warning(f"Jenkins poll cycle failed, retrying: {e}")
+
+            with self._lock:
+                if not self._watches:
+                    self._thread = None
+                    return
+
+    def _interval(self):
+        if self.listener and self.listener.listening:
+            return self.notified_poll_interval
+        return self.poll_interval
+
+    def _poll(self, watches):
+
+        queued = {
+            item["id"]
+            for item in self._get_json(
+                f"{self.base_url}/queue/api/json", {"tree": QUEUE_TREE}
+            ).get("items", [])
+        }
+
+        by_job = {}
+        for watch in watches:
+            if watch.queue_id not in queued:
+                by_job.setdefault(watch.job_name, []).append(watch)
+
+        for job_name, job_watches in by_job.items():
+
+            # Other teams' builds interleave with ours, so keep the window
+            # comfortably wider than what we are waiting on.
+            window = max(self.builds_window, 2 * len(job_watches))
+
+            builds = self._get_json(
+                f"{self.base_url}/job/{job_name}/api/json",
+                {"tree": BUILDS_TREE % window}
+            ).get("builds", [])
+
+            by_queue_id = {b.get("queueId"): b for b in builds}
+
+            for watch in job_watches:
+                build = by_queue_id.get(watch.queue_id)
+
+                if build:
+                    self._update(watch, build)
+                else:
+                    watch.misses += 1
+                    if watch.misses >= MAX_MISSES:
+                        self._poll_single(watch)
+
+    def _poll_single(self, watch):
+        # Fallback for items that fell outside the builds window or were
+        # cancelled while queued.
+        if watch.build_url:
+            self._update(watch, self._get_json(f"{watch.build_url}api/json"))
+            return
+
+        item = self._get_json(f"{watch.queue_url}api/json")
+
+        if item.get("cancelled"):
+            logger.warning(f"Jenkins queue item {watch.queue_id} was cancelled")
+            self._resolve(watch, "CANCELLED")
+            return
+
+        executable = item.get("executable")
+        if executable:
+            watch.build_url = watch.future.build_url = executable["url"].replace(INTERNAL_JENKINS_URL, self.base_url)
+            self._update(watch, self._get_json(f"{watch.build_url}api/json"))
+
+    def _update(self, watch, build):
+
+        if not watch.build_url and build.get("url"):
+            watch.build_url = watch.future.build_url = build["url"].replace(INTERNAL_JENKINS_URL, self.base_url)
+            logger.info(f"Monitoring build {watch.build_url}")
+
+        if watch.future.started_ns is None and watch.build_url:
+            # Jenkins' own start time (ms), else when we first saw the build
+            timestamp = build.get("timestamp")
+            watch.future.started_ns = int(timestamp) * 1_000_000 if timestamp else time.time_ns()
+
+        watch.misses = 0
+
+        if build.get("result"):
+            self._resolve(watch, build["result"])
+
+    def _resolve(self, watch, result):
+
+        with self._lock:
+            # A notification and a poll can race to the same result
+            if self._watches.get(watch.queue_id) is not watch:
+                return
+            del self._watches[watch.queue_id]
+
+        logger.info(f"Jenkins queue item {watch.queue_id} finished: {result}")
+        watch.future.set_result(result)
+
+    def _get_json(self, url, params=None):
+        response = self.http.get(url, params=params, auth=self.auth)
+        response.raise_for_status()
+        return response.json()
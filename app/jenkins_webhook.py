@@ -0,0 +1,221 @@
+import hmac
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from app.logger import LoggerFactory
+from app.exceptions import ConfigurationError
+
+logger = LoggerFactory.get_logger("jenkins-webhook")
+
+# Notification plugin phases that carry the final result
+FINISHED_PHASES = ("COMPLETED", "FINALIZED")
+
+# Bind addresses that need no token: only this host can post
+LOOPBACK_HOSTS = ("127.0.0.1", "localhost", "::1")
+
+
+def parse_notification(payload):
+    """
+    (queue_id, build_url, result, timestamp) from a build notification:
+    the Notification plugin's {"name", "build": {...}} shape, or a flat
+    generic-webhook one. result stays None until the build has finished.
+    """
+
+    build = payload.get("build") if isinstance(payload.get("build"), dict) else payload
+
+    queue_id = build.get("queue_id", build.get("queueId"))
+    build_url = build.get("full_url") or build.get("build_url") or build.get("url")
+    result = build.get("status") or build.get("result")
+    phase = build.get("phase")
+
+    if phase and phase not in FINISHED_PHASES:
+        result = None
+
+    # Relative urls ("job/x/12/") can't be matched to anything we watch
+    if build_url and not build_url.startswith(("http://", "https://")):
+        build_url = None
+
+    return (
+        int(queue_id) if queue_id is not None else None,
+        build_url,
+        result,
+        build.get("timestamp")
+    )
+
+
+class JenkinsWebhookListener:
+    """
+    Small embedded HTTP server receiving Jenkins build notifications
+    (Notification plugin, or any job posting JSON from a post step) and
+    handing them to the build watchers, which read the build's result from
+    the Jenkins API at once. If a token is set, requests must carry it as
+    ?token= or an X-Jenkins-Token header; binding anything but loopback
+    requires one.
+
+    One listener serves every watcher in the process (see shared()). It
+    binds on the first build wait, so plan and other read-only commands
+    never open the port; if the bind fails, watchers keep polling at
+    their normal interval.
+    """
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, host="127.0.0.1", port=8089, path="/jenkins/notify", token=None):
+
+        if not token and host not in LOOPBACK_HOSTS:
+            raise ConfigurationError(f"Jenkins webhook listener on {host} needs a token")
+
+        self.host = host
+        self.port = port
+        self.path = path
+        self.token = token
+        self.watchers = []
+
+        self.server = None
+        self.url = None
+        self.listening = False
+        self._failed = False
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @classmethod
+    def from_config(cls, webhook_config):
+        return cls(
+            host=webhook_config.get("host", "127.0.0.1"),
+            port=webhook_config.get("port", 8089),
+            path=webhook_config.get("path", "/jenkins/notify"),
+            token=webhook_config.get("token")
+        )
+
+    @classmethod
+    def shared(cls, webhook_config):
+        """The process-wide listener, created from the first webhook config asking for one."""
+
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls.from_config(webhook_config)
+                return cls._shared
+
+            listener = cls._shared
+            wanted = cls.from_config(webhook_config)
+
+            if (wanted.host, wanted.port, wanted.path, wanted.token) != (
+                    listener.host, listener.port, listener.path, listener.token):
+                logger.warning(
+                    f"Jenkins webhook already configured on {listener.host}:{listener.port}{listener.path}; "
+                    f"ignoring {wanted.host}:{wanted.port}{wanted.path} from another blueprint"
+                )
+            return listener
+
+    def add(self, watcher):
+        with self._lock:
+            if watcher not in self.watchers:
+                self.watchers.append(watcher)
+        return self
+
+    def start(self):
+        """Binds and serves unless already done (or already failed); True while listening."""
+
+        with self._lock:
+            if self.listening or self._failed:
+                return self.listening
+
+            try:
+                self.server = ThreadingHTTPServer((self.host, self.port), self._handler())
+            except OSError as e:
+                self._failed = True
+                logger.error(
+                    f"Cannot listen for Jenkins notifications on {self.host}:{self.port}, "
+                    f"polling instead: {e}"
+                )
+                return False
+
+            self.server.daemon_threads = True
+            self.port = self.server.server_address[1]
+            self.url = f"http://{'127.0.0.1' if self.host == '0.0.0.0' else self.host}:{self.port}{self.path}"
+
+            self._thread = threading.Thread(
+                target=self.server.serve_forever,
+                name="jenkins-webhook",
+                daemon=True
+            )
+            self._thread.start()
+            self.listening = True
+
+        logger.info(f"Listening for Jenkins build notifications on port {self.port}{self.path}")
+        return True
+
+    def stop(self):
+
+        with self._lock:
+            server, self.server = self.server, None
+            self.listening = False
+            self.watchers = []
+
+        if server:
+            server.shutdown()
+            server.server_close()
+
+        with self._shared_lock:
+            if JenkinsWebhookListener._shared is self:
+                JenkinsWebhookListener._shared = None
+
+    def handle(self, payload):
+        """Applies one notification; True if it matched a watched build."""
+
+        queue_id, build_url, result, timestamp = parse_notification(payload)
+
+        if queue_id is None and build_url is None:
+            logger.warning("Jenkins notification without queue id or build url, ignored")
+            return False
+
+        with self._lock:
+            watchers = list(self.watchers)
+
+        # Queue ids are per Jenkins; every watcher checks its own
+        return any([watcher.notify(queue_id, build_url, result, timestamp) for watcher in watchers])
+
+    def _authorized(self, query, headers):
+
+        if not self.token:
+            return True
+
+        given = headers.get("X-Jenkins-Token") or query.get("token", [""])[0]
+        return hmac.compare_digest(given.encode(), self.token.encode())
+
+    def _handler(self):
+        listener = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status):
+                self.send_response(status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def do_POST(self):
+                parsed = urlparse(self.path)
+
+                if parsed.path != listener.path:
+                    return self._reply(404)
+
+                if not listener._authorized(parse_qs(parsed.query), self.headers):
+                    logger.warning("Jenkins notification with a bad token rejected")
+                    return self._reply(403)
+
+                try:
+                    length = int(self.headers.get("Content-Length", 0))
+                    payload = json.loads(self.rfile.read(length) or b"{}")
+                    listener.handle(payload)
+                except (ValueError, TypeError, AttributeError) as e:
+                    logger.warning(f"Unreadable Jenkins notification: {e}")
+                    return self._reply(400)
+
+                self._reply(204)
+
+        return Handler
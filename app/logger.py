@@ -1,14 +1,157 @@
+import atexit
+import contextvars
+import copy
+import json
 import logging
 import os
-from logging.handlers import RotatingFileHandler
+import queue
+import re
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+LOG_DIR = "logs"
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+TEXT_FORMAT = "%(asctime)s | %(levelname)s | %(name)s | %(message)s%(context)s"
+
+# Context fields, in the order they are shown
+CONTEXT_FIELDS = ("tenant", "env", "fleet", "cluster", "wave")
+
+_fields = contextvars.ContextVar("log_fields", default={})
+_EXCEPTION_FORMATTER = logging.Formatter()
+
+
+@contextmanager
+def log_context(**fields):
+    """Adds fields (cluster, wave, ...) to every record logged in the block."""
+
+    token = _fields.set({**_fields.get(), **{k: v for k, v in fields.items() if v is not None}})
+    try:
+        yield
+    finally:
+        _fields.reset(token)
+
+
+class TextFormatter(logging.Formatter):
+    """The classic pipe-separated line, with any context fields appended."""
+
+    def __init__(self):
+        super().__init__(fmt=TEXT_FORMAT, datefmt=DATE_FORMAT)
+
+    def format(self, record):
+        fields = getattr(record, "fields", {})
+        shown = [f"{k}={fields[k]}" for k in CONTEXT_FIELDS if k in fields]
+        record.context = f" [{' '.join(shown)}]" if shown else ""
+        return super().format(record)
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record."""
+
+    def format(self, record):
+
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).astimezone().isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "thread": record.threadName,
+            **getattr(record, "fields", {})
+        }
+
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+
+        return json.dumps(entry, default=str)
+
+
+class _ContextQueueHandler(QueueHandler):
+    """
+    Runs on the logging thread: renders the message, captures the context
+    fields and hands the record over. No I/O, and the queue is unbounded,
+    so a log call never waits.
+    """
+
+    def prepare(self, record):
+
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+
+        if record.exc_info:
+            record.exc_text = _EXCEPTION_FORMATTER.formatException(record.exc_info)
+            record.exc_info = None
+
+        record.fields = _fields.get()
+        return record
+
+
+class ClusterFileHandler(logging.Handler):
+    """
+    Also writes every record that has a cluster field to that cluster's
+    own file under directory. Only the listener thread calls emit, and the
+    least recently used files are closed past max_open.
+    """
+
+    def __init__(self, directory, max_open=64):
+        super().__init__()
+        self.directory = directory
+        self.max_open = max_open
+        self._files = OrderedDict()
+        os.makedirs(directory, exist_ok=True)
+
+    def emit(self, record):
+
+        fields = getattr(record, "fields", {})
+        if "cluster" not in fields:
+            return
+
+        try:
+            name = "-".join(str(fields[k]) for k in ("tenant", "env", "cluster") if k in fields)
+            stream = self._open(re.sub(r"[^A-Za-z0-9_.-]", "_", name))
+            stream.write(self.format(record) + "\n")
+            stream.flush()
+        except Exception:
+            self.handleError(record)
+
+    def _open(self, name):
+
+        if name in self._files:
+            self._files.move_to_end(name)
+            return self._files[name]
+
+        if len(self._files) >= self.max_open:
+            _, oldest = self._files.popitem(last=False)
+            oldest.close()
+
+        stream = self._files[name] = open(os.path.join(self.directory, f"{name}.log"), "a")
+        return stream
+
+    def close(self):
+        for stream in self._files.values():
+            stream.close()
+        self._files.clear()
+        super().close()
 
 
 class LoggerFactory:
     """
     Centralized logger factory.
-    Ensures single logger instance across application.
+
+    Every logger feeds one queue; a single listener thread does all the
+    console and file I/O (logs/fleet.log as JSON lines, optionally one text
+    file per cluster), so there is one handle per file and logging never
+    blocks the caller.
     """
 
+    _lock = threading.Lock()
+    _queue_handler = None
+    _listener = None
+    _cluster_files = None
+
     @staticmethod
     def get_logger(name: str = "eks-fleet") -> logging.Logger:
 
@@ -18,26 +161,67 @@ class LoggerFactory:
             return logger  # Prevent duplicate handlers
 
         logger.setLevel(logging.INFO)
+        logger.addHandler(LoggerFactory._pipeline())
+        # Everything goes through the queue once; root handlers would repeat it
+        logger.propagate = False
+
+        return logger
 
-        formatter = logging.Formatter(
-            fmt="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
-            datefmt="%Y-%m-%d %H:%M:%S"
-        )
+    @classmethod
+    def _pipeline(cls):
 
-        # Console Handler
-        console_handler = logging.StreamHandler()
-        console_handler.setFormatter(formatter)
-        logger.addHandler(console_handler)
+        with cls._lock:
+            if cls._queue_handler is None:
 
-        # File Handler (rotating)
-        os.makedirs("logs", exist_ok=True)
+                console_handler = logging.StreamHandler()
+                console_handler.setFormatter(TextFormatter())
 
-        file_handler = RotatingFileHandler(
-            "logs/fleet.log",
-            maxBytes=5_000_000,
-            backupCount=3
-        )
-        file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
+                os.makedirs(LOG_DIR, exist_ok=True)
 
-        return logger
+                file_handler = RotatingFileHandler(
+                    os.path.join(LOG_DIR, "fleet.log"),
+                    maxBytes=5_000_000,
+                    backupCount=3
+                )
+                file_handler.setFormatter(JsonFormatter())
+
+                records = queue.SimpleQueue()
+                cls._listener = QueueListener(
+                    records, console_handler, file_handler, respect_handler_level=True
+                )
+                cls._listener.start()
+                atexit.register(cls.shutdown)
+
+                cls._queue_handler = _ContextQueueHandler(records)
+
+            return cls._queue_handler
+
+    @classmethod
+    def enable_cluster_files(cls, directory=os.path.join(LOG_DIR, "clusters")):
+        """Starts writing per-cluster log files (once per process)."""
+
+        cls._pipeline()
+
+        with cls._lock:
+            if cls._cluster_files is not None or cls._listener is None:
+                return
+
+            cls._cluster_files = ClusterFileHandler(directory)
+            cls._cluster_files.setFormatter(TextFormatter())
+            # The listener reads this tuple per record
+            cls._listener.handlers = cls._listener.handlers + (cls._cluster_files,)
+
+    @classmethod
+    def shutdown(cls):
+        """Drains the queue and closes every handler."""
+
+        # Loggers keep their queue handler; anything logged later is dropped
+        with cls._lock:
+            listener, cls._listener = cls._listener, None
+
+        if listener is None:
+            return
+
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
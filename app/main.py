@@ -1,3 +1,4 @@
+import json
 import sys
 from app.logger import LoggerFactory
 from app.config_loader import ConfigLoader
@@ -8,13 +9,26 @@ from app.orchestrator import FleetOrchestrator
 logger = LoggerFactory.get_logger("main")
 
 
+USAGE = "Usage: python -m app.main [run|plan [--live]] <config.yaml>"
+
+
 def main():
 
-    if len(sys.argv) != 2:
-        logger.error("Usage: python -m app.main <config.yaml>")
+    args = sys.argv[1:]
+    command = "run"
+
+    if args and args[0] in ["run", "plan"]:
+        command = args.pop(0)
+
+    # plan only: also compare against live EKS versions
+    live = "--live" in args
+    args = [a for a in args if a != "--live"]
+
+    if len(args) != 1 or (live and command != "plan"):
+        logger.error(USAGE)
         sys.exit(1)
 
-    config_file = sys.argv[1]
+    config_file = args[0]
 
     try:
         config = ConfigLoader.load(config_file)
@@ -24,7 +38,14 @@ def main():
         )
 
         orchestrator = FleetOrchestrator(config)
-        orchestrator.run()
+        plan = orchestrator.plan(live=live)
+
+        if command == "plan":
+            plan.log()
+            print(json.dumps(plan.to_dict(), indent=2))
+            return
+
+        orchestrator.run(plan)
 
         logger.info("Fleet orchestration completed successfully")
 
@@ -7,7 +7,8 @@ logger = LoggerFactory.get_logger("models")
 class Cluster:
 
     def __init__(self, name: str, fleet: str, version: str,
-                 is_canary: bool, tenant: str, env: str, region: str):
+                 is_canary: bool, tenant: str, env: str, region: str,
+                 node_groups: dict = None):
 
         self.name = name
         self.fleet = fleet
@@ -16,6 +17,8 @@ class Cluster:
         self.tenant = tenant
         self.env = env
         self.region = region
+        # Blueprint node_groups: name -> instance_types, min, max, desired
+        self.node_groups = node_groups or {}
 
     def identifier(self) -> str:
         return f"{self.tenant}-{self.env}-{self.name}"
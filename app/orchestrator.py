@@ -1,53 +1,184 @@
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from app.logger import LoggerFactory
 from app.models import Cluster
 from app.exceptions import ConfigurationError
 from app.state_manager import StateManager
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from app.scheduler import chunk_clusters, SlidingWindowScheduler, WaveScheduler
 from app.strategies.blue_green_strategy import BlueGreenUpgradeStrategy
 from app.strategies.in_place_strategy import InPlaceStrategy
-from app.exceptions import StateLockError
+from app.exceptions import StateLockError, UpgradeAbortedError, UpgradeFailedError
+from app.concurrency import ConcurrencyBudget
+from app.client_registry import ClientRegistry
+from app.planner import UpgradePlanner
+from app.bake import FixedBake, MetricGatedBake
+from app.validation import ClusterValidator
+from app.services.eks_service import EKSService
+from app.services.traffic_service import TrafficService
+from app.teardown import TeardownQueue
+from app import cancellation, tracing
 
 
 logger = LoggerFactory.get_logger("orchestrator")
 
+# Per-env rollout knobs; app.simulator replays them against past run times
+ROLLOUT_DEFAULTS = {
+    "prod": {
+        "wave_percent": 10,
+        "bake_seconds": 30,
+        "lock_timeout_seconds": 1800,  # 30 minutes
+        "max_parallel": 2,
+        "global_max_parallel": 4,
+        "scheduler": "waves"
+    },
+    "test": {
+        "wave_percent": 25,
+        "bake_seconds": 10,
+        "lock_timeout_seconds": 900,   # 15 minutes
+        "max_parallel": 3,
+        "global_max_parallel": 6,
+        "scheduler": "sliding"
+    },
+    "dev": {
+        "wave_percent": 50,
+        "bake_seconds": 5,
+        "lock_timeout_seconds": 300,   # 5 minutes
+        "max_parallel": 5,
+        "global_max_parallel": 10,
+        "scheduler": "sliding"
+    }
+}
+
 
 class FleetOrchestrator:
 
-    def __init__(self, config: dict):
+    def __init__(self, config: dict, registry=None, budget=None, state=None):
 
         self.config = config
         self.tenant = config["tenant"]
         self.env = config["env"]
         self.region = config["region"]
+        self.account_id = config["account_id"]
 
         # Environment-based rollout config
-        if self.env == "prod":
-            self.wave_percent = 10
-            self.bake_seconds = 30
-            self.lock_timeout_seconds = 300 # 30 minutes
-            self.max_parallel = 2
-        elif self.env == "test":
-            self.wave_percent = 25
-            self.bake_seconds = 10
-            self.lock_timeout_seconds = 300   # 15 minutes
-            self.max_parallel = 3
-        else:  # dev
-            self.wave_percent = 50
-            self.bake_seconds = 5
-            self.lock_timeout_seconds = 300   # 5 minutes
-            self.max_parallel = 5
-
+        defaults = ROLLOUT_DEFAULTS.get(self.env, ROLLOUT_DEFAULTS["dev"])
+        self.wave_percent = defaults["wave_percent"]
+        self.bake_seconds = defaults["bake_seconds"]
+        self.lock_timeout_seconds = defaults["lock_timeout_seconds"]
+        self.max_parallel = defaults["max_parallel"]
+        self.global_max_parallel = defaults["global_max_parallel"]
+        self.scheduler_mode = defaults["scheduler"]
+
+        # Optional per-blueprint overrides
+        rollout = config.get("rollout", {})
+        self.scheduler_mode = rollout.get("scheduler", self.scheduler_mode)
+        self.wave_percent = rollout.get("wave_percent", self.wave_percent)
+        self.max_parallel = rollout.get("max_parallel", self.max_parallel)
+        self.bake_seconds = rollout.get("bake_seconds", self.bake_seconds)
+        # "duration": longest estimated upgrade first; "blueprint": YAML order
+        self.order = rollout.get("order", "duration")
+        # Failed clusters tolerated before no more are admitted
+        self.max_failures = rollout.get("max_failures", 1)
+        # Fleets run concurrently; this caps in-flight clusters across all of them
+        self.global_max_parallel = rollout.get("global_max_parallel", self.global_max_parallel)
+        # Per-fleet overrides: max_parallel, isolate_failures
+        self.fleet_overrides = rollout.get("fleets", {})
+
+        if self.scheduler_mode not in ["waves", "sliding"]:
+            raise ConfigurationError(f"Unknown rollout scheduler: {self.scheduler_mode}")
+
+        if self.order not in ["duration", "blueprint"]:
+            raise ConfigurationError(f"Unknown rollout order: {self.order}")
+
+        # 0 would admit nothing and report an empty rollout as a success
+        if not isinstance(self.max_failures, int) or self.max_failures < 1:
+            raise ConfigurationError(
+                f"rollout.max_failures must be at least 1 (1 stops on the first failure), got {self.max_failures}"
+            )
 
         # 🔥 PASS timeout to StateManager
-        self.state = StateManager(
+        self.state = state or StateManager(
             region=self.region,
             lock_timeout_seconds=self.lock_timeout_seconds
         )
 
+        # Pooled sessions and clients are shared by every cluster upgrade
+        self.registry = registry or ClientRegistry.default()
+        self.registry.ensure_pool_size(self.global_max_parallel)
+
+        # A shared (batch) budget owns "global"; this blueprint's cap gets its own key
+        self.budget = budget or ConcurrencyBudget()
+        self.budget_key = "global" if budget is None else f"blueprint:{self.tenant}/{self.env}/{self.region}"
+        self.budget.set_limit(self.budget_key, self.global_max_parallel)
+
+        # Metric-gated bake when the blueprint points at Prometheus
+        bake_config = config.get("bake", {})
+        if bake_config.get("prometheus_url"):
+            self.baker = MetricGatedBake.from_config(
+                bake_config,
+                session=self.registry.session(bake_config["prometheus_url"])
+            )
+        else:
+            self.baker = FixedBake(self.bake_seconds)
+
+        # Optional per-cluster log files next to logs/fleet.log
+        logging_config = config.get("logging", {})
+        if logging_config.get("cluster_files"):
+            LoggerFactory.enable_cluster_files(logging_config.get("cluster_dir", "logs/clusters"))
+
+        # Per-stage spans for every run; exported and summarised when it ends
+        self.tracer = tracing.Tracer.from_config(
+            config.get("tracing", {}),
+            {"tenant": self.tenant, "env": self.env, "region": self.region}
+        )
+
+        jenkins = self.registry.jenkins(config["jenkins"])
+        self.eks = EKSService(self.region, session=self.registry.session(f"eks:{self.region}"))
+        argocd = self.registry.argocd(config.get("argocd"), eks=self.eks)
+
+        validator = ClusterValidator.from_config(self.eks, config.get("validation", {}))
+
+        # Blue clusters are destroyed off the rollout's slots, after a rollback window
         self.clusters = self._build_clusters()
 
+        self.teardown = None
+        teardown_config = config.get("teardown", {})
+        # Off the critical path: what is not done by exit is drained later
+        self.wait_for_teardown = teardown_config.get("wait", False)
+
+        if self.env in ["dev"]:
+            self.strategy = InPlaceStrategy(config, jenkins, argocd, validator)
+        else:
+            self.strategy = BlueGreenUpgradeStrategy(config, jenkins, argocd, validator)
+
+            if teardown_config.get("enabled", True):
+                self.teardown = TeardownQueue.from_config(
+                    self.state, self.strategy._destroy_blue, self.tenant, self.env, teardown_config
+                )
+                self.strategy.teardown = self.teardown
+
+            traffic_config = config.get("traffic", {})
+            if traffic_config.get("method", config.get("traffic_switch")) == "route53":
+                self.strategy.traffic = TrafficService.from_config(
+                    traffic_config,
+                    self.registry.route53(traffic_config.get("route53")),
+                    gate=self._traffic_gate(traffic_config),
+                    clusters=self.clusters
+                )
+
+    def _traffic_gate(self, traffic_config):
+
+        # Same health signals as the bake, usually over a shorter window
+        bake_config = self.config.get("bake", {})
+        if bake_config.get("prometheus_url"):
+            return MetricGatedBake.from_config(
+                {**bake_config, **traffic_config.get("gate", {})},
+                session=self.registry.session(bake_config["prometheus_url"])
+            )
+
+        return FixedBake(traffic_config.get("step_seconds", 60))
+
     def _build_clusters(self):
 
         logger.info("Building cluster objects from config")
@@ -81,7 +212,8 @@ class FleetOrchestrator:
                 is_canary=is_canary,
                 tenant=self.tenant,
                 env=self.env,
-                region=self.region
+                region=self.region,
+                node_groups=cfg.get("node_groups")
             )
 
             clusters.append(cluster)
@@ -103,86 +235,211 @@ class FleetOrchestrator:
 
         return fleets
 
-    def run(self):
+    def validate_fleets(self):
+        # Reject a bad fleet before any other fleet starts upgrading
+        for fleet_name, fleet_clusters in self._group_by_fleet().items():
+            canaries = [c for c in fleet_clusters if c.is_canary]
+            if len(canaries) != 1:
+                raise ConfigurationError(f"Fleet '{fleet_name}' must have exactly 1 canary cluster")
+
+    def plan(self, live=False):
+        """Computes the upgrade set and schedule without touching any cluster."""
+
+        self.validate_fleets()
+        return UpgradePlanner(self, live=live).build()
+
+    def run(self, plan=None):
+
+        # Cancelled by the first failure that stops the run (a fleet without
+        # isolate_failures): admission stops and in-flight work is aborted
+        self._abort = cancellation.CancellationToken()
+        self.aborted = []
+
+        with self.tracer.activate(), cancellation.activate(self._abort):
+            try:
+                with tracing.span("run", tenant=self.tenant, env=self.env):
+                    if self.teardown:
+                        # Left queued by earlier runs
+                        self.teardown.resume()
+
+                    self._run(plan)
+                    self._finish_teardowns()
+            finally:
+                self.tracer.finish()
+
+    def _run(self, plan):
 
         logger.info(f"Starting fleet upgrade orchestration for env={self.env}")
 
-        fleets = self._group_by_fleet()
+        # Skips are decided once, in bulk, before any executor exists
+        if plan is None:
+            plan = self.plan()
 
-        for fleet_name, fleet_clusters in fleets.items():
-            logger.info(f"Processing fleet: {fleet_name}")
-            self._run_fleet(fleet_name, fleet_clusters)
+        plan.log()
+
+        for fleet_name in plan.fleets:
+            limit = self.fleet_overrides.get(fleet_name, {}).get("max_parallel")
+            if limit:
+                self.budget.set_limit(self._fleet_key(fleet_name), limit)
+
+        failures = {}
+
+        with ThreadPoolExecutor(max_workers=len(plan.fleets) or 1) as executor:
+
+            future_to_fleet = {
+                tracing.submit(executor, self._run_fleet, fleet_plan): fleet_name
+                for fleet_name, fleet_plan in plan.fleets.items()
+            }
+
+            for future, fleet_name in future_to_fleet.items():
+                try:
+                    future.result()
+                except Exception as e:
+                    failures[fleet_name] = e
+
+        if failures:
+            for fleet_name, e in failures.items():
+                logger.error(f"Fleet '{fleet_name}' failed: {e}")
+            self._log_aborted()
+            self._log_teardowns()
+            raise UpgradeFailedError(f"{len(failures)} fleet(s) failed: {', '.join(failures)}")
+
+    def _log_aborted(self):
+
+        if self.aborted:
+            logger.error(
+                f"Aborted mid-flight ({len(self.aborted)}): "
+                f"{', '.join(sorted(c.name for c in self.aborted))}"
+            )
+
+        if self._abort.is_cancelled():
+            logger.error(
+                f"Run stopped {time.monotonic() - self._abort.cancelled_at:.1f}s "
+                f"after: {self._abort.reason}"
+            )
 
-    def _run_fleet(self, fleet_name: str, clusters: list):
+    def _finish_teardowns(self):
 
-        canaries = [c for c in clusters if c.is_canary]
-        regular = [c for c in clusters if not c.is_canary]
+        if not self.teardown or not self.teardown.pending():
+            return
+
+        if not self.wait_for_teardown:
+            logger.info(
+                f"{self.teardown.pending()} blue teardown(s) still queued; the next run "
+                f"or python -m app.teardown picks them up"
+            )
+            return
 
-        if len(canaries) != 1:
-            raise Exception(f"Fleet '{fleet_name}' must have exactly 1 canary cluster")
+        with tracing.span("teardown"):
+            logger.info(f"Waiting for {self.teardown.pending()} blue teardown(s)")
+            self.teardown.join()
 
-        canary = canaries[0]
+        if self.teardown.failed:
+            raise UpgradeFailedError(
+                f"{len(self.teardown.failed)} blue teardown(s) failed: {', '.join(self.teardown.failed)}"
+            )
 
-        # -------------------------
-        # 1️⃣ Canary
-        # -------------------------
-        logger.info(f"Starting Canary Upgrade: {canary.name}")
+    def _log_teardowns(self):
 
-        self._upgrade_cluster(canary)
+        if self.teardown and self.teardown.pending():
+            logger.warning(
+                f"{self.teardown.pending()} blue teardown(s) left queued; the next run "
+                f"or python -m app.teardown picks them up"
+            )
 
-        self._bake("canary")
+    def _run_fleet(self, fleet_plan):
+        with tracing.span("fleet", fleet=fleet_plan.name):
+            self._upgrade_fleet(fleet_plan)
 
-        # -------------------------
-        # 2️⃣ Waves
-        # -------------------------
-        waves = self._chunk_clusters(regular)
+    def _upgrade_fleet(self, fleet_plan):
 
-        for wave_number, wave in enumerate(waves, start=1):
+        fleet_name = fleet_plan.name
+        logger.info(f"Processing fleet: {fleet_name}")
 
-            logger.info(f"Starting Wave {wave_number}")
-            logger.info(f"Running up to {self.max_parallel} clusters in parallel")
+        overrides = self.fleet_overrides.get(fleet_name, {})
+        isolate = overrides.get("isolate_failures", False)
 
-            with ThreadPoolExecutor(max_workers=self.max_parallel) as executor:
+        if not fleet_plan.clusters():
+            logger.info(f"Fleet '{fleet_name}' already upgraded, nothing to do")
+            return
 
-                future_to_cluster = {
-                    executor.submit(self._upgrade_cluster, cluster): cluster
-                    for cluster in wave
-                }
+        # Tags every cluster's spans with where it sits in the plan
+        waves = {c.name: number for number, wave in enumerate(fleet_plan.waves, start=1) for c in wave}
+        if fleet_plan.canary:
+            waves[fleet_plan.canary.name] = "canary"
 
-                for future in as_completed(future_to_cluster):
-                    cluster = future_to_cluster[future]
-                    try:
-                        future.result()
-                    except Exception as e:
-                        logger.error(
-                            f"Wave {wave_number} failed on cluster {cluster.name}"
-                        )
-                        logger.error("Stopping further rollout")
-                        raise
+        upgrade = self._budgeted_upgrade(fleet_name, waves)
 
-            self._bake(f"wave {wave_number}")
+        # An isolated fleet's failure only cancels its own clusters
+        token = cancellation.CancellationToken(parent=self._abort) if isolate else self._abort
 
+        try:
+            if token.is_cancelled():
+                raise UpgradeFailedError(f"Fleet '{fleet_name}' not started, run aborted")
+
+            with cancellation.activate(token):
+
+                # -------------------------
+                # 1️⃣ Canary (already upgraded on a resumed run)
+                # -------------------------
+                if fleet_plan.canary:
+                    logger.info(f"Starting Canary Upgrade: {fleet_plan.canary.name}")
+
+                    upgrade(fleet_plan.canary)
+
+                    self._bake("canary", [fleet_plan.canary])
+
+                # -------------------------
+                # 2️⃣ Waves / sliding window
+                # -------------------------
+                max_parallel = overrides.get("max_parallel", self.max_parallel)
+                result = self._scheduler(max_parallel, token, fleet_name).run_waves(fleet_plan.waves, upgrade)
+                result.raise_if_failed(f"Fleet '{fleet_name}'")
+
+        except Exception as e:
+            if not isolate:
+                logger.error(f"Fleet '{fleet_name}' failed, stopping all fleets")
+            token.cancel(f"fleet '{fleet_name}' failed: {e}")
+            raise
 
         logger.info(f"Fleet '{fleet_name}' completed successfully")
 
+    def _fleet_key(self, fleet_name):
+        return f"fleet:{self.tenant}/{self.env}/{fleet_name}"
+
+    def _budgeted_upgrade(self, fleet_name, waves=None):
+
+        # Account/region keys only bite when a batch run sets limits for them
+        keys = [
+            "global",
+            self.budget_key,
+            f"account:{self.account_id}",
+            f"region:{self.region}",
+            self._fleet_key(fleet_name)
+        ]
+
+        def upgrade(cluster):
+            with tracing.span("cluster", cluster=cluster.name, wave=(waves or {}).get(cluster.name)):
+                waiting = time.time_ns()
+                with self.budget.slot(keys):
+                    tracing.record("slot_wait", waiting, time.time_ns())
+                    # The run may have been cancelled while this waited for a slot
+                    cancellation.current().raise_if_cancelled()
+                    return self._upgrade_cluster(cluster)
+
+        return upgrade
 
     def _upgrade_cluster(self, cluster):
         # time.sleep(3)
 
-        if self.state.already_upgraded(cluster):
-            logger.info(f"Skipping {cluster.name} (already upgraded)")
-            return
-
+        # Already-upgraded clusters were dropped by the plan; the lock's
+        # condition still guards against a concurrent run.
         try:
             self.state.lock(cluster)
 
             logger.info(f"Upgrading cluster {cluster.name}")
-            if cluster.env in ["dev"]:
-                strategy = InPlaceStrategy(self.config)
-            else:
-                strategy = BlueGreenUpgradeStrategy(self.config)
 
-            strategy.upgrade(cluster)
+            self.strategy.upgrade(cluster)
 
             self.state.mark_success(cluster)
 
@@ -190,31 +447,38 @@ class FleetOrchestrator:
             logger.warning(f"Lock not acquired for {cluster.name}: {e}")
             raise
 
+        except UpgradeAbortedError as e:
+            logger.warning(f"Upgrade aborted for {cluster.name}")
+            self.aborted.append(cluster)
+            self.state.mark_failure(cluster, str(e), status="ABORTED")
+            raise
+
         except Exception as e:
             logger.error(f"Upgrade failed for {cluster.name}")
             self.state.mark_failure(cluster, str(e))
             raise
 
-    def _chunk_clusters(self, clusters: list):
+    def _scheduler(self, max_parallel, token, fleet_name):
 
-        if not clusters:
-            return []
+        # Cancel as soon as the budget runs out, not once the window drains
+        def exhausted(reason):
+            token.cancel(f"fleet '{fleet_name}' error budget exhausted, {reason}")
 
-        total = len(clusters)
-        wave_size = max(1, int(total * self.wave_percent / 100))
+        if self.scheduler_mode == "sliding":
+            return SlidingWindowScheduler(max_parallel, self.max_failures, token.is_cancelled, exhausted)
 
-        waves = [
-            clusters[i:i + wave_size]
-            for i in range(0, total, wave_size)
-        ]
-
-        logger.info(f"Total clusters: {total}")
-        logger.info(f"Wave size: {wave_size}")
-        logger.info(f"Total waves: {len(waves)}")
+        return WaveScheduler(
+            max_parallel=max_parallel,
+            wave_percent=self.wave_percent,
+            bake_fn=self._bake,
+            max_failures=self.max_failures,
+            should_stop=token.is_cancelled,
+            on_exhausted=exhausted
+        )
 
-        return waves
+    def _chunk_clusters(self, clusters: list):
+        return chunk_clusters(clusters, self.wave_percent)
 
-    def _bake(self, stage: str):
-        logger.info(f"Baking after {stage} for {self.bake_seconds} seconds...")
-        # time.sleep(self.bake_seconds)
-        logger.info("Bake complete")
\ No newline at end of file
+    def _bake(self, stage: str, clusters: list):
+        with tracing.span("bake", stage=stage):
+            self.baker.bake(stage, clusters)
\ No newline at end of file
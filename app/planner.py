@@ -0,0 +1,262 @@
+import heapq
+import math
+from app.logger import LoggerFactory
+from app.scheduler import chunk_clusters
+
+logger = LoggerFactory.get_logger("planner")
+
+# Rough wall-clock cost of one cluster upgrade, by strategy
+ESTIMATED_UPGRADE_SECONDS = {
+    "in-place": 25 * 60,
+    "blue-green": 75 * 60
+}
+
+# With the blueprint's node_groups: a fixed control-plane / cluster part plus
+# rolling the largest group (groups roll concurrently, nodes one at a time).
+# A 15-node largest group comes out at the flat estimates above.
+CONTROL_PLANE_SECONDS = {
+    "in-place": 10 * 60,
+    "blue-green": 45 * 60
+}
+NODE_ROLL_SECONDS = {
+    "in-place": 1 * 60,
+    "blue-green": 2 * 60
+}
+
+
+class UpgradeCostModel:
+    """
+    Estimated upgrade seconds per cluster: how long its last upgrade took
+    when the state table recorded it, else a control-plane cost plus
+    rolling its node groups, else the strategy's flat estimate.
+    """
+
+    def __init__(self, strategy_name, state=None):
+        self.strategy_name = strategy_name
+        self.state = state
+        self._estimates = {}
+
+    def estimate(self, cluster) -> int:
+
+        if cluster.name not in self._estimates:
+            self._estimates[cluster.name] = (
+                self._recorded(cluster)
+                or self._from_node_groups(cluster)
+                or ESTIMATED_UPGRADE_SECONDS.get(self.strategy_name, 60 * 60)
+            )
+        return self._estimates[cluster.name]
+
+    def _recorded(self, cluster):
+
+        # Served from the planner's prefetch
+        item = self.state.get(cluster) if self.state else None
+        if not item:
+            return None
+
+        if item.get("last_duration_seconds"):
+            return int(item["last_duration_seconds"])
+
+        # Items written before durations were recorded
+        if item.get("status") == "SUCCESS" and item.get("completed_at") and item.get("started_at"):
+            return int(item["completed_at"]) - int(item["started_at"]) or None
+
+        return None
+
+    def _from_node_groups(self, cluster):
+
+        if not cluster.node_groups:
+            return None
+
+        largest = max(
+            group.get("desired", group.get("min", 1)) or 1
+            for group in cluster.node_groups.values()
+        )
+        return (
+            CONTROL_PLANE_SECONDS.get(self.strategy_name, 30 * 60)
+            + largest * NODE_ROLL_SECONDS.get(self.strategy_name, 3 * 60)
+        )
+
+    def longest_first(self, clusters):
+        # Stable, so equal estimates keep blueprint order
+        return sorted(clusters, key=self.estimate, reverse=True)
+
+
+def window_seconds(costs, max_parallel):
+    """Finish time of costs run in order through max_parallel slots."""
+
+    slots = [0] * max(1, min(max_parallel, len(costs)))
+    for cost in costs:
+        heapq.heappush(slots, heapq.heappop(slots) + cost)
+    return max(slots)
+
+
+class FleetPlan:
+
+    def __init__(self, name, canary, waves, skipped, estimated_seconds):
+        self.name = name
+        self.canary = canary
+        self.waves = waves
+        self.skipped = skipped
+        self.estimated_seconds = estimated_seconds
+
+    def clusters(self):
+        canary = [self.canary] if self.canary else []
+        return canary + [c for wave in self.waves for c in wave]
+
+    def to_dict(self):
+        return {
+            "canary": self.canary.name if self.canary else None,
+            "waves": [[c.name for c in wave] for wave in self.waves],
+            "skipped": {c.name: reason for c, reason in self.skipped},
+            "estimated_seconds": self.estimated_seconds
+        }
+
+
+class UpgradePlan:
+
+    def __init__(self, tenant, env, region, scheduler, fleets, estimated_seconds):
+        self.tenant = tenant
+        self.env = env
+        self.region = region
+        self.scheduler = scheduler
+        self.fleets = fleets
+        self.estimated_seconds = estimated_seconds
+
+    def clusters(self):
+        return [c for fleet in self.fleets.values() for c in fleet.clusters()]
+
+    def to_dict(self):
+        return {
+            "tenant": self.tenant,
+            "env": self.env,
+            "region": self.region,
+            "scheduler": self.scheduler,
+            "estimated_seconds": self.estimated_seconds,
+            "fleets": {name: fleet.to_dict() for name, fleet in self.fleets.items()}
+        }
+
+    def log(self):
+
+        logger.info(
+            f"Plan for tenant={self.tenant} env={self.env}: "
+            f"{len(self.clusters())} clusters to upgrade, "
+            f"~{self.estimated_seconds // 60} min ({self.scheduler})"
+        )
+
+        for name, fleet in self.fleets.items():
+            logger.info(f"Fleet '{name}' (~{fleet.estimated_seconds // 60} min)")
+            if fleet.canary:
+                logger.info(f"  canary: {fleet.canary.name}")
+            for number, wave in enumerate(fleet.waves, start=1):
+                logger.info(f"  wave {number}: {', '.join(c.name for c in wave)}")
+            for cluster, reason in fleet.skipped:
+                logger.info(f"  skip {cluster.name}: {reason}")
+
+
+class UpgradePlanner:
+    """
+    Works out exactly which clusters a run would upgrade, and in what
+    canary/wave order, from the blueprint and the recorded state (plus,
+    optionally, live EKS versions) without triggering anything.
+    """
+
+    def __init__(self, orchestrator, live=False, eks=None):
+        self.orchestrator = orchestrator
+        self.live = live
+        self.eks = eks
+
+    def build(self) -> UpgradePlan:
+
+        o = self.orchestrator
+        fleets = o._group_by_fleet()
+
+        # One bulk read of recorded state for the whole blueprint
+        o.state.prefetch(o.clusters)
+
+        live_versions = {}
+        if self.live:
+            eks = self.eks or o.eks
+            live_versions = eks.cluster_versions(c.name for c in o.clusters)
+
+        cost = UpgradeCostModel(o.strategy.NAME, o.state)
+
+        plans = {}
+        for fleet_name, clusters in fleets.items():
+
+            pending, skipped = [], []
+
+            for cluster in clusters:
+                reason = self._skip_reason(cluster, live_versions)
+                if reason:
+                    skipped.append((cluster, reason))
+                else:
+                    pending.append(cluster)
+
+            canaries = [c for c in pending if c.is_canary]
+            regular = [c for c in pending if not c.is_canary]
+
+            if o.order == "duration":
+                # Waves keep their wave_percent size, so the blast radius
+                # is unchanged; slow clusters share waves instead of each
+                # stretching a different one, and start first in the window
+                regular = cost.longest_first(regular)
+
+            if o.scheduler_mode == "waves":
+                waves = chunk_clusters(regular, o.wave_percent)
+            else:
+                # One window; the order is the admission order
+                waves = [regular] if regular else []
+
+            max_parallel = o.fleet_overrides.get(fleet_name, {}).get("max_parallel", o.max_parallel)
+
+            plans[fleet_name] = FleetPlan(
+                name=fleet_name,
+                canary=canaries[0] if canaries else None,
+                waves=waves,
+                skipped=skipped,
+                estimated_seconds=self._estimate(
+                    canaries[0] if canaries else None, waves, max_parallel, cost,
+                    o.scheduler_mode == "waves"
+                )
+            )
+
+        # Fleets run concurrently, but all of them share the global cap
+        total_seconds = sum(cost.estimate(c) for p in plans.values() for c in p.clusters())
+        estimated = max(
+            [p.estimated_seconds for p in plans.values()] +
+            [math.ceil(total_seconds / o.global_max_parallel)]
+        )
+
+        return UpgradePlan(
+            tenant=o.tenant,
+            env=o.env,
+            region=o.region,
+            scheduler=o.scheduler_mode,
+            fleets=plans,
+            estimated_seconds=estimated
+        )
+
+    def _skip_reason(self, cluster, live_versions):
+
+        if self.orchestrator.state.already_upgraded(cluster):
+            return "already upgraded"
+
+        if live_versions.get(cluster.name) == cluster.version:
+            return f"live version already {cluster.version}"
+
+        return None
+
+    def _estimate(self, canary, waves, max_parallel, cost, bake_per_wave):
+
+        bake = self.orchestrator.bake_seconds
+        seconds = 0
+
+        if canary:
+            seconds += cost.estimate(canary) + bake
+
+        for wave in waves:
+            seconds += window_seconds([cost.estimate(c) for c in wave], max_parallel)
+            if bake_per_wave:
+                seconds += bake
+
+        return seconds
@@ -0,0 +1,168 @@
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from app.logger import LoggerFactory
+from app.exceptions import UpgradeAbortedError, UpgradeFailedError
+from app import tracing
+
+logger = LoggerFactory.get_logger("scheduler")
+
+
+def chunk_clusters(clusters: list, wave_percent) -> list:
+    """Slices clusters into waves of wave_percent of the fleet (at least 1)."""
+
+    if not clusters:
+        return []
+
+    total = len(clusters)
+    wave_size = max(1, int(total * wave_percent / 100))
+
+    waves = [
+        clusters[i:i + wave_size]
+        for i in range(0, total, wave_size)
+    ]
+
+    logger.info(f"Total clusters: {total}")
+    logger.info(f"Wave size: {wave_size}")
+    logger.info(f"Total waves: {len(waves)}")
+
+    return waves
+
+
+class RolloutResult:
+
+    def __init__(self):
+        self.succeeded = []
+        self.failed = []
+        # Cut short mid-flight because the run (or fleet) was cancelled
+        self.aborted = []
+        self.not_started = []
+
+    def merge(self, other):
+        self.succeeded.extend(other.succeeded)
+        self.failed.extend(other.failed)
+        self.aborted.extend(other.aborted)
+        self.not_started.extend(other.not_started)
+
+    def raise_if_failed(self, scope):
+
+        if not self.failed and not self.aborted:
+            return
+
+        names = ", ".join(c.name for c, _ in self.failed)
+        failed = f"{len(self.failed)} cluster(s) failed ({names})" if self.failed else "0 cluster(s) failed"
+        raise UpgradeFailedError(
+            f"{scope}: {failed}; {len(self.aborted)} aborted, {len(self.not_started)} not started"
+        )
+
+
+class SlidingWindowScheduler:
+    """
+    Keeps up to max_parallel clusters in flight, starting the next one as
+    soon as any slot frees. Admission stops once max_failures clusters have
+    failed, or should_stop() turns true. on_exhausted(reason) is called the
+    moment the error budget runs out, so the caller can cancel what is
+    still running instead of waiting for it.
+    """
+
+    def __init__(self, max_parallel, max_failures=1, should_stop=None, on_exhausted=None):
+        self.max_parallel = max_parallel
+        self.max_failures = max_failures
+        self.should_stop = should_stop or (lambda: False)
+        self.on_exhausted = on_exhausted or (lambda reason: None)
+
+    def run(self, clusters, upgrade_fn, failures_so_far=0) -> RolloutResult:
+
+        result = RolloutResult()
+        pending = list(clusters)
+        in_flight = {}
+
+        logger.info(
+            f"Sliding window over {len(pending)} clusters "
+            f"(max_parallel={self.max_parallel}, max_failures={self.max_failures})"
+        )
+
+        with ThreadPoolExecutor(max_workers=self.max_parallel) as executor:
+
+            while pending or in_flight:
+
+                while (pending and len(in_flight) < self.max_parallel
+                       and failures_so_far + len(result.failed) < self.max_failures
+                       and not self.should_stop()):
+                    cluster = pending.pop(0)
+                    in_flight[tracing.submit(executor, upgrade_fn, cluster)] = cluster
+
+                if not in_flight:
+                    break
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    cluster = in_flight.pop(future)
+                    try:
+                        future.result()
+                        result.succeeded.append(cluster)
+                    except UpgradeAbortedError as e:
+                        logger.warning(f"Cluster {cluster.name} aborted: {e}")
+                        result.aborted.append(cluster)
+                    except Exception as e:
+                        logger.error(f"Cluster {cluster.name} failed: {e}")
+                        result.failed.append((cluster, e))
+
+                        if failures_so_far + len(result.failed) == self.max_failures:
+                            logger.error("Error budget exhausted, admitting no more clusters")
+                            self.on_exhausted(f"{cluster.name} failed: {e}")
+
+        result.not_started = pending
+        return result
+
+    def run_waves(self, waves, upgrade_fn) -> RolloutResult:
+        # No barriers here: waves only decide admission order
+        return self.run([c for wave in waves for c in wave], upgrade_fn)
+
+
+class WaveScheduler:
+    """
+    Barrier-synchronised waves: each wave runs to completion and bakes
+    before the next one starts.
+    """
+
+    def __init__(self, max_parallel, wave_percent, bake_fn, max_failures=1, should_stop=None,
+                 on_exhausted=None):
+        self.max_parallel = max_parallel
+        self.wave_percent = wave_percent
+        self.bake_fn = bake_fn
+        self.max_failures = max_failures
+        self.should_stop = should_stop or (lambda: False)
+        self.on_exhausted = on_exhausted
+
+    def run(self, clusters, upgrade_fn) -> RolloutResult:
+        return self.run_waves(chunk_clusters(clusters, self.wave_percent), upgrade_fn)
+
+    def run_waves(self, waves, upgrade_fn) -> RolloutResult:
+
+        result = RolloutResult()
+        window = SlidingWindowScheduler(
+            self.max_parallel, self.max_failures, self.should_stop, self.on_exhausted
+        )
+
+        for wave_number, wave in enumerate(waves, start=1):
+
+            if len(result.failed) >= self.max_failures or self.should_stop():
+                logger.error("Stopping further rollout")
+                for remaining in waves[wave_number - 1:]:
+                    result.not_started.extend(remaining)
+                break
+
+            logger.info(f"Starting Wave {wave_number}")
+            logger.info(f"Running up to {self.max_parallel} clusters in parallel")
+
+            with tracing.span("wave", wave=wave_number):
+                wave_result = window.run(wave, upgrade_fn, failures_so_far=len(result.failed))
+                result.merge(wave_result)
+
+                if wave_result.failed:
+                    logger.error(f"Wave {wave_number} had {len(wave_result.failed)} failure(s)")
+
+                if len(result.failed) < self.max_failures and not self.should_stop():
+                    self.bake_fn(f"wave {wave_number}", wave)
+
+        return result
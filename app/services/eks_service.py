@@ -0,0 +1,154 @@
+import base64
+import hashlib
+import os
+import tempfile
+import threading
+import time
+import boto3
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import ClientError
+from botocore.signers import RequestSigner
+from app.logger import LoggerFactory
+
+logger = LoggerFactory.get_logger("eks-service")
+
+# EKS accepts tokens for 15 minutes; refresh well before that
+TOKEN_TTL_SECONDS = 600
+
+
+class EKSService:
+
+    def __init__(self, region, max_workers=10, session=None):
+        self.region = region
+        self.client = boto3.client("eks", region_name=region)
+        self.sts = boto3.client("sts", region_name=region)
+        self.max_workers = max_workers
+        self.http = session or requests.Session()
+
+        # cluster name -> (endpoint, CA bundle path, token, token expiry)
+        self._kube = {}
+        self._kube_lock = threading.Lock()
+
+    def describe_cluster(self, cluster_name):
+        try:
+            return self.client.describe_cluster(name=cluster_name)["cluster"]
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "ResourceNotFoundException":
+                return None
+            raise
+
+    def cluster_version(self, cluster_name):
+        cluster = self.describe_cluster(cluster_name)
+        return cluster["version"] if cluster else None
+
+    def cluster_versions(self, cluster_names):
+        """Live control plane versions, described concurrently. None if missing."""
+
+        names = list(cluster_names)
+
+        logger.info(f"Describing {len(names)} EKS clusters in {self.region}")
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            versions = list(executor.map(self.cluster_version, names))
+
+        return dict(zip(names, versions))
+
+    def list_nodegroups(self, cluster_name):
+
+        names = []
+        for page in self.client.get_paginator("list_nodegroups").paginate(clusterName=cluster_name):
+            names.extend(page["nodegroups"])
+        return names
+
+    def describe_nodegroup(self, cluster_name, nodegroup):
+        return self.client.describe_nodegroup(
+            clusterName=cluster_name,
+            nodegroupName=nodegroup
+        )["nodegroup"]
+
+    def kube_get(self, cluster_name, path, timeout=10):
+        """GET against the cluster's Kubernetes API using an IAM-derived token."""
+
+        endpoint, ca_path, token = self._kube_access(cluster_name)
+
+        return self.http.get(
+            f"{endpoint}{path}",
+            headers={"Authorization": f"Bearer {token}"},
+            verify=ca_path,
+            timeout=timeout
+        )
+
+    def _kube_access(self, cluster_name):
+
+        with self._kube_lock:
+            cached = self._kube.get(cluster_name)
+            if cached and cached[3] > time.time():
+                return cached[:3]
+
+        cluster = self.describe_cluster(cluster_name)
+        if not cluster:
+            raise Exception(f"EKS cluster {cluster_name} not found")
+
+        ca_path = self._ca_file(cluster_name, base64.b64decode(cluster["certificateAuthority"]["data"]))
+        access = (cluster["endpoint"], ca_path, self._token(cluster_name), time.time() + TOKEN_TTL_SECONDS)
+
+        with self._kube_lock:
+            previous = self._kube.get(cluster_name)
+            self._kube[cluster_name] = access
+
+        # Only a replaced cluster (same name, new CA) leaves a stale file behind
+        if previous and previous[1] != ca_path:
+            try:
+                os.remove(previous[1])
+            except OSError:
+                pass
+
+        return access[:3]
+
+    @staticmethod
+    def _ca_file(cluster_name, ca_data):
+        """One CA bundle file per cluster and certificate, reused across token refreshes."""
+
+        path = os.path.join(
+            tempfile.gettempdir(),
+            f"{cluster_name}-ca-{hashlib.sha256(ca_data).hexdigest()[:16]}.crt"
+        )
+
+        if not os.path.exists(path):
+            # Write-then-rename so a concurrent reader never sees a partial bundle
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(ca_data)
+            os.replace(tmp, path)
+
+        return path
+
+    def _token(self, cluster_name):
+        # Same scheme as `aws eks get-token`: a presigned STS
+        # GetCallerIdentity URL bound to the cluster name.
+        signer = RequestSigner(
+            self.sts.meta.service_model.service_id,
+            self.region,
+            "sts",
+            "v4",
+            self.sts._request_signer._credentials,
+            self.sts.meta.events
+        )
+
+        url = signer.generate_presigned_url(
+            {
+                "method": "GET",
+                "url": f"https://sts.{self.region}.amazonaws.com/"
+                       "?Action=GetCallerIdentity&Version=2011-06-15",
+                "body": {},
+                "headers": {"x-k8s-aws-id": cluster_name},
+                "context": {}
+            },
+            region_name=self.region,
+            expires_in=60,
+            operation_name=""
+        )
+
+        encoded = base64.urlsafe_b64encode(url.encode()).decode().rstrip("=")
+        return f"k8s-aws-v1.{encoded}"
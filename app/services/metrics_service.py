@@ -0,0 +1,32 @@
+import requests
+from app.logger import LoggerFactory
+
+logger = LoggerFactory.get_logger("metrics-service")
+
+
+class PrometheusClient:
+    """Minimal client for a Prometheus-compatible /api/v1/query endpoint."""
+
+    def __init__(self, base_url: str, session=None, timeout=10):
+        self.base_url = base_url.rstrip("/")
+        self.http = session or requests.Session()
+        self.timeout = timeout
+
+    def query(self, promql: str):
+        """Instant query; returns [(labels, value), ...] for a vector result."""
+
+        response = self.http.get(
+            f"{self.base_url}/api/v1/query",
+            params={"query": promql},
+            timeout=self.timeout
+        )
+        response.raise_for_status()
+
+        body = response.json()
+        if body.get("status") != "success":
+            raise Exception(f"Prometheus query failed: {body.get('error')}")
+
+        return [
+            (sample["metric"], float(sample["value"][1]))
+            for sample in body["data"]["result"]
+        ]
@@ -1,41 +1,562 @@
+import argparse
+import fcntl
+import hashlib
+import heapq
+import json
+import os
+import queue
+import re
+import signal
 import subprocess
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from app.logger import LoggerFactory
 
 logger = LoggerFactory.get_logger("terraform-service")
 
+# Output lines kept in memory for the error message of a failed command
+TAIL_LINES = 200
+
+# Slowest resources kept per command; every duration still goes to the sink
+SLOWEST_KEPT = 20
+
+# Grace period between SIGTERM and SIGKILL for a stalled process
+KILL_GRACE_SECONDS = 30
+
+DEFAULT_PLUGIN_CACHE_DIR = os.path.expanduser("~/.terraform.d/plugin-cache")
+
+RESOURCE_START = re.compile(r"^(.+?): (Creating|Modifying|Destroying|Reading)\.\.\.")
+RESOURCE_DONE = re.compile(
+    r"^(.+?): (Creation|Modifications|Destruction|Read) complete after (\S+?)(?: \[|$)"
+)
+PLAN_SUMMARY = re.compile(r"Plan: (\d+) to add, (\d+) to change, (\d+) to destroy")
+APPLY_SUMMARY = re.compile(r"(?:Apply|Destroy) complete! Resources: (\d+) added, (\d+) changed, (\d+) destroyed")
+
+ACTIONS = {
+    "Creating": "create", "Creation": "create",
+    "Modifying": "modify", "Modifications": "modify",
+    "Destroying": "destroy", "Destruction": "destroy",
+    "Reading": "read", "Read": "read"
+}
+
+
+def parse_duration(text):
+    """Terraform's elapsed format ("1h2m3s", "45s") in seconds."""
+    units = {"h": 3600, "m": 60, "s": 1}
+    return sum(float(n) * units[u] for n, u in re.findall(r"([\d.]+)([hms])", text))
+
+
+class TerraformSink:
+    """
+    Receives every output line and parsed progress event of a Terraform
+    command. Subclass to ship output elsewhere (files, Jenkins, metrics).
+    """
+
+    def line(self, text):
+        pass
+
+    def progress(self, event):
+        pass
+
+
+class TerraformProgress:
+    """
+    Turns Terraform's human output into progress events as it streams:
+    resource start/complete (with elapsed seconds) and plan/apply totals.
+    """
+
+    def __init__(self):
+        self.started = {}
+        self.completed = {"create": 0, "modify": 0, "destroy": 0, "read": 0}
+        # Min-heap of the SLOWEST_KEPT longest (elapsed, address), so memory
+        # does not grow with the number of resources
+        self.durations = []
+        self.planned = None
+        self.applied = None
+        self.returncode = None
+
+    def feed(self, line):
+
+        match = RESOURCE_DONE.match(line)
+        if match:
+            address, action, elapsed = match.group(1), ACTIONS[match.group(2)], parse_duration(match.group(3))
+            self.started.pop(address, None)
+            self.completed[action] += 1
+            if len(self.durations) < SLOWEST_KEPT:
+                heapq.heappush(self.durations, (elapsed, address))
+            elif elapsed > self.durations[0][0]:
+                heapq.heapreplace(self.durations, (elapsed, address))
+            return {"kind": "complete", "address": address, "action": action, "elapsed_seconds": elapsed}
+
+        match = RESOURCE_START.match(line)
+        if match:
+            address, action = match.group(1), ACTIONS[match.group(2)]
+            self.started[address] = time.monotonic()
+            return {"kind": "start", "address": address, "action": action}
+
+        match = PLAN_SUMMARY.search(line)
+        if match:
+            self.planned = dict(zip(["add", "change", "destroy"], map(int, match.groups())))
+            return {"kind": "plan", **self.planned}
+
+        match = APPLY_SUMMARY.search(line)
+        if match:
+            self.applied = dict(zip(["add", "change", "destroy"], map(int, match.groups())))
+            return {"kind": "apply", **self.applied}
+
+        return None
+
+    def slowest(self, count=5):
+        return [(address, elapsed) for elapsed, address in heapq.nlargest(count, self.durations)]
+
 
 class TerraformService:
+    """
+    Runs Terraform in a working dir, streaming its output line by line to
+    the logger and an optional sink instead of buffering it. Only the last
+    TAIL_LINES lines are kept in memory, and a command that prints nothing
+    for stall_timeout_seconds is killed.
+    """
 
-    def __init__(self, working_dir):
+    def __init__(self, working_dir, sink=None, stall_timeout_seconds=900, plan_cache=None,
+                 plugin_cache=None):
         self.working_dir = working_dir
+        self.sink = sink or TerraformSink()
+        self.stall_timeout_seconds = stall_timeout_seconds
+        self.plan_cache = plan_cache
+        self.plugin_cache = plugin_cache
+        self.has_changes = None
 
-    def _run(self, command):
+    def _run(self, command, ok_codes=(0,)):
         logger.info(f"Running: {' '.join(command)}")
 
-        result = subprocess.run(
+        started = time.monotonic()
+        progress = TerraformProgress()
+        tail = deque(maxlen=TAIL_LINES)
+
+        process = subprocess.Popen(
             command,
             cwd=self.working_dir,
-            capture_output=True,
-            text=True
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            bufsize=1,
+            # Own process group, so a kill also takes the provider plugins
+            start_new_session=True,
+            env=self._env()
         )
 
-        if result.returncode != 0:
-            logger.error(result.stderr)
-            raise Exception(f"Terraform command failed: {command}")
+        # A reader thread lets the stall timeout fire while readline blocks
+        lines = queue.Queue(maxsize=1000)
+        reader = threading.Thread(target=self._read, args=(process.stdout, lines), daemon=True)
+        reader.start()
+
+        while True:
+            try:
+                line = lines.get(timeout=self.stall_timeout_seconds)
+            except queue.Empty:
+                self._kill(process)
+                raise Exception(
+                    f"Terraform command stalled (no output for {self.stall_timeout_seconds}s): {command}"
+                )
+
+            if line is None:
+                break
+
+            tail.append(line)
+            logger.info(line)
+            self.sink.line(line)
+
+            event = progress.feed(line)
+            if event:
+                self.sink.progress(event)
+
+        returncode = process.wait()
+        elapsed = time.monotonic() - started
+        progress.returncode = returncode
 
-        logger.info(result.stdout)
+        if returncode not in ok_codes:
+            logger.error(f"Terraform exited {returncode} after {elapsed:.0f}s")
+            raise Exception(
+                f"Terraform command failed: {command}\n" + "\n".join(list(tail)[-20:])
+            )
+
+        completed = ", ".join(f"{n} {a}d" for a, n in progress.completed.items() if n and a != "read")
+        logger.info(f"Finished {command[1]} in {elapsed:.0f}s" + (f" ({completed})" if completed else ""))
+
+        for address, seconds in progress.slowest(3):
+            logger.info(f"  slowest: {address} {seconds:.0f}s")
+
+        return progress
+
+    def _env(self):
+        env = {**os.environ, "TF_IN_AUTOMATION": "1"}
+        if self.plugin_cache:
+            env["TF_PLUGIN_CACHE_DIR"] = self.plugin_cache.path
+        return env
+
+    @staticmethod
+    def _read(stream, lines):
+        try:
+            for line in stream:
+                lines.put(line.rstrip("\n"))
+        finally:
+            stream.close()
+            lines.put(None)
+
+    @staticmethod
+    def _kill(process):
+        logger.error(f"Terraform (pid {process.pid}) stalled, terminating")
+        os.killpg(process.pid, signal.SIGTERM)
+        try:
+            process.wait(timeout=KILL_GRACE_SECONDS)
+        except subprocess.TimeoutExpired:
+            os.killpg(process.pid, signal.SIGKILL)
+            process.wait()
 
     def init(self):
-        self._run(["terraform", "init", "-input=false"])
+        """Runs terraform init; returns {"seconds", "cached_bytes", "saved_seconds"}."""
+
+        started = time.monotonic()
+
+        if self.plugin_cache:
+            with self.plugin_cache.locked_for(self.working_dir):
+                self._run(["terraform", "init", "-input=false", "-no-color"])
+            self.plugin_cache.mark_warm(self.working_dir)
+        else:
+            self._run(["terraform", "init", "-input=false", "-no-color"])
+
+        seconds = time.monotonic() - started
+        cached_bytes = self.plugin_cache.linked_bytes(self.working_dir) if self.plugin_cache else 0
+        saved_seconds = self.plugin_cache.download_seconds(cached_bytes) if self.plugin_cache else 0
+
+        if cached_bytes:
+            logger.info(
+                f"init {self.working_dir}: {seconds:.0f}s, {cached_bytes / 2**20:.0f} MiB of providers "
+                f"from the plugin cache (~{saved_seconds:.0f}s download saved)"
+            )
+
+        return {"seconds": seconds, "cached_bytes": cached_bytes, "saved_seconds": saved_seconds}
+
+    def plan(self, variables=None):
+        """Writes tfplan; returns whether it contains any changes."""
+
+        cmd = ["terraform", "plan", "-input=false", "-no-color", "-detailed-exitcode", "-out=tfplan"]
+        for key, value in sorted((variables or {}).items()):
+            cmd.extend(["-var", f"{key}={value}"])
+
+        # -detailed-exitcode: 0 = no changes, 2 = changes, 1 = error
+        progress = self._run(cmd, ok_codes=(0, 2))
+        self.has_changes = progress.returncode == 2
 
-    def plan(self):
-        self._run(["terraform", "plan", "-out=tfplan"])
+        if not self.has_changes:
+            logger.info(f"No changes planned in {self.working_dir}")
+
+        return self.has_changes
 
     def apply(self):
-        self._run(["terraform", "apply", "-auto-approve", "tfplan"])
+
+        if self.has_changes is False:
+            logger.info(f"Skipping apply in {self.working_dir}: plan has no changes")
+            return
+
+        self._run(["terraform", "apply", "-auto-approve", "-no-color", "tfplan"])
+
+    def upgrade(self, variables=None, target_version=None):
+        """
+        plan + apply, skipped entirely when the inputs match the last
+        successful run recorded in the plan cache. Returns "cached",
+        "no-changes" or "applied".
+        """
+
+        fingerprint = self.fingerprint(variables, target_version)
+
+        if self.plan_cache and self.plan_cache.matches(self.working_dir, fingerprint):
+            logger.info(f"Inputs unchanged since last successful run, skipping {self.working_dir}")
+            return "cached"
+
+        changed = self.plan(variables)
+        if changed:
+            self.apply()
+
+        if self.plan_cache:
+            self.plan_cache.record(self.working_dir, fingerprint)
+
+        return "applied" if changed else "no-changes"
+
+    def fingerprint(self, variables=None, target_version=None):
+        """
+        Hash of everything that decides the plan: the root module's
+        configuration and lock file, every installed module (so module
+        version bumps count), the variables and the target version.
+        """
+
+        digest = hashlib.sha256()
+        digest.update(json.dumps(
+            {"variables": variables or {}, "target_version": target_version},
+            sort_keys=True, default=str
+        ).encode())
+
+        dirs = [self.working_dir]
+
+        modules_json = os.path.join(self.working_dir, ".terraform", "modules", "modules.json")
+        if os.path.exists(modules_json):
+            with open(modules_json) as f:
+                modules = json.load(f).get("Modules", [])
+            for module in sorted(modules, key=lambda m: m.get("Key", "")):
+                digest.update(f"{module.get('Key')}={module.get('Source')}@{module.get('Version')}".encode())
+                if module.get("Dir"):
+                    dirs.append(os.path.join(self.working_dir, module["Dir"]))
+
+        for directory in dict.fromkeys(os.path.normpath(d) for d in dirs):
+            for name in sorted(os.listdir(directory)) if os.path.isdir(directory) else []:
+                if name.endswith((".tf", ".tf.json", ".tfvars")) or name == ".terraform.lock.hcl":
+                    digest.update(name.encode())
+                    with open(os.path.join(directory, name), "rb") as f:
+                        digest.update(f.read())
+
+        return digest.hexdigest()
 
     def destroy(self, target=None):
-        cmd = ["terraform", "destroy", "-auto-approve"]
+        cmd = ["terraform", "destroy", "-auto-approve", "-no-color"]
         if target:
             cmd.extend(["-target", target])
         self._run(cmd)
+
+
+class PlanCache:
+    """
+    Fingerprint of the last successful plan/apply per working dir, kept in
+    a JSON file so a resumed rollout can skip clusters whose Terraform
+    inputs have not changed since.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def matches(self, working_dir, fingerprint):
+        with self._lock:
+            entry = self._load().get(os.path.abspath(working_dir))
+        return bool(entry) and entry["fingerprint"] == fingerprint
+
+    def record(self, working_dir, fingerprint):
+        with self._lock:
+            entries = self._load()
+            entries[os.path.abspath(working_dir)] = {"fingerprint": fingerprint, "recorded_at": int(time.time())}
+            self._save(entries)
+
+    def invalidate(self, working_dir):
+        with self._lock:
+            entries = self._load()
+            if entries.pop(os.path.abspath(working_dir), None):
+                self._save(entries)
+
+    def _save(self, entries):
+        # Write-then-rename so a crash never leaves a torn file
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(entries, f, indent=2, sort_keys=True)
+        os.replace(tmp, self.path)
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+
+class PluginCache:
+    """
+    Provider plugin cache shared by every working dir on the agent.
+
+    Terraform does not make concurrent writes to TF_PLUGIN_CACHE_DIR safe,
+    so prewarm() fills the cache under an exclusive file lock, once per
+    distinct provider lock file, and regular inits hold a shared lock while
+    they only link from it. An init whose lock file has not been seen yet
+    (or that has none) may download, so it takes the exclusive lock too.
+    """
+
+    WARM_DIR = ".warm"
+
+    def __init__(self, path=DEFAULT_PLUGIN_CACHE_DIR):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+        # Observed provider download rate, for the "time saved" estimate
+        self.bytes_per_second = None
+
+    @contextmanager
+    def exclusive(self):
+        with self._flock(fcntl.LOCK_EX):
+            yield
+
+    @contextmanager
+    def shared(self):
+        with self._flock(fcntl.LOCK_SH):
+            yield
+
+    @contextmanager
+    def _flock(self, mode):
+        with open(os.path.join(self.path, ".lock"), "a") as f:
+            fcntl.flock(f, mode)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def locked_for(self, working_dir):
+        """Shared lock if the cache already holds working_dir's providers, else exclusive."""
+        return self.shared() if self.covers(working_dir) else self.exclusive()
+
+    def covers(self, working_dir):
+        marker = self._marker(working_dir)
+        return bool(marker) and os.path.exists(marker)
+
+    def mark_warm(self, working_dir):
+        """Records that every provider working_dir's lock file pins is in the cache."""
+        marker = self._marker(working_dir)
+        if marker:
+            os.makedirs(os.path.dirname(marker), exist_ok=True)
+            open(marker, "a").close()
+
+    def _marker(self, working_dir):
+        lock_file = os.path.join(working_dir, ".terraform.lock.hcl")
+        if not os.path.exists(lock_file):
+            return None
+        return os.path.join(self.path, self.WARM_DIR, file_digest(lock_file))
+
+    def prewarm(self, working_dirs):
+        """Downloads every provider the working dirs pin, once each."""
+
+        by_lock_file = {}
+        for working_dir in working_dirs:
+            lock_file = os.path.join(working_dir, ".terraform.lock.hcl")
+            key = file_digest(lock_file) if os.path.exists(lock_file) else working_dir
+            by_lock_file.setdefault(key, working_dir)
+
+        logger.info(f"Pre-warming plugin cache {self.path} from {len(by_lock_file)} working dirs")
+
+        before = dir_bytes(self.path)
+        started = time.monotonic()
+
+        with self.exclusive():
+            for working_dir in by_lock_file.values():
+                # No backend: we only want the providers
+                TerraformService(working_dir, plugin_cache=self)._run(
+                    ["terraform", "init", "-input=false", "-no-color", "-backend=false"]
+                )
+                self.mark_warm(working_dir)
+
+        downloaded = dir_bytes(self.path) - before
+        seconds = time.monotonic() - started
+
+        if downloaded and seconds:
+            self.bytes_per_second = downloaded / seconds
+
+        logger.info(f"Plugin cache warm: {downloaded / 2**20:.0f} MiB downloaded in {seconds:.0f}s")
+        return downloaded
+
+    def linked_bytes(self, working_dir):
+        """Size of the providers a working dir links from this cache."""
+
+        root = os.path.join(working_dir, ".terraform", "providers")
+        cache = os.path.realpath(self.path)
+        total = 0
+
+        for dirpath, dirnames, _ in os.walk(root):
+            for name in list(dirnames):
+                full = os.path.join(dirpath, name)
+                if os.path.islink(full):
+                    dirnames.remove(name)
+                    if os.path.realpath(full).startswith(cache + os.sep):
+                        total += dir_bytes(full)
+
+        return total
+
+    def download_seconds(self, size):
+        return size / self.bytes_per_second if self.bytes_per_second else 0
+
+
+def init_all(services, max_parallel=4, prewarm=True):
+    """
+    terraform init for many working dirs, at most max_parallel at a time,
+    after pre-warming each plugin cache they use once from all of them.
+    """
+
+    if prewarm:
+        caches = {}
+        for service in services:
+            if service.plugin_cache:
+                caches.setdefault(id(service.plugin_cache), (service.plugin_cache, []))[1].append(service.working_dir)
+        for cache, working_dirs in caches.values():
+            cache.prewarm(working_dirs)
+
+    with ThreadPoolExecutor(max_workers=max_parallel) as executor:
+        reports = dict(zip(
+            [s.working_dir for s in services],
+            executor.map(lambda s: s.init(), services)
+        ))
+
+    saved = sum(r["cached_bytes"] for r in reports.values())
+    seconds = sum(r["saved_seconds"] for r in reports.values())
+    logger.info(
+        f"Initialised {len(reports)} working dirs, {saved / 2**20:.0f} MiB reused "
+        f"from the plugin cache (~{seconds:.0f}s download saved)"
+    )
+    return reports
+
+
+def file_digest(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def dir_bytes(path):
+    total = 0
+    for dirpath, _, filenames in os.walk(path, followlinks=True):
+        for name in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, name))
+            except OSError:
+                pass
+    return total
+
+
+def main():
+
+    parser = argparse.ArgumentParser(
+        prog="python -m app.services.terraform_service",
+        description="terraform init many working dirs in parallel from one shared, pre-warmed plugin cache"
+    )
+    parser.add_argument("command", choices=["init"])
+    parser.add_argument("working_dirs", nargs="+")
+    parser.add_argument("--plugin-cache", default=DEFAULT_PLUGIN_CACHE_DIR)
+    parser.add_argument("--max-parallel", type=int, default=4)
+    args = parser.parse_args()
+
+    cache = PluginCache(args.plugin_cache)
+    services = [TerraformService(d, plugin_cache=cache) for d in args.working_dirs]
+
+    try:
+        reports = init_all(services, max_parallel=args.max_parallel)
+    except Exception as e:
+        logger.error(f"init failed: {e}")
+        sys.exit(1)
+
+    print(f"{'working dir':<50} {'seconds':>8} {'cached MiB':>11} {'saved s':>8}")
+    for working_dir, report in reports.items():
+        print(
+            f"{working_dir:<50} {report['seconds']:>8.1f} {report['cached_bytes'] / 2**20:>11.1f} "
+            f"{report['saved_seconds']:>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,378 @@
+import threading
 import time
+from concurrent.futures import Future
+import boto3
 from app.logger import LoggerFactory
+from app.exceptions import ConfigurationError
+from app import cancellation, tracing
 
 logger = LoggerFactory.get_logger("traffic-service")
 
+# Route53 allows 1000 changes per request and counts an UPSERT as two
+MAX_UPSERTS_PER_BATCH = 500
+
+DEFAULT_STEPS = [10, 50, 100]
+
+
+def record_key(record_set):
+    """(name, type, set identifier) of a record set; Route53 names end in a dot."""
+    return (
+        record_set["Name"].rstrip(".").lower(),
+        record_set["Type"],
+        record_set.get("SetIdentifier")
+    )
+
+
+def error_code(error):
+    return getattr(error, "response", {}).get("Error", {}).get("Code")
+
+
+class Route53ChangeBatcher:
+    """
+    Coalesces record changes from concurrent cluster upgrades into one
+    ChangeResourceRecordSets call per hosted zone, and follows all of the
+    resulting changes with one GetChange poll loop.
+
+    Changes submitted within batch_seconds of the first pending one go out
+    together, so clusters reaching the same traffic step share a change
+    set. submit() returns a future resolving once Route53 reports the
+    change INSYNC. A change set rejected as invalid is resent one
+    submission at a time, so only the cluster with the bad record fails.
+    """
+
+    def __init__(self, client, batch_seconds=5, poll_seconds=10, timeout_seconds=600):
+        self.client = client
+        self.batch_seconds = batch_seconds
+        self.poll_seconds = poll_seconds
+        self.timeout_seconds = timeout_seconds
+
+        self._cond = threading.Condition()
+        # hosted zone -> [(changes, future), ...] not sent yet
+        self._pending = {}
+        self._first_pending = None
+        # change id -> (futures, submitted at) not INSYNC yet
+        self._changes = {}
+        self._polled = None
+        self._thread = None
+
+    @classmethod
+    def from_config(cls, route53_config, client=None):
+        return cls(
+            client or boto3.client("route53", endpoint_url=route53_config.get("endpoint_url")),
+            batch_seconds=route53_config.get("batch_seconds", 5),
+            poll_seconds=route53_config.get("poll_seconds", 10),
+            timeout_seconds=route53_config.get("timeout_seconds", 600)
+        )
+
+    def submit(self, zone_id, changes) -> Future:
+
+        future = Future()
+
+        with self._cond:
+            if not self._pending:
+                self._first_pending = time.monotonic()
+
+            self._pending.setdefault(zone_id, []).append((changes, future))
+            self._cond.notify_all()
+
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="route53-changes", daemon=True)
+                self._thread.start()
+
+        return future
+
+    def _loop(self):
+
+        while True:
+            with self._cond:
+                while True:
+                    if not self._pending and not self._changes:
+                        self._thread = None
+                        return
+
+                    now = time.monotonic()
+                    deadlines = []
+                    if self._pending:
+                        deadlines.append(self._first_pending + self.batch_seconds)
+                    if self._changes:
+                        deadlines.append(self._polled + self.poll_seconds)
+
+                    wait = min(deadlines) - now
+                    if wait <= 0:
+                        break
+                    self._cond.wait(wait)
+
+                flush = {}
+                if self._pending and now >= self._first_pending + self.batch_seconds:
+                    flush, self._pending = self._pending, {}
+
+                poll = bool(self._changes) and now >= self._polled + self.poll_seconds
+
+            for zone_id, submissions in flush.items():
+                for batch in self._split(submissions):
+                    self._send(zone_id, batch)
+
+            if poll:
+                self._poll()
+
+    @staticmethod
+    def _split(submissions):
+        """Groups submissions into change sets within Route53's limits, one change per record each."""
+
+        batches = [[]]
+        records, size = set(), 0
+
+        for changes, future in submissions:
+            keys = {record_key(c["ResourceRecordSet"]) for c in changes}
+
+            if batches[-1] and (size + len(changes) > MAX_UPSERTS_PER_BATCH or keys & records):
+                batches.append([])
+                records, size = set(), 0
+
+            batches[-1].append((changes, future))
+            records |= keys
+            size += len(changes)
+
+        return batches
+
+    def _send(self, zone_id, batch):
+
+        changes = [change for submission, _ in batch for change in submission]
+        futures = [future for _, future in batch]
+        started = time.time_ns()
+
+        try:
+            response = self.client.change_resource_record_sets(
+                HostedZoneId=zone_id,
+                ChangeBatch={
+                    "Comment": f"fleet-orchestrator: {len(changes)} change(s) for {len(batch)} cluster(s)",
+                    "Changes": changes
+                }
+            )
+        except Exception as e:
+            if len(batch) > 1 and error_code(e) == "InvalidChangeBatch":
+                # All-or-nothing: one cluster's bad record must not fail the others
+                logger.warning(
+                    f"Route53 change set for {zone_id} rejected ({e}), resending its {len(batch)} clusters one by one"
+                )
+                for submission in batch:
+                    self._send(zone_id, [submission])
+                return
+
+            logger.error(f"Route53 change set for {zone_id} rejected: {e}")
+            for future in futures:
+                future.set_exception(e)
+            return
+
+        tracing.record("route53.change", started, time.time_ns(), zone=zone_id, changes=len(changes))
+
+        change = response["ChangeInfo"]
+        logger.info(f"Route53 change {change['Id']} in {zone_id}: {len(changes)} record(s), {change['Status']}")
+
+        if change["Status"] == "INSYNC":
+            for future in futures:
+                future.set_result(change["Id"])
+            return
+
+        with self._cond:
+            if not self._changes:
+                self._polled = time.monotonic()
+            self._changes[change["Id"]] = (futures, time.monotonic())
+
+    def _poll(self):
+
+        with self._cond:
+            changes = dict(self._changes)
+            self._polled = time.monotonic()
+
+        for change_id, (futures, submitted_at) in changes.items():
+            try:
+                status = self.client.get_change(Id=change_id)["ChangeInfo"]["Status"]
+            except Exception as e:
+                # Throttled or transient; the next poll asks again
+                logger.warning(f"GetChange {change_id} failed: {e}")
+                status = None
+
+            if status == "INSYNC":
+                error = None
+            elif time.monotonic() - submitted_at > self.timeout_seconds:
+                error = TimeoutError(f"Route53 change {change_id} not INSYNC after {self.timeout_seconds}s")
+            else:
+                continue
+
+            with self._cond:
+                self._changes.pop(change_id, None)
+
+            for future in futures:
+                if error:
+                    future.set_exception(error)
+                else:
+                    future.set_result(change_id)
+
 
 class TrafficService:
+    """
+    Moves a cluster's traffic from blue to green by shifting the weights
+    of its Route53 weighted record pair in steps (10/50/100 by default),
+    with a health gate (a bake) after every step but the last. A failed
+    gate, a failed change or an aborted run puts all traffic back on blue.
+
+    Every cluster's record lives at record (templated with cluster,
+    tenant, env, fleet and region) in hosted_zone_id unless records
+    overrides it; the blue and green set identifiers tell the pair apart.
+    """
+
+    def __init__(self, batcher, steps=None, gate=None, hosted_zone_id=None, record=None,
+                 blue_set_identifier="blue", green_set_identifier="green", records=None,
+                 timeout_seconds=900, clusters=None):
+        self.batcher = batcher
+        self.steps = sorted(steps or DEFAULT_STEPS)
+        self.gate = gate
+        self.hosted_zone_id = hosted_zone_id
+        self.record = record
+        self.blue_set_identifier = blue_set_identifier
+        self.green_set_identifier = green_set_identifier
+        self.records = records or {}
+        self.timeout_seconds = timeout_seconds
+
+        if self.steps[-1] != 100 or self.steps[0] <= 0:
+            raise ConfigurationError(f"Traffic steps must be percentages ending at 100, got {self.steps}")
+
+        if clusters is not None:
+            self.validate(clusters)
+
+    def validate(self, clusters):
+        """
+        Fails on a cluster with no hosted zone or record, or whose record
+        does not render to a fully qualified name, before anything moves.
+        """
+
+        for cluster in clusters:
+            override = self.records.get(cluster.name, {})
+            zone_id = override.get("hosted_zone_id", self.hosted_zone_id)
+            template = override.get("record", self.record)
+
+            if not zone_id:
+                raise ConfigurationError(
+                    f"No Route53 hosted zone for {cluster.name}: set traffic.route53.hosted_zone_id "
+                    f"or traffic.route53.records.{cluster.name}.hosted_zone_id"
+                )
+
+            if not template:
+                raise ConfigurationError(
+                    f"No Route53 record for {cluster.name}: set traffic.route53.record "
+                    f"(e.g. \"{{cluster}}.apps.example.com\") or traffic.route53.records.{cluster.name}.record"
+                )
+
+            name = self._record_name(cluster, template)
+            if "." not in name.rstrip("."):
+                raise ConfigurationError(
+                    f"Route53 record {name!r} for {cluster.name} is not a fully qualified name"
+                )
+
+    @classmethod
+    def from_config(cls, traffic_config, batcher, gate=None, clusters=None):
+        route53_config = traffic_config.get("route53", {})
+        return cls(
+            batcher,
+            steps=traffic_config.get("steps"),
+            gate=gate,
+            hosted_zone_id=route53_config.get("hosted_zone_id"),
+            record=route53_config.get("record"),
+            blue_set_identifier=route53_config.get("blue_set_identifier", "blue"),
+            green_set_identifier=route53_config.get("green_set_identifier", "green"),
+            records=route53_config.get("records"),
+            timeout_seconds=traffic_config.get("timeout_seconds", 900),
+            clusters=clusters
+        )
 
     def switch_to_green(self, cluster):
-        logger.info(f"Switching traffic to GREEN for {cluster.name}")
-        time.sleep(2)
-        logger.info("Traffic switched to GREEN")
+
+        zone_id, record_sets = self._record_sets(cluster)
+
+        try:
+            for weight in self.steps:
+                cancellation.current().raise_if_cancelled()
+
+                with tracing.span("traffic_step", weight=weight):
+                    self._apply(zone_id, record_sets, green_weight=weight)
+
+                logger.info(f"{weight}% of {cluster.name} traffic on green")
+
+                if weight < 100 and self.gate:
+                    self.gate.bake(f"{weight}% traffic on green", [cluster])
+
+        except Exception:
+            logger.error(f"Traffic shift failed for {cluster.name}, moving traffic back to blue")
+            try:
+                # Rolled back even when the run was aborted
+                self._apply(zone_id, record_sets, green_weight=0, token=cancellation.NEVER)
+            except Exception as e:
+                logger.error(f"Could not move {cluster.name} traffic back to blue: {e}")
+            raise
 
     def switch_to_blue(self, cluster):
-        logger.info(f"Switching traffic back to BLUE for {cluster.name}")
-        time.sleep(2)
-        logger.info("Traffic switched back to BLUE")
+        zone_id, record_sets = self._record_sets(cluster)
+        self._apply(zone_id, record_sets, green_weight=0)
+        logger.info(f"All {cluster.name} traffic back on blue")
+
+    def _apply(self, zone_id, record_sets, green_weight, token=None):
+
+        weights = {
+            self.blue_set_identifier: 100 - green_weight,
+            self.green_set_identifier: green_weight
+        }
+
+        changes = [
+            {"Action": "UPSERT", "ResourceRecordSet": {**record_set, "Weight": weights[record_set["SetIdentifier"]]}}
+            for record_set in record_sets
+        ]
+
+        future = self.batcher.submit(zone_id, changes)
+        (token or cancellation.current()).result(future, self.timeout_seconds)
+
+    def _record_sets(self, cluster):
+        """Hosted zone and the blue/green weighted record sets of cluster, read once per switch."""
+
+        self.validate([cluster])
+
+        override = self.records.get(cluster.name, {})
+        zone_id = override.get("hosted_zone_id", self.hosted_zone_id)
+        name = self._record_name(cluster, override.get("record", self.record))
+
+        wanted = {self.blue_set_identifier, self.green_set_identifier}
+        found = {}
+
+        # Weighted sets of one name sort together, right at StartRecordName
+        response = self.batcher.client.list_resource_record_sets(
+            HostedZoneId=zone_id,
+            StartRecordName=name,
+            MaxItems="20"
+        )
+
+        for record_set in response.get("ResourceRecordSets", []):
+            if record_set["Name"].rstrip(".").lower() != name.rstrip(".").lower():
+                continue
+            if record_set.get("SetIdentifier") in wanted:
+                found[record_set["SetIdentifier"]] = record_set
+
+        missing = wanted - set(found)
+        if missing:
+            raise ConfigurationError(
+                f"No weighted {'/'.join(sorted(missing))} record for {name} in {zone_id}"
+            )
+
+        return zone_id, list(found.values())
+
+    @staticmethod
+    def _record_name(cluster, template):
+        try:
+            return template.format(
+                cluster=cluster.name,
+                tenant=cluster.tenant,
+                env=cluster.env,
+                fleet=cluster.fleet,
+                region=cluster.region
+            )
+        except (KeyError, IndexError, ValueError) as e:
+            raise ConfigurationError(f"Bad Route53 record template {template!r}: {e}")
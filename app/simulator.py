@@ -0,0 +1,727 @@
+"""
+Discrete-event rollout simulator: replays the orchestrator's canary, bake,
+wave and parallel-execution logic in virtual time against historical or
+sampled per-cluster upgrade durations and failure rates.
+
+    python -m app.simulator --config inventory/sample.yaml
+    python -m app.simulator --config inventory/sample.yaml --history logs/fleet.log
+    python -m app.simulator --clusters 120 --fleets 4 --env prod --search --max-blast-seconds 7200
+"""
+import argparse
+import heapq
+import itertools
+import json
+import logging
+import math
+import random
+import re
+import statistics
+import sys
+from collections import defaultdict, deque
+from datetime import datetime
+from app.logger import LoggerFactory
+from app.config_loader import ConfigLoader
+from app.exceptions import ConfigurationError, FleetUpgradeException
+from app.models import Cluster
+from app.orchestrator import ROLLOUT_DEFAULTS
+from app.planner import UpgradeCostModel
+from app.scheduler import chunk_clusters
+
+logger = LoggerFactory.get_logger("simulator")
+
+# Search space for --search
+WAVE_PERCENTS = [5, 10, 20, 25, 33, 50, 100]
+MAX_PARALLELS = [1, 2, 3, 4, 5, 8, 10, 15, 20]
+
+# fleet.log lines: JSON records now, pipe-separated text before
+LOG_LINE = re.compile(r"^(\S+ \S+) \| \w+ \| state-manager \| (.*?)(?: \[.*\])?$")
+LOCK_ATTEMPT = re.compile(r"Attempting to lock cluster (\S+)")
+MARKED = re.compile(r"Marking (\S+) as (SUCCESS|FAILED)")
+
+
+class RolloutConfig:
+    """The rollout knobs the orchestrator takes from its env and blueprint."""
+
+    def __init__(self, scheduler, wave_percent, max_parallel, bake_seconds,
+                 global_max_parallel, max_failures=1, fleet_overrides=None, order="duration"):
+
+        self.scheduler = scheduler
+        self.wave_percent = wave_percent
+        self.max_parallel = max_parallel
+        self.bake_seconds = bake_seconds
+        self.global_max_parallel = global_max_parallel
+        self.max_failures = max_failures
+        # Per-fleet max_parallel / isolate_failures, as in rollout.fleets
+        self.fleet_overrides = fleet_overrides or {}
+        self.order = order
+
+        if max_failures < 1:
+            raise ConfigurationError(f"max_failures must be at least 1, got {max_failures}")
+
+    @classmethod
+    def from_config(cls, config):
+        """Resolves env defaults plus rollout overrides like FleetOrchestrator."""
+
+        defaults = ROLLOUT_DEFAULTS.get(config["env"], ROLLOUT_DEFAULTS["dev"])
+        rollout = config.get("rollout", {})
+
+        return cls(
+            scheduler=rollout.get("scheduler", defaults["scheduler"]),
+            wave_percent=rollout.get("wave_percent", defaults["wave_percent"]),
+            max_parallel=rollout.get("max_parallel", defaults["max_parallel"]),
+            bake_seconds=rollout.get("bake_seconds", defaults["bake_seconds"]),
+            global_max_parallel=rollout.get("global_max_parallel", defaults["global_max_parallel"]),
+            max_failures=rollout.get("max_failures", 1),
+            fleet_overrides=rollout.get("fleets", {}),
+            order=rollout.get("order", "duration")
+        )
+
+    def replace(self, **changes):
+        values = dict(vars(self))
+        values.update(changes)
+        return RolloutConfig(**values)
+
+    def describe(self):
+        return (
+            f"{self.scheduler} wave_percent={self.wave_percent} max_parallel={self.max_parallel} "
+            f"bake={self.bake_seconds}s global_max_parallel={self.global_max_parallel} "
+            f"max_failures={self.max_failures} order={self.order}"
+        )
+
+
+class SampledDurations:
+    """
+    Lognormal upgrade durations with independent failures, around a fixed
+    median or, without one, the planner's per-cluster cost estimate.
+    """
+
+    def __init__(self, median_seconds=None, sigma=0.3, failure_rate=0.0, cost=None):
+        self.median_seconds = median_seconds
+        self.sigma = sigma
+        self.failure_rate = failure_rate
+        self.cost = cost
+
+    def draw(self, cluster, rng):
+        median = self.median_seconds or self.cost.estimate(cluster)
+        seconds = rng.lognormvariate(math.log(median), self.sigma)
+        return seconds, rng.random() < self.failure_rate
+
+
+class HistoricalDurations:
+    """
+    Resamples recorded upgrade durations: a cluster's own history when it
+    has one, the pooled history of every cluster otherwise. Failures are
+    drawn at the recorded failure rate unless one is given.
+    """
+
+    def __init__(self, durations, failures=0, failure_rate=None):
+        # cluster name -> [seconds]
+        self.durations = durations
+        self.pooled = [s for samples in durations.values() for s in samples]
+
+        if not self.pooled:
+            raise ConfigurationError("No upgrade durations in history")
+
+        runs = len(self.pooled) + failures
+        self.failure_rate = failures / runs if failure_rate is None else failure_rate
+
+    @classmethod
+    def from_log(cls, path, failure_rate=None, min_seconds=1):
+        """
+        Pairs each state-manager lock attempt with the SUCCESS / FAILED mark
+        for the same cluster. Only successful runs give a duration; runs
+        shorter than min_seconds (dry runs, fakes) are ignored.
+        """
+
+        started, durations, failures = {}, defaultdict(list), 0
+
+        with open(path) as f:
+            for line in f:
+                parsed = parse_log_line(line.rstrip("\n"))
+                if not parsed:
+                    continue
+
+                ts, message = parsed
+
+                attempt = LOCK_ATTEMPT.search(message)
+                if attempt:
+                    started[attempt.group(1)] = ts
+                    continue
+
+                marked = MARKED.search(message)
+                if not marked or marked.group(1) not in started:
+                    continue
+
+                identifier, status = marked.groups()
+                seconds = (ts - started.pop(identifier)).total_seconds()
+
+                if status == "FAILED":
+                    failures += 1
+                elif seconds >= min_seconds:
+                    durations[identifier].append(seconds)
+
+        logger.info(
+            f"Loaded {sum(len(s) for s in durations.values())} upgrade durations "
+            f"and {failures} failures from {path}"
+        )
+        return cls(dict(durations), failures, failure_rate)
+
+    def draw(self, cluster, rng):
+        samples = self.durations.get(cluster.identifier()) or self.durations.get(cluster.name) or self.pooled
+        return rng.choice(samples), rng.random() < self.failure_rate
+
+
+def parse_log_line(line):
+    """(local naive timestamp, message) of a state-manager line, else None."""
+
+    if line.startswith("{"):
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            return None
+        if entry.get("logger") != "state-manager":
+            return None
+        ts = datetime.fromisoformat(entry["ts"]).astimezone().replace(tzinfo=None)
+        return ts, entry.get("message", "")
+
+    match = LOG_LINE.match(line)
+    if not match:
+        return None
+    return datetime.strptime(match.group(1), "%Y-%m-%d %H:%M:%S"), match.group(2)
+
+
+class Simulation:
+    """Virtual clock plus a heap of pending events."""
+
+    def __init__(self):
+        self.now = 0.0
+        self._events = []
+        self._sequence = itertools.count()
+
+    def schedule(self, delay, callback):
+        heapq.heappush(self._events, (self.now + delay, next(self._sequence), callback))
+
+    def run(self):
+        while self._events:
+            self.now, _, callback = heapq.heappop(self._events)
+            callback()
+
+
+class _Rollout:
+    """One simulated run: every fleet concurrently under the global cap."""
+
+    def __init__(self, sim, config, durations, failing):
+        self.sim = sim
+        self.config = config
+        self.durations = durations
+        self.failing = failing
+
+        self.aborted = False
+        self.in_use = 0
+        self.queue = deque()
+
+        # cluster name -> (start, end, failed)
+        self.upgrades = {}
+        # cluster name -> (cluster, fleet run, start, done) while upgrading
+        self.running = {}
+        self.not_started = []
+        self.failed_fleets = []
+
+    def acquire(self, callback):
+        # FIFO like the budget's semaphore
+        if self.in_use < self.config.global_max_parallel:
+            self.in_use += 1
+            callback()
+        else:
+            self.queue.append(callback)
+
+    def release(self):
+        if self.queue:
+            self.queue.popleft()()
+        else:
+            self.in_use -= 1
+
+    def upgrade(self, cluster, run, done):
+
+        def start():
+            # Cancelled while waiting for a slot: gives it straight back
+            if run.stopping():
+                self.release()
+                return done(cluster, False)
+
+            seconds = self.durations[cluster.name]
+            failed = cluster.name in self.failing
+            started = self.sim.now
+
+            def finish():
+                if self.running.pop(cluster.name, None) is None:
+                    return  # aborted earlier
+
+                self.upgrades[cluster.name] = (started, self.sim.now, failed)
+                self.release()
+                done(cluster, failed)
+
+            self.running[cluster.name] = (cluster, run, started, done)
+            self.sim.schedule(seconds, finish)
+
+        self.acquire(start)
+
+    def cancel(self, run=None):
+        """Fast abort: the in-flight upgrades of run (of every run if None) stop now."""
+
+        for name, (cluster, owner, started, done) in list(self.running.items()):
+            if run is None or owner is run:
+                del self.running[name]
+                self.upgrades[name] = (started, self.sim.now, False)
+                self.sim.schedule(0, self._aborted(cluster, done))
+
+    def _aborted(self, cluster, done):
+
+        def callback():
+            self.release()
+            done(cluster, False)
+
+        return callback
+
+
+class _FleetRun:
+    """FleetOrchestrator._run_fleet plus the configured scheduler, as events."""
+
+    def __init__(self, rollout, name, canary, waves, max_parallel, isolate):
+        self.rollout = rollout
+        self.sim = rollout.sim
+        self.config = rollout.config
+        self.name = name
+        self.canary = canary
+        self.waves = waves
+        self.max_parallel = max_parallel
+        self.isolate = isolate
+
+        self.failures = 0
+        self.wave_number = 0
+        # Isolated fleets cancel only themselves
+        self.cancelled = False
+
+    def stopping(self):
+        return self.cancelled or self.rollout.aborted
+
+    def start(self):
+
+        if self.rollout.aborted:
+            self._not_started(self.waves)
+            return self._finish(failed=True)
+
+        if self.canary:
+            self.rollout.upgrade(self.canary, self, self._canary_done)
+        else:
+            self._next_wave()
+
+    def _canary_done(self, cluster, failed):
+
+        if failed:
+            self._not_started(self.waves)
+            return self._finish(failed=True)
+
+        self.sim.schedule(self.config.bake_seconds, self._next_wave)
+
+    def _next_wave(self):
+
+        if self.wave_number == len(self.waves):
+            return self._finish(failed=self.failures > 0)
+
+        if self.failures >= self.config.max_failures or self.stopping():
+            self._not_started(self.waves[self.wave_number:])
+            return self._finish(failed=True)
+
+        self.pending = list(self.waves[self.wave_number])
+        self.in_flight = 0
+        self.wave_number += 1
+        self._admit()
+
+    def _admit(self):
+
+        while (self.pending and self.in_flight < self.max_parallel
+               and self.failures < self.config.max_failures and not self.stopping()):
+            self.in_flight += 1
+            self.rollout.upgrade(self.pending.pop(0), self, self._cluster_done)
+
+        if self.in_flight == 0:
+            self._wave_done()
+
+    def _cluster_done(self, cluster, failed):
+        self.in_flight -= 1
+        self.failures += failed
+
+        # The scheduler cancels the moment the error budget runs out
+        if failed and self.failures == self.config.max_failures:
+            self._cancel()
+
+        self._admit()
+
+    def _wave_done(self):
+
+        self.rollout.not_started.extend(self.pending)
+        self.pending = []
+
+        # Sliding windows have no barriers, so nothing to bake between waves
+        if (self.config.scheduler == "waves" and self.failures < self.config.max_failures
+                and not self.stopping()):
+            self.sim.schedule(self.config.bake_seconds, self._next_wave)
+        else:
+            self._next_wave()
+
+    def _not_started(self, waves):
+        for wave in waves:
+            self.rollout.not_started.extend(wave)
+
+    def _finish(self, failed):
+        if failed:
+            self.rollout.failed_fleets.append(self.name)
+            self._cancel()
+
+    def _cancel(self):
+
+        if self.isolate:
+            self.cancelled = True
+            self.rollout.cancel(self)
+        elif not self.rollout.aborted:
+            self.rollout.aborted = True
+            self.rollout.cancel()
+
+
+class TrialResult:
+
+    def __init__(self, makespan, upgrades, not_started, failed_fleets):
+        self.makespan = makespan
+        self.upgrades = upgrades
+        self.not_started = not_started
+        self.failed_fleets = failed_fleets
+
+    def blast_radius(self):
+        """
+        Measured from the start of the first upgrade that fails: how many
+        clusters were still changing or got changed from then on, and for
+        how long the fleet kept changing.
+        """
+
+        failed_starts = [start for start, _, failed in self.upgrades.values() if failed]
+        if not failed_starts:
+            return 0, 0.0
+
+        exposed_from = min(failed_starts)
+        exposed = [end for _, end, _ in self.upgrades.values() if end > exposed_from]
+        return len(exposed), max(exposed) - exposed_from
+
+
+class SimulationReport:
+    """
+    Makespan comes from clean trials (nothing fails), P(fail) from trials
+    with failures drawn at the per-cluster rate, and blast radius from
+    trials where one randomly picked cluster is made to fail as well.
+    """
+
+    def __init__(self, config, clean, drawn, injected):
+        self.config = config
+
+        makespans = sorted(t.makespan for t in clean)
+        self.makespan_seconds = statistics.mean(makespans)
+        self.makespan_p95_seconds = percentile(makespans, 95)
+
+        self.failure_probability = sum(1 for t in drawn if t.failed_fleets) / len(drawn)
+
+        blast = [t.blast_radius() for t in injected]
+        self.blast_radius_clusters = statistics.mean(clusters for clusters, _ in blast)
+        self.blast_radius_seconds = statistics.mean(seconds for _, seconds in blast)
+        self.blast_radius_p95_seconds = percentile(sorted(seconds for _, seconds in blast), 95)
+
+    def to_dict(self):
+        return {
+            "config": vars(self.config),
+            "makespan_seconds": round(self.makespan_seconds),
+            "makespan_p95_seconds": round(self.makespan_p95_seconds),
+            "failure_probability": round(self.failure_probability, 3),
+            "blast_radius_seconds": round(self.blast_radius_seconds),
+            "blast_radius_p95_seconds": round(self.blast_radius_p95_seconds),
+            "blast_radius_clusters": round(self.blast_radius_clusters, 2)
+        }
+
+
+def percentile(ordered, pct):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class RolloutSimulator:
+    """
+    Replays a blueprint's rollout in virtual time, many trials at once.
+
+    Every trial draws one duration and outcome per cluster up front, and the
+    same draws are replayed for every candidate config, so two configs are
+    compared on identical luck.
+    """
+
+    def __init__(self, clusters, durations, trials=200, seed=1, cost=None):
+        self.clusters = clusters
+        # Orders waves like the planner does for order: duration
+        self.cost = cost
+        self.fleets = defaultdict(list)
+        for cluster in clusters:
+            self.fleets[cluster.fleet].append(cluster)
+
+        # Per trial: durations, drawn failures, one extra injected failure
+        rng = random.Random(seed)
+        self.trials = []
+        for _ in range(trials):
+            draws = {c.name: durations.draw(c, rng) for c in clusters}
+            failing = frozenset(name for name, (_, failed) in draws.items() if failed)
+            injected = failing | {rng.choice(clusters).name}
+            seconds = {name: s for name, (s, _) in draws.items()}
+            self.trials.append((seconds, failing, injected))
+
+        self._waves = {}
+
+    def _plan(self, config):
+        """Canary and waves per fleet, as UpgradePlanner lays them out."""
+
+        key = (config.scheduler, config.wave_percent, config.order)
+        if key not in self._waves:
+            plans = {}
+            for name, members in self.fleets.items():
+                canaries = [c for c in members if c.is_canary]
+                regular = [c for c in members if not c.is_canary]
+
+                if config.order == "duration" and self.cost:
+                    regular = self.cost.longest_first(regular)
+
+                if config.scheduler == "waves":
+                    waves = chunk_clusters(regular, config.wave_percent)
+                else:
+                    waves = [regular] if regular else []
+
+                plans[name] = (canaries[0] if canaries else None, waves)
+            self._waves[key] = plans
+
+        return self._waves[key]
+
+    def run_trial(self, config, durations, failing=frozenset()) -> TrialResult:
+
+        sim = Simulation()
+        rollout = _Rollout(sim, config, durations, failing)
+
+        for name, (canary, waves) in self._plan(config).items():
+            overrides = config.fleet_overrides.get(name, {})
+            _FleetRun(
+                rollout,
+                name,
+                canary,
+                waves,
+                max_parallel=overrides.get("max_parallel", config.max_parallel),
+                isolate=overrides.get("isolate_failures", False)
+            ).start()
+
+        sim.run()
+        return TrialResult(sim.now, rollout.upgrades, rollout.not_started, rollout.failed_fleets)
+
+    def simulate(self, config) -> SimulationReport:
+        return SimulationReport(
+            config,
+            clean=[self.run_trial(config, seconds) for seconds, _, _ in self.trials],
+            drawn=[self.run_trial(config, seconds, failing) for seconds, failing, _ in self.trials],
+            injected=[self.run_trial(config, seconds, injected) for seconds, _, injected in self.trials]
+        )
+
+    def search(self, base, max_blast_seconds=None, max_blast_clusters=None,
+               wave_percents=None, max_parallels=None, bake_seconds=None):
+        """
+        Simulates every combination of wave_percent, max_parallel and bake
+        (global_max_parallel scaled as in the env defaults) and returns all
+        reports that meet the blast-radius limits, fastest first.
+        """
+
+        candidates = itertools.product(
+            wave_percents or WAVE_PERCENTS,
+            max_parallels or MAX_PARALLELS,
+            bake_seconds or [base.bake_seconds]
+        )
+
+        ratio = base.global_max_parallel / base.max_parallel
+        feasible = []
+        seen = set()
+
+        for wave_percent, max_parallel, bake in candidates:
+
+            if base.scheduler == "sliding":
+                # Waves only order admission; skip duplicates
+                wave_percent = base.wave_percent
+
+            config = base.replace(
+                wave_percent=wave_percent,
+                max_parallel=max_parallel,
+                bake_seconds=bake,
+                global_max_parallel=max(max_parallel, round(max_parallel * ratio))
+            )
+
+            key = (config.wave_percent, config.max_parallel, config.bake_seconds)
+            if key in seen:
+                continue
+            seen.add(key)
+
+            report = self.simulate(config)
+
+            if max_blast_seconds is not None and report.blast_radius_seconds > max_blast_seconds:
+                continue
+            if max_blast_clusters is not None and report.blast_radius_clusters > max_blast_clusters:
+                continue
+            feasible.append(report)
+
+        return sorted(feasible, key=lambda r: (r.makespan_seconds, r.blast_radius_seconds))
+
+
+def clusters_from_config(config):
+    return [
+        Cluster(
+            name=name,
+            fleet=cfg["fleet"],
+            version=cfg["version"],
+            is_canary=cfg.get("is_canary", False),
+            tenant=config["tenant"],
+            env=config["env"],
+            region=config["region"],
+            node_groups=cfg.get("node_groups")
+        )
+        for name, cfg in config["services"]["eks"].get("config", {}).items()
+    ]
+
+
+def synthetic_config(clusters, fleets, env, max_nodes=0, seed=1):
+
+    rng = random.Random(seed)
+    config = {}
+    for i in range(clusters):
+        config[f"sim-{i}"] = {"fleet": f"fleet-{i % fleets}", "version": "1.30", "is_canary": i < fleets}
+        if max_nodes:
+            config[f"sim-{i}"]["node_groups"] = {"default": {"desired": rng.randint(1, max_nodes)}}
+
+    return {
+        "tenant": "sim",
+        "env": env,
+        "region": "us-east-1",
+        "services": {"eks": {"enabled": True, "config": config}}
+    }
+
+
+def print_reports(reports):
+
+    print(
+        f"{'scheduler':>9} {'wave%':>5} {'par':>4} {'global':>6} {'bake':>6} "
+        f"{'makespan':>9} {'p95':>9} {'blast s':>8} {'blast p95':>9} {'blast cl':>8} {'P(fail)':>7}"
+    )
+
+    for r in reports:
+        c = r.config
+        print(
+            f"{c.scheduler:>9} {c.wave_percent:>5} {c.max_parallel:>4} {c.global_max_parallel:>6} "
+            f"{c.bake_seconds:>6} {format_seconds(r.makespan_seconds):>9} "
+            f"{format_seconds(r.makespan_p95_seconds):>9} {format_seconds(r.blast_radius_seconds):>8} "
+            f"{format_seconds(r.blast_radius_p95_seconds):>9} {r.blast_radius_clusters:>8.2f} "
+            f"{r.failure_probability:>7.2f}"
+        )
+
+
+def format_seconds(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    return f"{minutes // 60}h{minutes % 60:02d}m" if minutes >= 60 else f"{minutes}m{seconds:02d}s"
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--config", help="blueprint to simulate (default: synthetic fleet)")
+    parser.add_argument("--clusters", type=int, default=120)
+    parser.add_argument("--fleets", type=int, default=4)
+    parser.add_argument("--env", choices=sorted(ROLLOUT_DEFAULTS), default="prod")
+    parser.add_argument("--max-nodes", type=int, default=0, help="synthetic node group sizes, 1..N")
+    parser.add_argument("--history", help="fleet.log to resample upgrade durations from")
+    parser.add_argument("--median-minutes", type=float, help="sampled duration median (default: by strategy)")
+    parser.add_argument("--sigma", type=float, default=0.3)
+    parser.add_argument("--failure-rate", type=float, help="per-cluster failure probability")
+    parser.add_argument("--trials", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--scheduler", choices=["waves", "sliding"])
+    parser.add_argument("--wave-percent", type=int)
+    parser.add_argument("--max-parallel", type=int)
+    parser.add_argument("--global-max-parallel", type=int)
+    parser.add_argument("--bake-seconds", type=int, nargs="+", help="one value, or several to --search")
+    parser.add_argument("--max-failures", type=int)
+    parser.add_argument("--order", choices=["duration", "blueprint"])
+    parser.add_argument("--search", action="store_true", help="find the fastest config within the blast limits")
+    parser.add_argument("--max-blast-seconds", type=float)
+    parser.add_argument("--max-blast-clusters", type=float)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    try:
+        simulate(args)
+    except FleetUpgradeException as e:
+        logger.error(f"Simulation failed: {e}")
+        sys.exit(1)
+
+
+def simulate(args):
+
+    if args.config:
+        config = ConfigLoader.load(args.config)
+    else:
+        config = synthetic_config(args.clusters, args.fleets, args.env, args.max_nodes, args.seed)
+    clusters = clusters_from_config(config)
+
+    base = RolloutConfig.from_config(config)
+    overrides = {
+        "scheduler": args.scheduler,
+        "wave_percent": args.wave_percent,
+        "max_parallel": args.max_parallel,
+        "global_max_parallel": args.global_max_parallel,
+        "bake_seconds": args.bake_seconds[0] if args.bake_seconds else None,
+        "max_failures": args.max_failures,
+        "order": args.order
+    }
+    base = base.replace(**{k: v for k, v in overrides.items() if v is not None})
+
+    strategy = "in-place" if config["env"] == "dev" else "blue-green"
+    cost = UpgradeCostModel(strategy)
+
+    if args.history:
+        durations = HistoricalDurations.from_log(args.history, failure_rate=args.failure_rate)
+    else:
+        median = args.median_minutes * 60 if args.median_minutes else None
+        durations = SampledDurations(median, args.sigma, args.failure_rate or 0.0, cost=cost)
+
+    logger.info(f"Simulating {len(clusters)} clusters, {args.trials} trials")
+
+    # chunk_clusters logs every plan it builds
+    logging.disable(logging.INFO)
+    simulator = RolloutSimulator(clusters, durations, trials=args.trials, seed=args.seed, cost=cost)
+
+    print(f"Current ({base.describe()}):")
+    print_reports([simulator.simulate(base)])
+
+    if not args.search:
+        return
+
+    reports = simulator.search(
+        base,
+        max_blast_seconds=args.max_blast_seconds,
+        max_blast_clusters=args.max_blast_clusters,
+        bake_seconds=args.bake_seconds
+    )
+
+    print()
+    if not reports:
+        print("No config meets the blast radius limits")
+        return
+
+    print(f"Fastest {min(args.top, len(reports))} of {len(reports)} configs within the limits:")
+    print_reports(reports[:args.top])
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,146 @@
+import os
+import socket
+import threading
 import time
+import uuid
 import boto3
+from boto3.dynamodb.conditions import Key
 from botocore.exceptions import ClientError
 from app.logger import LoggerFactory
 from app.exceptions import StateLockError
+from app import tracing
 
 logger = LoggerFactory.get_logger("state-manager")
 
+# TransactWriteItems limit
+MAX_TRANSACT_ITEMS = 100
+
+# Teardown queue items share the table: "<cluster>#teardown" next to "<cluster>"
+TEARDOWN_SUFFIX = "#teardown"
+
+
+class LeaseHeartbeat:
+    """
+    Keeps the leases of every cluster locked by this process alive.
+
+    One background thread extends all held leases every interval, in
+    TransactWriteItems batches conditioned on us still owning each lock.
+    A lease we turn out to have lost is dropped and logged.
+    """
+
+    def __init__(self, state, interval):
+        self.state = state
+        self.interval = interval
+
+        self._lock = threading.Lock()
+        self._held = {}
+        self._thread = None
+
+    def track(self, cluster):
+
+        with self._lock:
+            self._held[cluster.identifier()] = cluster
+
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._loop,
+                    name="lease-heartbeat",
+                    daemon=True
+                )
+                self._thread.start()
+
+    def untrack(self, cluster):
+        with self._lock:
+            self._held.pop(cluster.identifier(), None)
+
+    def _loop(self):
+
+        while True:
+            time.sleep(self.interval)
+
+            with self._lock:
+                clusters = list(self._held.values())
+
+            for i in range(0, len(clusters), MAX_TRANSACT_ITEMS):
+                try:
+                    self._extend(clusters[i:i + MAX_TRANSACT_ITEMS])
+                except Exception as e:
+                    logger.warning(f"Lease heartbeat failed, retrying next cycle: {e}")
+
+            with self._lock:
+                if not self._held:
+                    self._thread = None
+                    return
+
+    def _extend(self, clusters):
+
+        expires_at = int(time.time()) + self.state.lock_timeout_seconds
+        values = {
+            ":exp": expires_at,
+            ":owner": self.state.owner,
+            ":in_progress": "IN_PROGRESS"
+        }
+
+        items = [
+            {
+                "Update": {
+                    "TableName": self.state.table.name,
+                    "Key": self.state._key(cluster),
+                    "UpdateExpression": "SET lease_expires_at = :exp",
+                    "ConditionExpression": "lock_owner = :owner AND #s = :in_progress",
+                    "ExpressionAttributeNames": {"#s": "status"},
+                    "ExpressionAttributeValues": values
+                }
+            }
+            for cluster in clusters
+        ]
+
+        try:
+            self.state.client.transact_write_items(TransactItems=items)
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "TransactionCanceledException":
+                raise
+
+            reasons = e.response.get("CancellationReasons", [])
+            lost = [
+                cluster for cluster, reason in zip(clusters, reasons)
+                if reason.get("Code") == "ConditionalCheckFailed"
+            ]
+
+            for cluster in lost:
+                logger.error(f"Lease lost for {cluster.identifier()}, no longer extending it")
+                self.untrack(cluster)
+
+            # Everyone else in the batch was rolled back with the losers
+            remaining = [c for c in clusters if c not in lost]
+            if lost and remaining:
+                self._extend(remaining)
+            elif not lost:
+                raise
+            return
+
+        logger.info(f"Extended {len(clusters)} lease(s) until {expires_at}")
+
 
 class StateManager:
 
-    def __init__(self, table_name="eks_fleet_upgrade", region=None, lock_timeout_seconds=600):
-        self.dynamodb = boto3.resource("dynamodb", region_name=region)
+    def __init__(self, table_name="eks_fleet_upgrade", region=None, lock_timeout_seconds=600,
+                 dynamodb=None):
+        self.dynamodb = dynamodb or boto3.resource("dynamodb", region_name=region)
         self.table = self.dynamodb.Table(table_name)
+        # The resource's client (de)serializes plain Python values for us
+        self.client = self.dynamodb.meta.client
         self.lock_timeout_seconds = lock_timeout_seconds
 
+        # Identifies our locks so heartbeats never extend someone else's
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.heartbeat = LeaseHeartbeat(self, interval=max(1, lock_timeout_seconds // 3))
+
+        # Write-through cache of state items for this run, keyed by
+        # cluster identifier. None means "known to have no item".
+        self._cache = {}
+        self._cache_lock = threading.Lock()
+
 
     def _key(self, cluster):
         return {
@@ -21,10 +148,58 @@ class StateManager:
             "cluster_name": cluster.name
         }
 
+    def prefetch(self, clusters):
+        """
+        Loads the state of every cluster with one paginated Query per
+        tenant_env partition, so later reads are served from the cache.
+        """
+
+        partitions = {}
+        for cluster in clusters:
+            partitions.setdefault(self._key(cluster)["tenant_env"], []).append(cluster)
+
+        for tenant_env, members in partitions.items():
+
+            items = {}
+            kwargs = {"KeyConditionExpression": Key("tenant_env").eq(tenant_env)}
+
+            while True:
+                response = self.table.query(**kwargs)
+
+                for item in response.get("Items", []):
+                    items[item["cluster_name"]] = item
+
+                if "LastEvaluatedKey" not in response:
+                    break
+                kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+            with self._cache_lock:
+                for cluster in members:
+                    self._cache[cluster.identifier()] = items.get(cluster.name)
+
+            logger.info(f"Prefetched state for {len(members)} clusters in {tenant_env}")
+
+    def get(self, cluster):
+
+        with self._cache_lock:
+            if cluster.identifier() in self._cache:
+                return self._cache[cluster.identifier()]
+
+        item = self.table.get_item(Key=self._key(cluster)).get("Item")
+        self._remember(cluster, item)
+        return item
+
+    def _remember(self, cluster, item):
+        with self._cache_lock:
+            self._cache[cluster.identifier()] = item
+
+    def _forget(self, cluster):
+        with self._cache_lock:
+            self._cache.pop(cluster.identifier(), None)
+
     def already_upgraded(self, cluster):
 
-        response = self.table.get_item(Key=self._key(cluster))
-        item = response.get("Item")
+        item = self.get(cluster)
 
         if not item:
             return False
@@ -34,81 +209,142 @@ class StateManager:
             item.get("target_version") == cluster.version
         )
 
+    @tracing.traced("state.lock")
     def lock(self, cluster):
+        """
+        Acquires the cluster lock in one conditional write: it succeeds only
+        if nobody holds the cluster or the holder's lease has expired.
+        """
 
         key = self._key(cluster)
         now = int(time.time())
 
         logger.info(f"Attempting to lock cluster {cluster.identifier()}")
 
-        # Step 1: Check existing item
-        response = self.table.get_item(Key=key)
-        item = response.get("Item")
-
-        if item:
-            status = item.get("status")
-            started_at = item.get("started_at", 0)
-
-            if status == "IN_PROGRESS":
-                age = now - started_at
-
-                if age < self.lock_timeout_seconds:
-                    logger.warning(
-                        f"Cluster locked and not expired (age={age}s)"
-                    )
-                    raise StateLockError("Cluster already locked")
-
-                else:
-                    logger.warning(
-                        f"Stale lock detected (age={age}s). Overriding lock."
-                    )
-
-        # Step 2: Acquire lock
-        self.table.put_item(
-            Item={
-                **key,
-                "status": "IN_PROGRESS",
-                "target_version": cluster.version,
-                "started_at": now
-            }
-        )
+        item = {
+            **key,
+            "status": "IN_PROGRESS",
+            "target_version": cluster.version,
+            "started_at": now,
+            "lease_expires_at": now + self.lock_timeout_seconds,
+            "lock_owner": self.owner
+        }
+
+        # The planner orders clusters by how long they last took; keep that
+        # across the overwrite (from the cache only, no extra read)
+        with self._cache_lock:
+            previous = self._cache.get(cluster.identifier()) or {}
+        if "last_duration_seconds" in previous:
+            item["last_duration_seconds"] = previous["last_duration_seconds"]
+
+        try:
+            self.table.put_item(
+                Item=item,
+                # Locks written before leases existed expire by started_at
+                ConditionExpression=(
+                    "attribute_not_exists(cluster_name) OR #s <> :in_progress "
+                    "OR lease_expires_at < :now "
+                    "OR (attribute_not_exists(lease_expires_at) AND started_at < :stale)"
+                ),
+                ExpressionAttributeNames={"#s": "status"},
+                ExpressionAttributeValues={
+                    ":in_progress": "IN_PROGRESS",
+                    ":now": now,
+                    ":stale": now - self.lock_timeout_seconds
+                }
+            )
+
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                logger.warning(f"Cluster {cluster.identifier()} locked with an unexpired lease")
+                # Someone else owns it now, our cached view is stale
+                self._forget(cluster)
+                raise StateLockError("Cluster already locked")
+            raise
+
+        self._remember(cluster, item)
+        self.heartbeat.track(cluster)
 
         logger.info("Lock acquired")
 
+    @tracing.traced("state.mark")
     def mark_success(self, cluster):
 
         logger.info(f"Marking {cluster.identifier()} as SUCCESS")
 
-        self.table.update_item(
-            Key=self._key(cluster),
-            UpdateExpression="SET #s = :success, completed_at = :ts",
-            ExpressionAttributeNames={
-                "#s": "status"
-            },
-            ExpressionAttributeValues={
-                ":success": "SUCCESS",
-                ":ts": int(time.time())
-            }
-        )
+        self.heartbeat.untrack(cluster)
 
-    def mark_failure(self, cluster, error_message):
+        now = int(time.time())
+        started_at = int((self.get(cluster) or {}).get("started_at", now))
+
+        try:
+            response = self.table.update_item(
+                Key=self._key(cluster),
+                UpdateExpression=(
+                    "SET #s = :success, completed_at = :ts, last_duration_seconds = :duration "
+                    "REMOVE lease_expires_at, lock_owner"
+                ),
+                ConditionExpression="lock_owner = :owner",
+                ExpressionAttributeNames={
+                    "#s": "status"
+                },
+                ExpressionAttributeValues={
+                    ":success": "SUCCESS",
+                    ":ts": now,
+                    ":duration": now - started_at,
+                    ":owner": self.owner
+                },
+                ReturnValues="ALL_NEW"
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+            self._lease_lost(cluster, "SUCCESS")
+            return
+
+        self._remember(cluster, response.get("Attributes"))
+
+    @tracing.traced("state.mark")
+    def mark_failure(self, cluster, error_message, status="FAILED"):
+        """Records a failed upgrade (or ABORTED, cut short by a stopping run) and releases the lock."""
 
         key = self._key(cluster)
 
-        logger.error(f"Marking {cluster.identifier()} as FAILED")
-
-        self.table.update_item(
-            Key=key,
-            UpdateExpression="SET #s = :status, #err = :error_msg",
-            ExpressionAttributeNames={
-                "#s": "status",
-                "#err": "error"
-            },
-            ExpressionAttributeValues={
-                ":status": "FAILED",
-                ":error_msg": error_message
-            }
+        logger.error(f"Marking {cluster.identifier()} as {status}")
+
+        self.heartbeat.untrack(cluster)
+
+        try:
+            response = self.table.update_item(
+                Key=key,
+                UpdateExpression="SET #s = :status, #err = :error_msg REMOVE lease_expires_at, lock_owner",
+                ConditionExpression="lock_owner = :owner",
+                ExpressionAttributeNames={
+                    "#s": "status",
+                    "#err": "error"
+                },
+                ExpressionAttributeValues={
+                    ":status": status,
+                    ":error_msg": error_message,
+                    ":owner": self.owner
+                },
+                ReturnValues="ALL_NEW"
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+            self._lease_lost(cluster, status)
+            return
+
+        self._remember(cluster, response.get("Attributes"))
+
+    def _lease_lost(self, cluster, status):
+        # Another run took the lock over after our lease expired; its record stands
+        logger.error(
+            f"Lock on {cluster.identifier()} is no longer ours (lease expired and taken over), "
+            f"not recording {status}"
         )
+        self._forget(cluster)
 
     def update_status(self, cluster, status, extra=None):
 
@@ -124,9 +360,147 @@ class StateManager:
                 update_expression += f", {k} = :{k}"
                 expression_values[f":{k}"] = v
 
-        self.table.update_item(
+        response = self.table.update_item(
             Key=key,
             UpdateExpression=update_expression,
             ExpressionAttributeNames={"#s": "status"},
-            ExpressionAttributeValues=expression_values
+            ExpressionAttributeValues=expression_values,
+            ReturnValues="ALL_NEW"
         )
+
+        self._remember(cluster, response.get("Attributes"))
+
+    # -------------------------
+    # Blue teardown queue
+    # -------------------------
+    def _teardown_key(self, tenant, env, cluster_name):
+        return {
+            "tenant_env": f"{tenant}#{env}",
+            "cluster_name": f"{cluster_name}{TEARDOWN_SUFFIX}"
+        }
+
+    def enqueue_teardown(self, cluster, not_before):
+        """Queues the destroy of cluster's blue side, due at not_before (epoch seconds)."""
+
+        item = {
+            **self._teardown_key(cluster.tenant, cluster.env, cluster.name),
+            "kind": "teardown",
+            "cluster": cluster.name,
+            "fleet": cluster.fleet,
+            "version": cluster.version,
+            "region": cluster.region,
+            "status": "PENDING",
+            "enqueued_at": int(time.time()),
+            "not_before": int(not_before),
+            "attempts": 0
+        }
+
+        try:
+            # Never reset a teardown someone is running right now
+            self.table.put_item(
+                Item=item,
+                ConditionExpression="attribute_not_exists(cluster_name) OR #s <> :in_progress",
+                ExpressionAttributeNames={"#s": "status"},
+                ExpressionAttributeValues={":in_progress": "IN_PROGRESS"}
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+            logger.warning(f"Teardown of {cluster.name} already running, not queued again")
+            return None
+
+        logger.info(f"Queued teardown of {cluster.identifier()} for {item['not_before']}")
+        return item
+
+    def teardowns(self, tenant, env):
+        """Every teardown item of a tenant/env, whatever its status."""
+
+        items = []
+        kwargs = {"KeyConditionExpression": Key("tenant_env").eq(f"{tenant}#{env}")}
+
+        while True:
+            response = self.table.query(**kwargs)
+            items.extend(i for i in response.get("Items", []) if i.get("kind") == "teardown")
+
+            if "LastEvaluatedKey" not in response:
+                return items
+            kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    def claim_teardown(self, item, lease_seconds):
+        """PENDING (or a stale claim) -> IN_PROGRESS for us; None if someone else has it."""
+
+        now = int(time.time())
+
+        try:
+            response = self.table.update_item(
+                Key={"tenant_env": item["tenant_env"], "cluster_name": item["cluster_name"]},
+                UpdateExpression=(
+                    "SET #s = :in_progress, lock_owner = :owner, lease_expires_at = :exp, "
+                    "attempts = :attempts"
+                ),
+                ConditionExpression="#s = :pending OR (#s = :in_progress AND lease_expires_at < :now)",
+                ExpressionAttributeNames={"#s": "status"},
+                ExpressionAttributeValues={
+                    ":in_progress": "IN_PROGRESS",
+                    ":pending": "PENDING",
+                    ":owner": self.owner,
+                    ":exp": now + lease_seconds,
+                    ":now": now,
+                    ":attempts": int(item.get("attempts", 0)) + 1
+                },
+                ReturnValues="ALL_NEW"
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                return None
+            raise
+
+        return response.get("Attributes")
+
+    def finish_teardown(self, item, status, error=None, not_before=None):
+        """Records DONE / FAILED, or PENDING again (retry at not_before), for a claimed teardown."""
+
+        assignments = ["#s = :status"]
+        names = {"#s": "status"}
+        values = {":status": status, ":owner": self.owner}
+
+        if error is not None:
+            assignments.append("#err = :error")
+            names["#err"] = "error"
+            values[":error"] = error
+
+        if not_before is not None:
+            assignments.append("not_before = :not_before")
+            values[":not_before"] = int(not_before)
+
+        try:
+            self.table.update_item(
+                Key={"tenant_env": item["tenant_env"], "cluster_name": item["cluster_name"]},
+                UpdateExpression=f"SET {', '.join(assignments)} REMOVE lease_expires_at, lock_owner",
+                ConditionExpression="lock_owner = :owner",
+                ExpressionAttributeNames=names,
+                ExpressionAttributeValues=values
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+            logger.warning(f"Teardown claim on {item['cluster']} was lost before it finished")
+
+    def cancel_teardown(self, tenant, env, cluster_name):
+        """PENDING -> CANCELLED, e.g. after rolling traffic back to blue. False if not pending."""
+
+        try:
+            self.table.update_item(
+                Key=self._teardown_key(tenant, env, cluster_name),
+                UpdateExpression="SET #s = :cancelled",
+                ConditionExpression="#s = :pending",
+                ExpressionAttributeNames={"#s": "status"},
+                ExpressionAttributeValues={":cancelled": "CANCELLED", ":pending": "PENDING"}
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                return False
+            raise
+
+        logger.info(f"Cancelled teardown of {cluster_name}")
+        return True
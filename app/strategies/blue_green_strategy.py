@@ -1,17 +1,25 @@
-import time
 from app.logger import LoggerFactory
-from app.jenkins_client import JenkinsClient
-from app.argocd_client import ArgoCDCLient
+from app import cancellation, tracing
 
 logger = LoggerFactory.get_logger("blue-green")
 
 class BlueGreenUpgradeStrategy:
 
-    def __init__(self, config):
+    NAME = "blue-green"
+
+    def __init__(self, config, jenkins, argocd, validator):
         self.config = config
-        self.jenkins = JenkinsClient(base_url=config["jenkins"]["url"], user=config["jenkins"]["user"], token=config["jenkins"]["token"])
 
-        self.argocd = ArgoCDCLient()
+        # Shared clients from the ClientRegistry
+        self.jenkins = jenkins
+        self.argocd = argocd
+        self.validator = validator
+
+        # TeardownQueue; set by the orchestrator, None destroys blue inline
+        self.teardown = None
+
+        # TrafficService; set by the orchestrator for route53 switches
+        self.traffic = None
 
     def upgrade(self, cluster):
         blue_cluster_name = cluster.name
@@ -21,15 +29,26 @@ class BlueGreenUpgradeStrategy:
         logger.info(f"Green cluster will be {green_cluster_name}")
 
         self._create_green(cluster, green_cluster_name)
-        self.register_argocd(green_cluster_name)
-        self.sync_apps(green_cluster_name)
-        self.validate_cluster(green_cluster_name)
-        self._switch_traffic(blue_cluster_name, green_cluster_name)
-        self._destroy_blue(cluster)
+        self._register_argocd(cluster, green_cluster_name)
+        self._sync_apps(green_cluster_name)
+        self._validate_cluster(green_cluster_name, cluster.version)
+
+        # Past here traffic moves and blue goes away; never start that on an aborted run
+        cancellation.current().raise_if_cancelled()
+
+        self._switch_traffic(cluster, green_cluster_name)
+
+        if self.teardown:
+            # Destroyed after the rollback window, off this cluster's wave slot
+            self.teardown.enqueue(cluster)
+            logger.info(f"Blue cluster {blue_cluster_name} queued for teardown")
+        else:
+            self._destroy_blue(cluster)
 
         logger.info(f"Blue-green upgrade completed for {blue_cluster_name}")
 
-    def _create_green(self, green_cluster_name):
+    @tracing.traced("create_green")
+    def _create_green(self, cluster, green_cluster_name):
         logger.info("Starting Blue-green cluster upgrade")        
         params = {
             "ACTION": "plan",
@@ -44,14 +63,18 @@ class BlueGreenUpgradeStrategy:
 
         queue_id = self.jenkins.trigger_job("blue-green", params)
 
-        result = self.jenkins.wait_for_completion(queue_id)
+        result = self.jenkins.wait_for_completion(queue_id, "blue-green")
 
         if result != "SUCCESS":
             raise Exception(f"Green cluster creation failed for {green_cluster_name}")
         
-    def _register_argocd(self, cluster_name):
+    def _register_argocd(self, cluster, cluster_name):
         logger.info(f"Registering {cluster_name} in Argocd")
-        self.argocd.register_cluster(cluster_name)
+        self.argocd.register_cluster(cluster_name, {
+            "fleet": cluster.fleet,
+            "env": cluster.env,
+            "tenant": cluster.tenant
+        })
         logger.info("Cluster registered in Argocd")
         
     def _sync_apps(self, cluster_name):
@@ -68,47 +91,45 @@ class BlueGreenUpgradeStrategy:
             logger.error(f"Apps are not healthy for cluster {cluster_name}")
             raise Exception(f"Apps not healthy for cluster {cluster_name}")
         
-    def _validate_cluster(self, cluster_name):
-        self.logger.info(f"Validating cluster health: {cluster_name}")
+    @tracing.traced("validate")
+    def _validate_cluster(self, cluster_name, version):
+        logger.info(f"Validating cluster health: {cluster_name}")
 
-        # Simple delay for now — replace with real health check
-        time.sleep(20)
+        self.validator.validate(cluster_name, version)
 
-        # You can add:
-        # - Node ready check
-        # - Ingress ready check
-        # - API server reachable check
+        logger.info("Cluster infra validation complete")
 
-        self.logger.info("Cluster infra validation complete")
 
+    @tracing.traced("traffic_switch")
+    def _switch_traffic(self, cluster, green):
 
-    def _switch_traffic(self, blue, green):
+        logger.info("Switching traffic to GREEN")
 
-        self.logger.info("Switching traffic to GREEN")
+        method = self.config.get("traffic", {}).get("method", self.config.get("traffic_switch"))
 
-        # Example: Route53 switch
-        if self.config.get("traffic_switch") == "route53":
-            self._switch_route53(blue, green)
+        if method == "route53":
+            self._switch_route53(cluster)
 
-        elif self.config.get("traffic_switch") == "alb":
-            self._switch_alb(blue, green)
+        elif method == "alb":
+            self._switch_alb(cluster.name, green)
 
         else:
-            self.logger.warning("No traffic switch method defined")
+            logger.warning("No traffic switch method defined")
 
-        self.logger.info("Traffic successfully switched")
+        logger.info("Traffic successfully switched")
 
-    def _switch_route53(self, blue, green):
-        # Placeholder for weighted DNS change
-        self.logger.info(f"Route53 traffic moved from {blue} → {green}")
+    def _switch_route53(self, cluster):
+        # Weighted records shifted in steps, health-gated, batched per hosted zone
+        self.traffic.switch_to_green(cluster)
 
     def _switch_alb(self, blue, green):
         # Placeholder for ALB target group swap
-        self.logger.info(f"ALB targets switched from {blue} → {green}")
+        logger.info(f"ALB targets switched from {blue} → {green}")
 
+    @tracing.traced("destroy_blue")
     def _destroy_blue(self, cluster):
 
-        self.logger.info(f"Destroying BLUE cluster: {cluster.name}")
+        logger.info(f"Destroying BLUE cluster: {cluster.name}")
 
         params = {
             "ACTION": "destroy",
@@ -120,14 +141,13 @@ class BlueGreenUpgradeStrategy:
             "CONFIRM_DESTROY": "YES"
         }
 
-        queue_id = self.jenkins.trigger_job(
-            self.config["jenkins"]["job_name"],
-            params
-        )
+        job_name = self.config["jenkins"]["job_name"]
+
+        queue_id = self.jenkins.trigger_job(job_name, params)
 
-        result = self.jenkins.wait_for_completion(queue_id)
+        result = self.jenkins.wait_for_completion(queue_id, job_name)
 
         if result != "SUCCESS":
             raise Exception("Failed to destroy blue cluster")
 
-        self.logger.info("Blue cluster destroyed successfully")
\ No newline at end of file
+        logger.info("Blue cluster destroyed successfully")
\ No newline at end of file
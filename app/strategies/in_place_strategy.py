@@ -1,20 +1,20 @@
-import time
 from app.logger import LoggerFactory
-from app.jenkins_client import JenkinsClient
+from app import cancellation, tracing
 
 
 logger = LoggerFactory.get_logger("in-place")
 
 class InPlaceStrategy:
 
-    def __init__(self, config):
+    NAME = "in-place"
+
+    def __init__(self, config, jenkins, argocd, validator):
         self.config = config
 
-        self.jenkins = JenkinsClient(
-            base_url=config["jenkins"]["url"],
-            user=config["jenkins"]["user"],
-            token=config["jenkins"]["token"]
-        )
+        # Shared clients from the ClientRegistry
+        self.jenkins = jenkins
+        self.argocd = argocd
+        self.validator = validator
 
     def upgrade(self, cluster):
         logger.info(f"Starting In-place upgrade for {cluster.name}")
@@ -30,31 +30,27 @@ class InPlaceStrategy:
             "VERSION": cluster.version
         }
 
-        queue = self.jenkins.trigger_job("terraform-cicd-final", params)
+        with tracing.span("control_plane"):
+            queue = self.jenkins.trigger_job("terraform-cicd-final", params)
 
-        result = self.jenkins.wait_for_completion(queue)
+            result = self.jenkins.wait_for_completion(queue, "terraform-cicd-final")
 
-        if result != "SUCCESS":
-            raise Exception("Control plane upgrade failed")
+            if result != "SUCCESS":
+                raise Exception("Control plane upgrade failed")
 
+        cancellation.current().raise_if_cancelled()
         self._sync_argocd(cluster)
         self._validate_cluster(cluster)
 
         logger.info(f"In-place upgrade completed for {cluster.name}")
 
+    @tracing.traced("validate")
     def _validate_cluster(self, cluster):
         logger.info("Validating cluster health")
 
-        # Placeholder
-        # Later:
-        # - Check node Ready
-        # - Check system pods
-        # - Check Argo apps
-        # - Check metrics
-
-        time.sleep(30)
+        self.validator.validate(cluster.name, cluster.version)
 
-        logger.info("Cluster validation passed")        
+        logger.info("Cluster validation passed")
 
     def _sync_argocd(self, cluster):
 
@@ -64,7 +60,9 @@ class InPlaceStrategy:
 
         logger.info("Waiting for ArgoCD apps to become healthy")
 
-        self.argocd.wait_for_apps_healthy(cluster.name)
+        if not self.argocd.wait_for_apps_healthy(cluster.name):
+            logger.error(f"Apps are not healthy for cluster {cluster.name}")
+            raise Exception(f"Apps not healthy for cluster {cluster.name}")
 
         logger.info("ArgoCD sync successful")
 
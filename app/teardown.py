@@ -0,0 +1,262 @@
+"""
+Blue-cluster teardown queue: blue is destroyed in the background once
+traffic is on green, so a cluster's rollout slot is freed at the traffic
+switch instead of after a 15+ minute Terraform destroy.
+
+    python -m app.teardown inventory/prod.yaml             # run every queued teardown
+    python -m app.teardown inventory/prod.yaml --list
+    python -m app.teardown inventory/prod.yaml --cancel prod-cpu-3
+"""
+import argparse
+import heapq
+import itertools
+import sys
+import threading
+import time
+from datetime import datetime
+from app.logger import LoggerFactory
+from app.config_loader import ConfigLoader
+from app.exceptions import ConfigurationError, FleetUpgradeException
+from app.models import Cluster
+
+logger = LoggerFactory.get_logger("teardown")
+
+
+class TeardownQueue:
+    """
+    Persistent, rate-limited queue of blue destroys for one tenant/env.
+
+    Each teardown is an item in the state table, due delay_seconds after it
+    was queued: the window to roll traffic back to blue and cancel it. Due
+    items start at most max_parallel at a time and min_interval_seconds
+    apart, and a claim in the table keeps two processes from destroying
+    the same cluster. A failed destroy is retried up to max_attempts times.
+    Whatever is still queued when the process exits is picked up by the
+    next run, or by python -m app.teardown.
+    """
+
+    def __init__(self, state, destroy_fn, tenant, env, max_parallel=2, delay_seconds=1800,
+                 min_interval_seconds=60, max_attempts=3, retry_seconds=300, lease_seconds=7200):
+        self.state = state
+        self.destroy_fn = destroy_fn
+        self.tenant = tenant
+        self.env = env
+        self.max_parallel = max_parallel
+        self.delay_seconds = delay_seconds
+        self.min_interval_seconds = min_interval_seconds
+        self.max_attempts = max_attempts
+        self.retry_seconds = retry_seconds
+        # How long a claim holds before another process may take it over
+        self.lease_seconds = lease_seconds
+
+        self.done = []
+        self.failed = []
+
+        self._cond = threading.Condition()
+        self._due = []
+        self._sequence = itertools.count()
+        self._running = 0
+        self._last_start = None
+        self._thread = None
+
+    @classmethod
+    def from_config(cls, state, destroy_fn, tenant, env, teardown_config):
+        return cls(
+            state,
+            destroy_fn,
+            tenant,
+            env,
+            max_parallel=teardown_config.get("max_parallel", 2),
+            delay_seconds=teardown_config.get("delay_seconds", 1800),
+            min_interval_seconds=teardown_config.get("min_interval_seconds", 60),
+            max_attempts=teardown_config.get("max_attempts", 3),
+            retry_seconds=teardown_config.get("retry_seconds", 300),
+            lease_seconds=teardown_config.get("lease_seconds", 7200)
+        )
+
+    def enqueue(self, cluster):
+        """Records the teardown of cluster's blue side and schedules it after the delay."""
+
+        item = self.state.enqueue_teardown(cluster, time.time() + self.delay_seconds)
+        if item:
+            self._schedule(item)
+
+    def resume(self):
+        """Schedules the teardowns earlier runs left queued (or claimed and abandoned)."""
+
+        items = [
+            item for item in self.state.teardowns(self.tenant, self.env)
+            if item.get("status") in ("PENDING", "IN_PROGRESS")
+        ]
+
+        for item in items:
+            self._schedule(item)
+
+        if items:
+            logger.info(f"Resumed {len(items)} queued blue teardown(s)")
+
+        return len(items)
+
+    def pending(self):
+        with self._cond:
+            return len(self._due) + self._running
+
+    def join(self, timeout=None):
+        """Waits until nothing is queued or running; False on timeout."""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._due and not self._running, timeout)
+
+    def _schedule(self, item):
+
+        with self._cond:
+            heapq.heappush(self._due, (int(item["not_before"]), next(self._sequence), item))
+            self._cond.notify_all()
+
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="teardown", daemon=True)
+                self._thread.start()
+
+    def _loop(self):
+
+        with self._cond:
+            while self._due:
+
+                if self._running >= self.max_parallel:
+                    self._cond.wait()
+                    continue
+
+                wait = self._due[0][0] - time.time()
+                if self._last_start is not None:
+                    wait = max(wait, self._last_start + self.min_interval_seconds - time.monotonic())
+
+                if wait > 0:
+                    self._cond.wait(wait)
+                    continue
+
+                _, _, item = heapq.heappop(self._due)
+                self._running += 1
+                self._last_start = time.monotonic()
+
+                threading.Thread(
+                    target=self._teardown,
+                    args=(item,),
+                    name=f"teardown-{item['cluster']}",
+                    daemon=True
+                ).start()
+
+            self._thread = None
+
+    def _teardown(self, item):
+
+        name = item["cluster"]
+
+        try:
+            claimed = self.state.claim_teardown(item, self.lease_seconds)
+            if claimed is None:
+                logger.info(f"Teardown of {name} no longer pending (cancelled, done or claimed elsewhere)")
+                return
+
+            cluster = Cluster(
+                name=name,
+                fleet=claimed.get("fleet"),
+                version=claimed.get("version"),
+                is_canary=False,
+                tenant=self.tenant,
+                env=self.env,
+                region=claimed.get("region")
+            )
+
+            logger.info(f"Tearing down blue side of {name} (attempt {claimed['attempts']})")
+
+            try:
+                self.destroy_fn(cluster)
+            except Exception as e:
+                self._destroy_failed(claimed, e)
+                return
+
+            self.state.finish_teardown(claimed, "DONE")
+            self.done.append(name)
+            logger.info(f"Blue side of {name} torn down")
+
+        except Exception as e:
+            logger.error(f"Teardown of {name} could not be recorded: {e}")
+            self.failed.append(name)
+
+        finally:
+            with self._cond:
+                self._running -= 1
+                self._cond.notify_all()
+
+    def _destroy_failed(self, claimed, error):
+
+        name = claimed["cluster"]
+
+        if int(claimed["attempts"]) >= self.max_attempts:
+            logger.error(f"Teardown of {name} failed for good: {error}")
+            self.state.finish_teardown(claimed, "FAILED", error=str(error))
+            self.failed.append(name)
+            return
+
+        not_before = time.time() + self.retry_seconds
+        logger.warning(f"Teardown of {name} failed, retrying in {self.retry_seconds}s: {error}")
+        self.state.finish_teardown(claimed, "PENDING", error=str(error), not_before=not_before)
+        self._schedule({**claimed, "status": "PENDING", "not_before": not_before})
+
+
+def print_teardowns(items):
+
+    print(f"{'cluster':<30} {'status':<12} {'due':<20} {'attempts':>8}  error")
+
+    for item in sorted(items, key=lambda i: (i.get("status"), int(i.get("not_before", 0)))):
+        due = datetime.fromtimestamp(int(item.get("not_before", 0))).strftime("%Y-%m-%d %H:%M:%S")
+        print(
+            f"{item['cluster']:<30} {item.get('status', '?'):<12} {due:<20} "
+            f"{int(item.get('attempts', 0)):>8}  {item.get('error', '')}"
+        )
+
+
+def main():
+
+    parser = argparse.ArgumentParser(
+        prog="python -m app.teardown",
+        description="List, cancel or run the queued blue-cluster teardowns of a blueprint"
+    )
+    parser.add_argument("config", help="Blueprint YAML")
+    parser.add_argument("--list", action="store_true", help="show every teardown and its status")
+    parser.add_argument("--cancel", metavar="CLUSTER", help="cancel a pending teardown (after a rollback)")
+    args = parser.parse_args()
+
+    # The orchestrator builds the queue with the blueprint's clients
+    from app.orchestrator import FleetOrchestrator
+
+    try:
+        orchestrator = FleetOrchestrator(ConfigLoader.load(args.config))
+        queue = orchestrator.teardown
+
+        if queue is None:
+            raise ConfigurationError(f"{orchestrator.env} upgrades in place; there is no blue side to tear down")
+
+        if args.list:
+            print_teardowns(orchestrator.state.teardowns(queue.tenant, queue.env))
+            return
+
+        if args.cancel:
+            if not orchestrator.state.cancel_teardown(queue.tenant, queue.env, args.cancel):
+                raise FleetUpgradeException(f"No pending teardown for {args.cancel}")
+            return
+
+        if queue.resume():
+            queue.join()
+
+        if queue.failed:
+            raise FleetUpgradeException(f"{len(queue.failed)} teardown(s) failed: {', '.join(queue.failed)}")
+
+        logger.info(f"{len(queue.done)} teardown(s) completed")
+
+    except FleetUpgradeException as e:
+        logger.error(f"Teardown failed: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
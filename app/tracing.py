@@ -0,0 +1,409 @@
+import contextvars
+import functools
+import json
+import os
+import secrets
+import statistics
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from app.logger import LoggerFactory, log_context
+
+logger = LoggerFactory.get_logger("tracing")
+
+SERVICE_NAME = "eks-fleet-orchestrator"
+
+# Tags a span hands down to every span opened under it
+INHERITED = ("tenant", "env", "fleet", "cluster", "wave")
+
+_tracer = contextvars.ContextVar("tracer", default=None)
+_span = contextvars.ContextVar("span", default=None)
+
+
+class Span:
+
+    def __init__(self, tracer, name, parent, attributes, start_ns=None):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = tracer.trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent else None
+
+        inherited = {k: v for k, v in parent.attributes.items() if k in INHERITED} if parent else {}
+        self.attributes = {**inherited, **{k: v for k, v in attributes.items() if v is not None}}
+
+        self.start_ns = start_ns or time.time_ns()
+        self.end_ns = None
+        self.error = None
+
+    @property
+    def seconds(self):
+        return (self.end_ns - self.start_ns) / 1e9
+
+    def set(self, **attributes):
+        self.attributes.update({k: v for k, v in attributes.items() if v is not None})
+
+    def end(self, end_ns=None):
+        self.end_ns = end_ns or time.time_ns()
+        self.tracer._finished(self)
+
+
+class _NoopSpan:
+
+    def set(self, **attributes):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+@contextmanager
+def span(name, **attributes):
+    """
+    Times the block as a child of the current span. Without an active
+    tracer (e.g. plan, or a client used on its own) this costs nothing.
+    """
+
+    tracer = _tracer.get()
+    parent = _span.get()
+
+    if tracer is None:
+        yield NOOP_SPAN
+        return
+
+    if parent is not None and parent.name == name:
+        # The same stage re-entered, e.g. the ArgoCD API client falling
+        # back to the CLI one: one span, not two
+        parent.set(**attributes)
+        yield parent
+        return
+
+    current = Span(tracer, name, parent, attributes)
+    token = _span.set(current)
+    tags = {k: v for k, v in current.attributes.items() if k in INHERITED}
+
+    try:
+        # Log records inside the span carry the same tags
+        with log_context(**tags):
+            yield current
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _span.reset(token)
+        current.end()
+
+
+def traced(name):
+    """Decorator form of span() for methods that are one stage."""
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+
+    return decorator
+
+
+def record(name, start_ns, end_ns, **attributes):
+    """Adds an already-finished child span, for stages timed elsewhere."""
+
+    tracer = _tracer.get()
+    if tracer is None:
+        return
+
+    finished = Span(tracer, name, _span.get(), attributes, start_ns=start_ns)
+    finished.end(max(end_ns, start_ns))
+
+
+def submit(executor, fn, *args):
+    # Pool threads do not inherit contextvars; run fn in a copy of ours
+    return executor.submit(contextvars.copy_context().run, fn, *args)
+
+
+class Tracer:
+    """
+    Collects the spans of one orchestrator run. At the end of the run it
+    appends them to an OTLP/JSON file (one ExportTraceServiceRequest per
+    line), writes per-stage totals to a Prometheus textfile, and logs a
+    per-stage summary with the run's critical path.
+
+    File paths may use {tenant} and {env}, so tenants of a batch run do
+    not overwrite each other.
+    """
+
+    def __init__(self, resource=None, otlp_file=None, prometheus_textfile=None, summary=True):
+        self.resource = resource or {}
+        self.otlp_file = self._path(otlp_file)
+        self.prometheus_textfile = self._path(prometheus_textfile)
+        self.summary = summary
+
+        self.trace_id = secrets.token_hex(16)
+        self.spans = []
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, tracing_config, resource):
+        return cls(
+            resource=resource,
+            otlp_file=tracing_config.get("otlp_file"),
+            prometheus_textfile=tracing_config.get("prometheus_textfile"),
+            summary=tracing_config.get("summary", True)
+        )
+
+    def _path(self, template):
+        return template.format(**self.resource) if template else None
+
+    @contextmanager
+    def activate(self):
+        token = _tracer.set(self)
+        try:
+            yield self
+        finally:
+            _tracer.reset(token)
+
+    def _finished(self, finished):
+        with self._lock:
+            self.spans.append(finished)
+
+    def finish(self):
+        """Exports and summarises everything recorded, then starts afresh."""
+
+        with self._lock:
+            spans, self.spans = self.spans, []
+            trace_id, self.trace_id = self.trace_id, secrets.token_hex(16)
+
+        roots = [s for s in spans if s.parent_id is None]
+        if not roots:
+            return
+
+        root = max(roots, key=lambda s: s.end_ns - s.start_ns)
+        path = critical_path(root, spans)
+
+        for export, target in [(self._write_otlp, self.otlp_file),
+                               (self._write_prometheus, self.prometheus_textfile)]:
+            if not target:
+                continue
+            try:
+                export(target, spans, root, path)
+            except OSError as e:
+                # Losing the trace must not fail the upgrade
+                logger.warning(f"Could not write {target}: {e}")
+
+        if self.summary:
+            self._log_summary(spans, root, path)
+
+        logger.info(f"Trace {trace_id}: {len(spans)} spans")
+
+    # -------------------------
+    # Exports
+    # -------------------------
+    def _write_otlp(self, path, spans, root, critical):
+
+        request = {
+            "resourceSpans": [{
+                "resource": {"attributes": otlp_attributes({"service.name": SERVICE_NAME, **self.resource})},
+                "scopeSpans": [{
+                    "scope": {"name": "app.tracing"},
+                    "spans": [otlp_span(s) for s in spans]
+                }]
+            }]
+        }
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with open(path, "a") as f:
+            f.write(json.dumps(request, separators=(",", ":")) + "\n")
+
+    def _write_prometheus(self, path, spans, root, critical):
+
+        base = {k: self.resource[k] for k in ("tenant", "env") if k in self.resource}
+        by_stage = stage_seconds(spans)
+        on_path = defaultdict(float)
+        for segment, seconds in critical:
+            on_path[segment.name] += seconds
+
+        metrics = [
+            ("fleet_upgrade_run_seconds", "Wall-clock duration of the last run.", "gauge",
+             [(base, root.seconds)]),
+            ("fleet_upgrade_run_timestamp_seconds", "When the last run finished.", "gauge",
+             [(base, root.end_ns / 1e9)]),
+            ("fleet_upgrade_stage_seconds", "Time spent in each stage in the last run, summed over clusters.",
+             "gauge", [({**base, "stage": n}, sum(v)) for n, v in by_stage.items()]),
+            ("fleet_upgrade_stage_count", "Times each stage ran in the last run.", "gauge",
+             [({**base, "stage": n}, len(v)) for n, v in by_stage.items()]),
+            ("fleet_upgrade_stage_max_seconds", "Longest single run of each stage in the last run.", "gauge",
+             [({**base, "stage": n}, max(v)) for n, v in by_stage.items()]),
+            ("fleet_upgrade_critical_path_seconds", "Time each stage contributed to the last run's critical path.",
+             "gauge", [({**base, "stage": n}, v) for n, v in on_path.items()]),
+            ("fleet_upgrade_cluster_seconds", "Upgrade duration of each cluster in the last run.", "gauge",
+             [({**base, "fleet": s.attributes.get("fleet", ""), "cluster": s.attributes.get("cluster", ""),
+                "status": "failed" if s.error else "succeeded"}, s.seconds)
+              for s in spans if s.name == "cluster"])
+        ]
+
+        lines = []
+        for name, help_text, kind, samples in metrics:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{prometheus_labels(labels)} {value:.3f}")
+
+        # The textfile collector may read at any moment, so swap in whole
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp, path)
+
+    # -------------------------
+    # Summary
+    # -------------------------
+    def _log_summary(self, spans, root, critical):
+
+        total = root.seconds or 1e-9
+        by_stage = stage_seconds(spans)
+        on_path = defaultdict(float)
+        for segment, seconds in critical:
+            on_path[segment.name] += seconds
+
+        logger.info(f"Run took {format_seconds(root.seconds)}; time by stage:")
+        logger.info(
+            f"  {'stage':<22} {'count':>6} {'total':>9} {'p50':>8} {'max':>8} {'critical':>9} {'%':>5}"
+        )
+
+        for name in sorted(by_stage, key=lambda n: (-on_path.get(n, 0), -sum(by_stage[n]))):
+            seconds = by_stage[name]
+            logger.info(
+                f"  {name:<22} {len(seconds):>6} {format_seconds(sum(seconds)):>9} "
+                f"{format_seconds(statistics.median(seconds)):>8} {format_seconds(max(seconds)):>8} "
+                f"{format_seconds(on_path.get(name, 0)):>9} {100 * on_path.get(name, 0) / total:>4.0f}%"
+            )
+
+        # Consecutive segments of the same cluster and stage read as one
+        steps = []
+        for segment, seconds in critical:
+            label = segment.name
+            if segment.attributes.get("cluster"):
+                label += f" [{segment.attributes['cluster']}]"
+            if steps and steps[-1][0] == label:
+                steps[-1][1] += seconds
+            else:
+                steps.append([label, seconds])
+
+        logger.info("Critical path:")
+        for label, seconds in steps:
+            if seconds >= 0.05:
+                logger.info(f"  {format_seconds(seconds):>8}  {label}")
+
+
+def critical_path(root, spans):
+    """
+    (span, seconds) segments that determined when root finished, in order.
+
+    Walks back from the end of each span: the child that finished last is
+    on the path, then the child that finished last before that one started,
+    and so on. Time not covered by a child counts against the span itself.
+    """
+
+    children = defaultdict(list)
+    for s in spans:
+        children[s.parent_id].append(s)
+
+    segments = []
+
+    def walk(current, end_ns):
+        cursor = end_ns
+        kids = children[current.span_id]
+
+        while True:
+            before = [k for k in kids if k.start_ns < cursor]
+            if not before:
+                break
+
+            kid = max(before, key=lambda k: k.end_ns)
+            kid_end = min(kid.end_ns, cursor)
+
+            if cursor > kid_end:
+                segments.append((current, (cursor - kid_end) / 1e9))
+            walk(kid, kid_end)
+            cursor = kid.start_ns
+
+        if cursor > current.start_ns:
+            segments.append((current, (cursor - current.start_ns) / 1e9))
+
+    walk(root, root.end_ns)
+    segments.reverse()
+    return segments
+
+
+def stage_seconds(spans):
+    by_stage = defaultdict(list)
+    for s in spans:
+        by_stage[s.name].append(s.seconds)
+    return by_stage
+
+
+def otlp_attributes(attributes):
+
+    converted = []
+    for key, value in attributes.items():
+        if isinstance(value, bool):
+            typed = {"boolValue": value}
+        elif isinstance(value, int):
+            typed = {"intValue": str(value)}
+        elif isinstance(value, float):
+            typed = {"doubleValue": value}
+        else:
+            typed = {"stringValue": str(value)}
+        converted.append({"key": key, "value": typed})
+
+    return converted
+
+
+def otlp_span(s):
+
+    converted = {
+        "traceId": s.trace_id,
+        "spanId": s.span_id,
+        "name": s.name,
+        "kind": 1,  # SPAN_KIND_INTERNAL
+        "startTimeUnixNano": str(s.start_ns),
+        "endTimeUnixNano": str(s.end_ns),
+        "attributes": otlp_attributes(s.attributes),
+        # STATUS_CODE_ERROR / STATUS_CODE_OK
+        "status": {"code": 2, "message": s.error} if s.error else {"code": 1}
+    }
+
+    if s.parent_id:
+        converted["parentSpanId"] = s.parent_id
+
+    return converted
+
+
+def prometheus_labels(labels):
+
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{escape_label(v)}"' for k, v in labels.items()) + "}"
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_seconds(seconds):
+
+    if seconds < 60:
+        return f"{seconds:.1f}s"
+
+    minutes, seconds = divmod(int(seconds), 60)
+    return f"{minutes // 60}h{minutes % 60:02d}m" if minutes >= 60 else f"{minutes}m{seconds:02d}s"
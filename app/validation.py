@@ -0,0 +1,198 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_EXCEPTION
+from app.logger import LoggerFactory
+from app.exceptions import ValidationError
+from app import cancellation
+
+logger = LoggerFactory.get_logger("validation")
+
+SYSTEM_NAMESPACE = "kube-system"
+
+
+class ClusterValidator:
+    """
+    Post-upgrade health validation.
+
+    Every check runs concurrently and is re-polled until it passes or hits
+    its own timeout, so validate() returns as soon as the slowest check
+    passes and fails as soon as any check times out. Passed checks are
+    remembered per (cluster, version), so a retried validation only re-runs
+    what had not passed yet.
+    """
+
+    CHECKS = ["control_plane", "api_server", "nodes_ready", "system_pods", "nodegroup_versions"]
+
+    def __init__(self, eks, checks=None, timeout_seconds=900, timeouts=None,
+                 poll_seconds=10, enabled=True):
+        self.eks = eks
+        self.checks = checks or self.CHECKS
+        self.timeout_seconds = timeout_seconds
+        self.timeouts = timeouts or {}
+        self.poll_seconds = poll_seconds
+        self.enabled = enabled
+
+        self._passed = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, eks, validation_config):
+        return cls(
+            eks=eks,
+            checks=validation_config.get("checks"),
+            timeout_seconds=validation_config.get("timeout_seconds", 900),
+            timeouts=validation_config.get("timeouts"),
+            poll_seconds=validation_config.get("poll_seconds", 10),
+            enabled=validation_config.get("enabled", True)
+        )
+
+    def validate(self, cluster_name, version):
+
+        if not self.enabled:
+            logger.info(f"Validation disabled, skipping checks for {cluster_name}")
+            return
+
+        with self._lock:
+            passed = self._passed.setdefault((cluster_name, version), set())
+            todo = [c for c in self.checks if c not in passed]
+
+        if not todo:
+            logger.info(f"All checks already passed for {cluster_name} @ {version}")
+            return
+
+        logger.info(f"Validating {cluster_name} @ {version}: {', '.join(todo)}")
+
+        started = time.monotonic()
+        stop = threading.Event()
+
+        # Cancelling the run stops the checks the same way a failed check does
+        token = cancellation.current()
+        handle = token.on_cancel(stop.set)
+
+        try:
+            with ThreadPoolExecutor(max_workers=len(todo)) as executor:
+
+                futures = {
+                    executor.submit(self._run_check, check, cluster_name, version, stop): check
+                    for check in todo
+                }
+
+                done, _ = wait(futures, return_when=FIRST_EXCEPTION)
+
+                for future in done:
+                    if future.exception():
+                        stop.set()
+                        token.raise_if_cancelled()
+                        raise future.exception()
+        finally:
+            token.remove(handle)
+
+        logger.info(f"Cluster {cluster_name} validated in {time.monotonic() - started:.0f}s")
+
+    def _run_check(self, check, cluster_name, version, stop):
+
+        deadline = time.monotonic() + self.timeouts.get(check, self.timeout_seconds)
+        fn = getattr(self, f"_check_{check}")
+        detail = "not run"
+
+        while not stop.is_set():
+            try:
+                ok, detail = fn(cluster_name, version)
+            except Exception as e:
+                ok, detail = False, f"error: {e}"
+
+            if ok:
+                logger.info(f"[{cluster_name}] {check} passed")
+                with self._lock:
+                    self._passed[(cluster_name, version)].add(check)
+                return
+
+            if time.monotonic() >= deadline:
+                raise ValidationError(f"{cluster_name}: {check} did not pass in time ({detail})")
+
+            stop.wait(self.poll_seconds)
+
+        raise ValidationError(f"{cluster_name}: {check} cancelled")
+
+    # -------------------------
+    # Checks: return (ok, detail)
+    # -------------------------
+    def _check_control_plane(self, cluster_name, version):
+
+        cluster = self.eks.describe_cluster(cluster_name)
+        if not cluster:
+            return False, "cluster not found"
+
+        if cluster["status"] != "ACTIVE":
+            return False, f"status {cluster['status']}"
+
+        if cluster["version"] != version:
+            return False, f"version {cluster['version']}"
+
+        return True, "active"
+
+    def _check_api_server(self, cluster_name, version):
+        response = self.eks.kube_get(cluster_name, "/readyz")
+        return response.status_code == 200, f"/readyz returned {response.status_code}"
+
+    def _check_nodes_ready(self, cluster_name, version):
+
+        response = self.eks.kube_get(cluster_name, "/api/v1/nodes")
+        if response.status_code != 200:
+            return False, f"nodes list returned {response.status_code}"
+
+        nodes = response.json().get("items", [])
+        if not nodes:
+            return False, "no nodes"
+
+        not_ready = [
+            n["metadata"]["name"] for n in nodes
+            if not any(
+                c["type"] == "Ready" and c["status"] == "True"
+                for c in n.get("status", {}).get("conditions", [])
+            )
+        ]
+
+        if not_ready:
+            return False, f"{len(not_ready)}/{len(nodes)} nodes not Ready"
+
+        return True, f"{len(nodes)} nodes Ready"
+
+    def _check_system_pods(self, cluster_name, version):
+
+        response = self.eks.kube_get(cluster_name, f"/api/v1/namespaces/{SYSTEM_NAMESPACE}/pods")
+        if response.status_code != 200:
+            return False, f"pods list returned {response.status_code}"
+
+        pods = response.json().get("items", [])
+
+        unhealthy = []
+        for pod in pods:
+            status = pod.get("status", {})
+            phase = status.get("phase")
+
+            if phase == "Succeeded":
+                continue
+
+            ready = all(c.get("ready") for c in status.get("containerStatuses", []))
+            if phase != "Running" or not ready:
+                unhealthy.append(pod["metadata"]["name"])
+
+        if unhealthy:
+            return False, f"{len(unhealthy)} {SYSTEM_NAMESPACE} pods not running: {', '.join(unhealthy[:5])}"
+
+        return True, f"{len(pods)} {SYSTEM_NAMESPACE} pods running"
+
+    def _check_nodegroup_versions(self, cluster_name, version):
+
+        stale = []
+        for name in self.eks.list_nodegroups(cluster_name):
+            nodegroup = self.eks.describe_nodegroup(cluster_name, name)
+
+            if nodegroup["status"] != "ACTIVE" or nodegroup.get("version") != version:
+                stale.append(f"{name}={nodegroup.get('version')}/{nodegroup['status']}")
+
+        if stale:
+            return False, f"nodegroups not at {version}: {', '.join(stale)}"
+
+        return True, "nodegroups at target version"
@@ -0,0 +1,109 @@
+"""
+Registers, syncs and waits on N clusters in parallel through the ArgoCD
+REST client against the in-process fake ArgoCD. Health waiting is done
+either by per-cluster polling or by the shared watch stream; reports API
+calls per cluster and how long after the apps went healthy each waiter
+noticed.
+
+    python -m benchmarks.bench_argocd --clusters 10 50
+    python -m benchmarks.bench_argocd --clusters 10 --resync --operation-delay 0.3   # re-sync of healthy apps
+"""
+import argparse
+import base64
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.fake_argocd import FakeArgoCD
+from app.argocd_api import ArgoCDAPIClient
+
+
+class FakeEKS:
+
+    region = "local"
+
+    def describe_cluster(self, cluster_name):
+        return {
+            "endpoint": f"https://{cluster_name}.eks.local",
+            "certificateAuthority": {"data": base64.b64encode(b"fake-ca").decode()}
+        }
+
+
+def poll_until_healthy(client, name, poll_seconds):
+    # What every cluster would do without the watch stream
+    while True:
+        apps = client.app_health(name)
+        if any(health == "Degraded" for _, health in apps.values()):
+            return False
+        if all(sync == "Synced" and health == "Healthy" for sync, health in apps.values()):
+            return True
+        time.sleep(poll_seconds)
+
+
+def measure(mode, clusters, args):
+
+    with FakeArgoCD(token_ttl=args.token_ttl) as fake:
+
+        names = [f"bench-{i}" for i in range(clusters)]
+        for name in names:
+            for app in range(args.apps):
+                fake.add_app(f"{name}-app-{app}", name, sync_seconds=args.sync_seconds,
+                             operation_delay=args.operation_delay, healthy=args.resync)
+
+        client = ArgoCDAPIClient(
+            fake.url, username=fake.username, password=fake.password, eks=FakeEKS()
+        )
+
+        def one(name):
+            client.register_cluster(name, {"fleet": "bench", "env": "dev"})
+            client.sync_cluster(name)
+
+            if mode == "poll":
+                healthy = poll_until_healthy(client, name, args.poll_seconds)
+            else:
+                healthy = client.wait_for_apps_healthy(name)
+
+            return healthy, time.monotonic() - fake.ready_at(name)
+
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=args.parallel) as executor:
+            results = list(executor.map(one, names))
+        elapsed = time.monotonic() - started
+
+        assert all(healthy for healthy, _ in results) and len(fake.clusters) == clusters
+
+        # Apps listed once per cluster by sync_cluster, so count the rest
+        health_calls = fake.calls["list_apps"] - clusters + fake.calls["stream"]
+        latency = statistics.mean(lag for _, lag in results)
+        # Resolved before the new sync had finished, i.e. on stale status
+        early = sum(1 for _, lag in results if lag < 0)
+        return elapsed, health_calls, latency, fake.calls["login"], early
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--clusters", type=int, nargs="+", default=[10, 50])
+    parser.add_argument("--apps", type=int, default=5)
+    parser.add_argument("--parallel", type=int, default=10)
+    parser.add_argument("--sync-seconds", type=float, default=0.3)
+    parser.add_argument("--poll-seconds", type=float, default=0.5)
+    parser.add_argument("--token-ttl", type=int, default=3600)
+    parser.add_argument("--resync", action="store_true", help="apps start Synced/Healthy from an earlier sync")
+    parser.add_argument("--operation-delay", type=float, default=0.05,
+                        help="how long after a sync request its operation shows up")
+    args = parser.parse_args()
+
+    print(f"{'clusters':>8} {'mode':>6} {'seconds':>8} {'health calls':>13} {'lag ms':>7} {'logins':>7} {'early':>6}")
+
+    for clusters in args.clusters:
+        for mode in ["poll", "stream"]:
+            elapsed, calls, latency, logins, early = measure(mode, clusters, args)
+            print(
+                f"{clusters:>8} {mode:>6} {elapsed:>8.2f} {calls:>13} {latency * 1000:>7.0f} "
+                f"{logins:>7} {early:>6}"
+            )
+
+
+if __name__ == "__main__":
+    main()
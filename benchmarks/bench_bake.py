@@ -0,0 +1,86 @@
+"""
+Time spent baking with a fixed max-length bake vs the metric-gated bake,
+against the in-process fake Prometheus.
+
+    python -m benchmarks.bench_bake --clusters 10
+"""
+import argparse
+import threading
+import time
+
+from benchmarks.fake_prometheus import FakePrometheus
+from app.bake import FixedBake, MetricGatedBake
+from app.exceptions import ValidationError
+from app.models import Cluster
+from app.services.metrics_service import PrometheusClient
+
+
+def scenario(fake, clusters, name, args):
+    # Nodes finish joining shortly after the upgrade, or one cluster's
+    # error rate spikes while they are still joining, or one cluster stops
+    # reporting altogether (which must not pass as healthy).
+    for c in clusters:
+        fake.set(c.name, "nodes_not_ready", 1)
+        fake.set(c.name, "error_rate", 0)
+
+    if name == "silent":
+        fake.silence(clusters[-1].name)
+
+    def evolve():
+        if name == "regression":
+            time.sleep(args.settle_seconds / 2)
+            fake.set(clusters[-1].name, "error_rate", 0.2)
+            return
+        time.sleep(args.settle_seconds)
+        for c in clusters:
+            fake.set(c.name, "nodes_not_ready", 0)
+
+    threading.Thread(target=evolve, daemon=True).start()
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--clusters", type=int, default=10)
+    parser.add_argument("--min-seconds", type=float, default=0.5)
+    parser.add_argument("--max-seconds", type=float, default=5.0)
+    parser.add_argument("--poll-seconds", type=float, default=0.1)
+    parser.add_argument("--settle-seconds", type=float, default=0.5)
+    args = parser.parse_args()
+
+    clusters = [
+        Cluster(name=f"bench-{i}", fleet="bench", version="1.29", is_canary=False,
+                tenant="bench", env="dev", region="local")
+        for i in range(args.clusters)
+    ]
+
+    print(f"{'scenario':>11} {'bake':>7} {'seconds':>8} {'queries':>8} outcome")
+
+    for name in ["settles", "regression", "silent"]:
+        for kind in ["fixed", "gated"]:
+            with FakePrometheus() as fake:
+                scenario(fake, clusters, name, args)
+
+                if kind == "fixed":
+                    baker = FixedBake(args.max_seconds)
+                else:
+                    baker = MetricGatedBake(
+                        PrometheusClient(fake.url),
+                        min_seconds=args.min_seconds,
+                        max_seconds=args.max_seconds,
+                        poll_seconds=args.poll_seconds
+                    )
+
+                started = time.monotonic()
+                try:
+                    baker.bake("bench", clusters)
+                    outcome = "passed"
+                except ValidationError:
+                    outcome = "aborted"
+                elapsed = time.monotonic() - started
+
+                print(f"{name:>11} {kind:>7} {elapsed:>8.2f} {fake.calls['query']:>8} {outcome}")
+
+
+if __name__ == "__main__":
+    main()
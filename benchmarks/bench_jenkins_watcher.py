@@ -0,0 +1,124 @@
+"""
+Compares Jenkins polling cost and completion-detection lag of per-cluster
+wait loops, the shared build watcher, and the watcher fed by build
+notifications, using the in-process fake Jenkins.
+
+    python -m benchmarks.bench_jenkins_watcher --builds 10 50 100
+    python -m benchmarks.bench_jenkins_watcher --builds 50 --drop-rate 0.1   # lost notifications
+"""
+import argparse
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.fake_jenkins import FakeJenkins
+from app.jenkins_client import JenkinsClient
+from app.jenkins_watcher import JenkinsBuildWatcher
+from app.jenkins_webhook import JenkinsWebhookListener
+
+JOB_NAME = "terraform-cicd-final"
+
+
+def run_legacy(fake, builds, args):
+
+    client = JenkinsClient(fake.url, "bench", "token")
+    client.QUEUE_POLL_SECONDS = 5 * args.scale
+    client.BUILD_POLL_SECONDS = 10 * args.scale
+
+    def one(_):
+        queue_url = client.trigger_job(JOB_NAME, {})
+        result = client.wait_for_completion(queue_url)
+        return queue_url, result, time.monotonic()
+
+    with ThreadPoolExecutor(max_workers=builds) as executor:
+        return list(executor.map(one, range(builds)))
+
+
+def run_watcher(fake, builds, args):
+    watcher = JenkinsBuildWatcher(fake.url, ("bench", "token"), poll_interval=5 * args.scale)
+    return watch_all(fake, builds, watcher)
+
+
+def run_webhook(fake, builds, args):
+
+    # Notifications resolve the builds; polling is only the 60s safety net
+    listener = JenkinsWebhookListener(port=0)
+    watcher = JenkinsBuildWatcher(
+        fake.url, ("bench", "token"), listener=listener, notified_poll_interval=60 * args.scale
+    )
+    listener.start()
+    fake.enable_notifications(listener.url, drop_rate=args.drop_rate)
+
+    try:
+        return watch_all(fake, builds, watcher)
+    finally:
+        listener.stop()
+
+
+def watch_all(fake, builds, watcher):
+
+    client = JenkinsClient(fake.url, "bench", "token", watcher=watcher)
+
+    resolved = {}
+    futures = []
+
+    for _ in range(builds):
+        queue_url = client.trigger_job(JOB_NAME, {})
+        future = client.watch(JOB_NAME, queue_url)
+        future.add_done_callback(lambda f, q=queue_url: resolved.setdefault(q, time.monotonic()))
+        futures.append((queue_url, future))
+
+    # Done callbacks run just after result() returns; near enough
+    return [(q, f.result(), resolved.get(q, time.monotonic())) for q, f in futures]
+
+
+def measure(mode, builds, args):
+
+    with FakeJenkins(
+        queue_seconds=(args.queue_min, args.queue_max),
+        build_seconds=(args.build_min, args.build_max),
+        seed=args.seed
+    ) as fake:
+
+        started = time.monotonic()
+        results = mode(fake, builds, args)
+        # Until the last result was seen, not including teardown
+        elapsed = max(seen for _, _, seen in results) - started
+
+        polls = fake.total_calls() - fake.calls["trigger"] - fake.calls["notify"]
+
+        # How long after each build finished its waiter saw the result
+        lag = statistics.mean(
+            seen - fake.finished_at(int(queue_url.rstrip("/").rsplit("/", 1)[-1]))
+            for queue_url, _, seen in results
+        )
+
+    assert len(results) == builds
+    return elapsed, polls, lag
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--builds", type=int, nargs="+", default=[10, 50, 100])
+    parser.add_argument("--scale", type=float, default=0.01,
+                        help="Multiplier applied to the real 5s/10s/60s poll intervals")
+    parser.add_argument("--queue-min", type=float, default=0.05)
+    parser.add_argument("--queue-max", type=float, default=0.3)
+    parser.add_argument("--build-min", type=float, default=0.5)
+    parser.add_argument("--build-max", type=float, default=2.0)
+    parser.add_argument("--drop-rate", type=float, default=0.0,
+                        help="Share of build notifications the fake Jenkins loses")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    print(f"{'builds':>7} {'mode':>8} {'seconds':>8} {'polls':>7} {'polls/s':>8} {'lag ms':>7}")
+
+    for builds in args.builds:
+        for name, mode in [("legacy", run_legacy), ("watcher", run_watcher), ("webhook", run_webhook)]:
+            elapsed, polls, lag = measure(mode, builds, args)
+            print(f"{builds:>7} {name:>8} {elapsed:>8.2f} {polls:>7} {polls / elapsed:>8.1f} {lag * 1000:>7.0f}")
+
+
+if __name__ == "__main__":
+    main()
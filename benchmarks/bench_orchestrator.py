@@ -0,0 +1,225 @@
+"""
+End-to-end orchestrator throughput on synthetic blueprints, against the
+in-process fake Jenkins, fake ArgoCD and in-memory DynamoDB.
+
+    python -m benchmarks.bench_orchestrator --clusters 10 100 1000
+    python -m benchmarks.bench_orchestrator --write-baseline benchmarks/baseline.json
+    python -m benchmarks.bench_orchestrator --baseline benchmarks/baseline.json   # exit 1 on regression
+"""
+import argparse
+import json
+import logging
+import sys
+import threading
+import time
+import tracemalloc
+
+from benchmarks.fake_argocd import FakeArgoCD
+from benchmarks.fake_dynamodb import FakeDynamoDB
+from benchmarks.fake_jenkins import FakeJenkins
+from app.bake import FixedBake
+from app.client_registry import ClientRegistry
+from app.exceptions import UpgradeFailedError
+from app.orchestrator import FleetOrchestrator
+from app.state_manager import StateManager
+
+# Lower is better for every metric; the gate fails when one grows past tolerance
+GATED_METRICS = ["makespan_seconds", "http_calls_per_cluster", "peak_threads", "peak_memory_mib"]
+
+
+def blueprint(clusters, jenkins, argocd, args):
+
+    fleets = max(1, -(-clusters // args.fleet_size))
+    config = {}
+
+    for i in range(clusters):
+        fleet = f"fleet-{i % fleets}"
+        config[f"bench-{i}"] = {
+            "fleet": fleet,
+            "version": "1.30",
+            "is_canary": i < fleets
+        }
+
+    return {
+        "tenant": "bench",
+        "env": "dev",
+        "region": "us-east-1",
+        "account_id": "000000000000",
+        "services": {"eks": {"enabled": True, "config": config}},
+        "jenkins": {
+            "url": jenkins.url,
+            "user": "bench",
+            "token": "bench",
+            "poll_interval_seconds": args.poll_seconds,
+            "admission": {
+                "enabled": args.admission,
+                "ttl_seconds": args.poll_seconds,
+                "max_queued": args.max_queued
+            },
+            # Ephemeral port; the fake Jenkins is pointed at it once it is up
+            "webhook": {"enabled": args.webhook, "host": "127.0.0.1", "port": 0}
+        },
+        "argocd": {"url": argocd.url, "username": argocd.username, "password": argocd.password},
+        # No EKS here; validation is covered by its own checks
+        "validation": {"enabled": False},
+        "rollout": {
+            "scheduler": "sliding",
+            "max_failures": args.max_failures,
+            "global_max_parallel": args.max_parallel,
+            "fleets": {f"fleet-{f}": {"max_parallel": args.max_parallel} for f in range(fleets)}
+        }
+    }
+
+
+class ThreadSampler:
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.peak = threading.active_count()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, threading.active_count())
+
+
+def measure(clusters, args):
+
+    with FakeJenkins(
+        queue_seconds=(args.queue_min, args.queue_max),
+        build_seconds=(args.build_min, args.build_max),
+        failure_rate=args.failure_rate,
+        distribution=args.distribution,
+        executors=args.executors,
+        seed=args.seed
+    ) as jenkins, FakeArgoCD() as argocd:
+
+        config = blueprint(clusters, jenkins, argocd, args)
+        for name in config["services"]["eks"]["config"]:
+            argocd.add_app(f"{name}-apps", name, sync_seconds=args.sync_seconds)
+
+        dynamodb = FakeDynamoDB()
+        registry = ClientRegistry()
+
+        orchestrator = FleetOrchestrator(
+            config,
+            registry=registry,
+            state=StateManager(lock_timeout_seconds=300, dynamodb=dynamodb)
+        )
+        orchestrator.baker = FixedBake(args.bake_seconds)
+
+        # Bound here rather than at the first wait, to learn its port
+        listener = orchestrator.strategy.jenkins.watcher.listener
+        if listener and listener.start():
+            jenkins.enable_notifications(listener.url)
+
+        tracemalloc.start()
+        started = time.monotonic()
+
+        with ThreadSampler() as threads:
+            try:
+                orchestrator.run()
+                failed = False
+            except UpgradeFailedError:
+                failed = True
+
+        makespan = time.monotonic() - started
+        _, peak_memory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        registry.close()
+
+        http_calls = jenkins.total_calls() + argocd.total_calls()
+        queue_waits = jenkins.queue_waits()
+
+        return {
+            "makespan_seconds": round(makespan, 2),
+            "http_calls_per_cluster": round(http_calls / clusters, 2),
+            "dynamodb_calls_per_cluster": round(dynamodb.total_calls() / clusters, 2),
+            "peak_threads": threads.peak,
+            "peak_memory_mib": round(peak_memory / 2**20, 1),
+            # Mean time builds sat in the Jenkins queue
+            "jenkins_queue_wait_seconds": round(sum(queue_waits) / max(1, len(queue_waits)), 2),
+            "failed": failed
+        }
+
+
+def regressions(results, baseline, tolerance):
+
+    found = []
+    for clusters, metrics in results.items():
+        base = baseline.get(str(clusters))
+        if not base:
+            continue
+        for metric in GATED_METRICS:
+            if metrics[metric] > base[metric] * (1 + tolerance):
+                found.append(f"{clusters} clusters: {metric} {metrics[metric]} > baseline {base[metric]}")
+    return found
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--clusters", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--fleet-size", type=int, default=50)
+    parser.add_argument("--max-parallel", type=int, default=50)
+    parser.add_argument("--max-failures", type=int, default=1)
+    parser.add_argument("--queue-min", type=float, default=0.05)
+    parser.add_argument("--queue-max", type=float, default=0.2)
+    parser.add_argument("--build-min", type=float, default=0.2)
+    parser.add_argument("--build-max", type=float, default=0.6)
+    parser.add_argument("--distribution", choices=["uniform", "lognormal"], default="uniform")
+    parser.add_argument("--executors", type=int, help="Jenkins executors (default unlimited)")
+    parser.add_argument("--admission", action="store_true", help="gate triggers on Jenkins capacity")
+    parser.add_argument("--max-queued", type=int, default=0, help="admission: items allowed to queue on top")
+    parser.add_argument("--webhook", action="store_true", help="build completion via notifications")
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--sync-seconds", type=float, default=0.1)
+    parser.add_argument("--bake-seconds", type=float, default=0.1)
+    parser.add_argument("--poll-seconds", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--baseline", help="JSON results to gate against; exit 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--write-baseline", help="write these results as the new baseline")
+    args = parser.parse_args()
+
+    # Per-cluster INFO logging would dominate the measurement
+    logging.disable(logging.INFO)
+
+    print(f"{'clusters':>8} {'makespan':>9} {'http/cl':>8} {'ddb/cl':>7} {'threads':>8} {'MiB':>7} {'q-wait':>7} failed")
+
+    results = {}
+    for clusters in args.clusters:
+        r = results[clusters] = measure(clusters, args)
+        print(
+            f"{clusters:>8} {r['makespan_seconds']:>9.2f} {r['http_calls_per_cluster']:>8.2f} "
+            f"{r['dynamodb_calls_per_cluster']:>7.2f} {r['peak_threads']:>8} "
+            f"{r['peak_memory_mib']:>7.1f} {r['jenkins_queue_wait_seconds']:>7.2f} {r['failed']}"
+        )
+
+    if args.write_baseline:
+        with open(args.write_baseline, "w") as f:
+            json.dump({str(k): v for k, v in results.items()}, f, indent=2)
+        print(f"Baseline written to {args.write_baseline}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = regressions(results, json.load(f), args.tolerance)
+
+        for line in found:
+            print(f"REGRESSION {line}")
+        if found:
+            sys.exit(1)
+        print("No regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Makespan of barrier-synchronised waves vs the sliding-window scheduler on a
+simulated fleet with stragglers.
+
+    python -m benchmarks.bench_scheduler --clusters 40 --max-parallel 5
+"""
+import argparse
+import random
+import time
+
+from app.models import Cluster
+from app.scheduler import SlidingWindowScheduler, WaveScheduler
+
+
+def simulated_fleet(count, seed, straggler_rate):
+    # Minutes per cluster: mostly 10-20, with occasional 40 minute stragglers
+    rng = random.Random(seed)
+    fleet = []
+
+    for i in range(count):
+        cluster = Cluster(
+            name=f"sim-{i}", fleet="sim", version="1.29", is_canary=False,
+            tenant="bench", env="dev", region="local"
+        )
+        minutes = 40 if rng.random() < straggler_rate else rng.uniform(10, 20)
+        fleet.append((cluster, minutes))
+
+    return fleet
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--clusters", type=int, default=40)
+    parser.add_argument("--max-parallel", type=int, default=5)
+    parser.add_argument("--wave-percent", type=int, default=25)
+    parser.add_argument("--straggler-rate", type=float, default=0.1)
+    parser.add_argument("--scale", type=float, default=0.01,
+                        help="Real seconds slept per simulated minute")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    fleet = simulated_fleet(args.clusters, args.seed, args.straggler_rate)
+    minutes = {c.name: m for c, m in fleet}
+    clusters = [c for c, _ in fleet]
+
+    def upgrade(cluster):
+        time.sleep(minutes[cluster.name] * args.scale)
+
+    schedulers = [
+        ("waves", WaveScheduler(args.max_parallel, args.wave_percent, bake_fn=lambda stage, wave: None)),
+        ("sliding", SlidingWindowScheduler(args.max_parallel)),
+    ]
+
+    print(f"{'scheduler':>10} {'makespan (sim min)':>19}")
+
+    for name, scheduler in schedulers:
+        started = time.monotonic()
+        result = scheduler.run(clusters, upgrade)
+        elapsed = (time.monotonic() - started) / args.scale
+
+        assert len(result.succeeded) == len(clusters)
+        print(f"{name:>10} {elapsed:>19.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+terraform init across many working dirs: every dir downloading its own
+providers vs the shared plugin cache, cold (first inits take the
+exclusive lock) and pre-warmed once by init_all, against the fake
+terraform binary.
+
+    python -m benchmarks.bench_terraform_init --dirs 20 --max-parallel 4
+    python -m benchmarks.bench_terraform_init --dirs 40 --lock-variants 4
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks import fake_terraform
+from app.services.terraform_service import PluginCache, TerraformService, init_all
+
+
+def make_dirs(root, count, variants):
+    """count working dirs spread over `variants` distinct provider lock files."""
+
+    dirs = []
+    for i in range(count):
+        working_dir = os.path.join(root, f"cluster-{i}")
+        fake_terraform.write_lock_file(working_dir, {
+            "registry.terraform.io/hashicorp/aws": f"5.{30 + i % variants}.0",
+            "registry.terraform.io/hashicorp/kubernetes": "2.24.0",
+            "registry.terraform.io/hashicorp/helm": "2.12.1"
+        })
+        dirs.append(working_dir)
+    return dirs
+
+
+def run(mode, args):
+
+    with tempfile.TemporaryDirectory() as root:
+        os.environ["FAKE_TF_LOG"] = os.path.join(root, "events.log")
+
+        dirs = make_dirs(os.path.join(root, "dirs"), args.dirs, args.lock_variants)
+        cache = None if mode == "no-cache" else PluginCache(os.path.join(root, "plugin-cache"))
+        services = [TerraformService(d, plugin_cache=cache) for d in dirs]
+
+        started = time.monotonic()
+        reports = init_all(services, max_parallel=args.max_parallel, prewarm=mode == "prewarmed")
+        elapsed = time.monotonic() - started
+
+        events = fake_terraform.read_log(os.environ["FAKE_TF_LOG"])
+
+        # Every dir ends up with all of its providers, whichever way it got them
+        for d in dirs:
+            assert len(os.listdir(os.path.join(d, ".terraform", "providers", "registry.terraform.io", "hashicorp"))) == 3, d
+
+        return elapsed, events, reports
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--dirs", type=int, default=20)
+    parser.add_argument("--max-parallel", type=int, default=4)
+    parser.add_argument("--lock-variants", type=int, default=2,
+                        help="distinct provider lock files among the dirs")
+    parser.add_argument("--provider-mib", type=float, default=4)
+    parser.add_argument("--mib-per-second", type=float, default=40)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as bin_dir:
+        fake_terraform.install(bin_dir)
+        os.environ["FAKE_TF_PROVIDER_BYTES"] = str(int(args.provider_mib * 2**20))
+        os.environ["FAKE_TF_BYTES_PER_SECOND"] = str(int(args.mib_per_second * 2**20))
+
+        print(f"{'mode':>10} {'seconds':>8} {'downloads':>10} {'MiB':>8} {'conflicts':>10} {'reused MiB':>11} {'saved s':>8}")
+
+        for mode in ["no-cache", "cold", "prewarmed"]:
+            elapsed, events, reports = run(mode, args)
+            assert events["conflict"] == 0, f"{mode}: concurrent writes to the plugin cache"
+
+            print(
+                f"{mode:>10} {elapsed:>8.2f} {events['download']:>10} {events['bytes'] / 2**20:>8.0f} "
+                f"{events['conflict']:>10} {sum(r['cached_bytes'] for r in reports.values()) / 2**20:>11.0f} "
+                f"{sum(r['saved_seconds'] for r in reports.values()):>8.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+Checks TerraformService's streaming against the fake terraform binary:
+progress events (create/modify counts, per-resource elapsed seconds,
+apply totals) parsed line by line, memory bounded however much Terraform
+prints, and a stalled run's whole process group killed within
+stall_timeout (plus the SIGKILL grace when SIGTERM is ignored).
+
+    python -m benchmarks.bench_terraform_stream
+    python -m benchmarks.bench_terraform_stream --resources 2000 --volume-lines 400000
+"""
+import argparse
+import logging
+import os
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks import fake_terraform
+from app.services import terraform_service
+from app.services.terraform_service import TerraformService, TerraformSink
+
+
+class CountingSink(TerraformSink):
+
+    def __init__(self):
+        self.lines = 0
+
+    def line(self, text):
+        self.lines += 1
+
+
+class RecordingSink(CountingSink):
+
+    def __init__(self):
+        super().__init__()
+        self.events = []
+
+    def progress(self, event):
+        self.events.append(event)
+
+
+def alive(pid):
+    """Running (not a zombie nobody has reaped yet)."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except FileNotFoundError:
+        return False
+
+
+def check_progress(working_dir, args):
+
+    os.environ["FAKE_TF_RESOURCES"] = str(args.resources)
+    sink = RecordingSink()
+
+    started = time.monotonic()
+    TerraformService(working_dir, sink=sink).apply()
+    elapsed = time.monotonic() - started
+
+    planned = fake_terraform.resources(args.resources)
+    completed = {e["address"]: e for e in sink.events if e["kind"] == "complete"}
+    applied = [e for e in sink.events if e["kind"] == "apply"]
+
+    assert len(completed) == len(planned), f"{len(completed)} of {len(planned)} resources parsed"
+    for address, action, seconds, _ in planned:
+        assert completed[address]["action"] == action, address
+        assert completed[address]["elapsed_seconds"] == seconds, (address, completed[address], seconds)
+
+    creates = sum(1 for _, action, _, _ in planned if action == "create")
+    assert applied and applied[0]["add"] == creates and applied[0]["change"] == len(planned) - creates, applied
+
+    return elapsed, sink.lines, f"{creates} created, {len(planned) - creates} modified, elapsed times match"
+
+
+def check_volume(working_dir, args):
+
+    os.environ["FAKE_TF_RESOURCES"] = str(args.volume_lines // 2)
+    os.environ["FAKE_TF_LINE_BYTES"] = str(args.line_bytes)
+    sink = CountingSink()
+
+    # Per-line logging would measure the log handlers' queue, not _run
+    terraform_service.logger.setLevel(logging.WARNING)
+    tracemalloc.start()
+    try:
+        started = time.monotonic()
+        TerraformService(working_dir, sink=sink).apply()
+        elapsed = time.monotonic() - started
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        terraform_service.logger.setLevel(logging.NOTSET)
+        del os.environ["FAKE_TF_LINE_BYTES"]
+
+    # Bounded: the line queue and tail, not the output or one entry per resource
+    output = sink.lines * (args.line_bytes + 1)
+    assert peak < args.max_peak_mib * 2**20, f"peak {peak} bytes for {output} bytes of output"
+
+    return elapsed, sink.lines, f"{output / 2**20:.0f} MiB printed, peak {peak / 2**20:.1f} MiB held"
+
+
+def check_stall(working_dir, args, ignore_term=False):
+
+    os.environ["FAKE_TF_RESOURCES"] = "10"
+    os.environ["FAKE_TF_HANG_AFTER"] = "5"
+    os.environ["FAKE_TF_CHILD_PID"] = os.path.join(working_dir, "child.pid")
+    if ignore_term:
+        os.environ["FAKE_TF_IGNORE_TERM"] = "1"
+
+    grace = terraform_service.KILL_GRACE_SECONDS
+    terraform_service.KILL_GRACE_SECONDS = args.grace_seconds
+    sink = RecordingSink()
+
+    started = time.monotonic()
+    try:
+        TerraformService(working_dir, sink=sink, stall_timeout_seconds=args.stall_seconds).apply()
+        raise AssertionError("stalled apply returned")
+    except Exception as e:
+        assert "stalled" in str(e), e
+    finally:
+        elapsed = time.monotonic() - started
+        terraform_service.KILL_GRACE_SECONDS = grace
+        for name in ["FAKE_TF_HANG_AFTER", "FAKE_TF_CHILD_PID", "FAKE_TF_IGNORE_TERM"]:
+            os.environ.pop(name, None)
+
+    with open(os.path.join(working_dir, "child.pid")) as f:
+        child = int(f.read())
+
+    limit = args.stall_seconds + (args.grace_seconds if ignore_term else 0) + 1
+    assert elapsed < limit, f"killed after {elapsed:.1f}s (limit {limit}s)"
+    assert sink.lines == 5, sink.lines
+
+    # The plugin child shares the process group, so the group kill takes it too
+    deadline = time.monotonic() + 1
+    while alive(child) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert not alive(child), f"provider child {child} survived the kill"
+
+    signal = "SIGKILL after SIGTERM ignored" if ignore_term else "SIGTERM"
+    return elapsed, sink.lines, f"group killed by {signal}, child {child} gone"
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--resources", type=int, default=500)
+    parser.add_argument("--volume-lines", type=int, default=200000)
+    parser.add_argument("--line-bytes", type=int, default=200)
+    parser.add_argument("--max-peak-mib", type=float, default=2,
+                        help="most memory streaming may hold, however much is printed")
+    parser.add_argument("--stall-seconds", type=float, default=1.0)
+    parser.add_argument("--grace-seconds", type=float, default=1.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as bin_dir, tempfile.TemporaryDirectory() as working_dir:
+        fake_terraform.install(bin_dir)
+
+        print(f"{'check':>14} {'seconds':>8} {'lines':>8}  result")
+
+        checks = [
+            ("progress", lambda: check_progress(working_dir, args)),
+            ("memory", lambda: check_volume(working_dir, args)),
+            ("stall", lambda: check_stall(working_dir, args)),
+            ("stall-no-term", lambda: check_stall(working_dir, args, ignore_term=True))
+        ]
+
+        for name, check in checks:
+            elapsed, lines, result = check()
+            print(f"{name:>14} {elapsed:>8.2f} {lines:>8}  {result}")
+
+
+if __name__ == "__main__":
+    main()
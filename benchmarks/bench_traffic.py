@@ -0,0 +1,128 @@
+"""
+Route53 calls and shift time for progressive blue->green traffic shifts
+with one change set per cluster per step vs change sets batched per
+hosted zone, against the in-process fake Route53.
+
+    python -m benchmarks.bench_traffic --clusters 10 50
+    python -m benchmarks.bench_traffic --clusters 20 --fail 3   # gate fails, traffic back on blue
+    python -m benchmarks.bench_traffic --clusters 20 --broken 2   # bad records fail only their own clusters
+"""
+import argparse
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.fake_route53 import FakeRoute53
+from app.bake import FixedBake
+from app.exceptions import ValidationError
+from app.models import Cluster
+from app.services.traffic_service import Route53ChangeBatcher, TrafficService
+
+ZONE_ID = "ZBENCH"
+RECORD = "{cluster}.apps.bench.internal"
+
+
+class FlakyGate(FixedBake):
+    """Fixed bake that fails the given clusters at the given step."""
+
+    def __init__(self, seconds, failing, at_weight=50):
+        super().__init__(seconds)
+        self.failing = failing
+        self.at_weight = at_weight
+
+    def bake(self, stage, clusters):
+        super().bake(stage, clusters)
+        if stage.startswith(f"{self.at_weight}%") and clusters[0].name in self.failing:
+            raise ValidationError(f"{clusters[0].name} unhealthy at {stage}")
+
+
+def run(mode, clusters, args):
+
+    fake = FakeRoute53(propagation_seconds=args.propagation_seconds)
+    for c in clusters:
+        fake.add_weighted_pair(ZONE_ID, RECORD.format(cluster=c.name), f"{c.name}.blue", f"{c.name}.green")
+
+    failing = {c.name for c in clusters[:args.fail]}
+    gate = FlakyGate(args.gate_seconds, failing)
+
+    broken = {c.name for c in clusters[args.fail:args.fail + args.broken]}
+    for name in broken:
+        fake.reject(RECORD.format(cluster=name))
+    failed = set()
+
+    def batcher():
+        return Route53ChangeBatcher(
+            fake,
+            batch_seconds=args.batch_seconds if mode == "batched" else 0,
+            poll_seconds=args.poll_seconds
+        )
+
+    shared = batcher()
+    rng = random.Random(args.seed)
+    starts = {c.name: rng.uniform(0, args.spread_seconds) for c in clusters}
+
+    def shift(cluster):
+        # Clusters of a wave reach the traffic switch at slightly different times
+        time.sleep(starts[cluster.name])
+        service = TrafficService(
+            shared if mode == "batched" else batcher(),
+            gate=gate,
+            hosted_zone_id=ZONE_ID,
+            record=RECORD
+        )
+        try:
+            service.switch_to_green(cluster)
+        except Exception:
+            failed.add(cluster.name)
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=len(clusters)) as executor:
+        list(executor.map(shift, clusters))
+    elapsed = time.monotonic() - started
+
+    # Only the clusters with a failing gate or a bad record stay on blue
+    assert failed == failing | broken, sorted(failed ^ (failing | broken))
+    for c in clusters:
+        expected = {"blue": 100, "green": 0} if c.name in failed else {"blue": 0, "green": 100}
+        assert fake.weights(ZONE_ID, RECORD.format(cluster=c.name)) == expected, c.name
+
+    return elapsed, fake
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--clusters", type=int, nargs="+", default=[10, 50])
+    parser.add_argument("--propagation-seconds", type=float, default=0.5,
+                        help="How long a change stays PENDING (~60s on real Route53)")
+    parser.add_argument("--poll-seconds", type=float, default=0.1)
+    parser.add_argument("--batch-seconds", type=float, default=0.2)
+    parser.add_argument("--gate-seconds", type=float, default=0.3)
+    parser.add_argument("--spread-seconds", type=float, default=0.1,
+                        help="Clusters reach the switch uniformly within this window")
+    parser.add_argument("--fail", type=int, default=0, help="clusters whose gate fails at 50%%")
+    parser.add_argument("--broken", type=int, default=0,
+                        help="clusters whose record Route53 rejects, failing any change set it is in")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    print(f"{'clusters':>8} {'mode':>11} {'seconds':>8} {'changes':>8} {'largest':>8} {'get':>6} {'calls':>6}")
+
+    for n in args.clusters:
+        clusters = [
+            Cluster(name=f"bench-{i}", fleet="bench", version="1.29", is_canary=False,
+                    tenant="bench", env="prod", region="local")
+            for i in range(n)
+        ]
+
+        for mode in ["per-cluster", "batched"]:
+            elapsed, fake = run(mode, clusters, args)
+            print(
+                f"{n:>8} {mode:>11} {elapsed:>8.2f} {fake.calls['change_resource_record_sets']:>8} "
+                f"{max(size for _, size in fake.change_sets):>8} {fake.calls['get_change']:>6} "
+                f"{fake.total_calls():>6}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+import base64
+import json
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+class FakeApp:
+
+    def __init__(self, name, cluster, sync_seconds, degrade, operation_delay):
+        self.name = name
+        self.labels = {"cluster": cluster}
+        self.sync_seconds = sync_seconds
+        self.degrade = degrade
+        self.operation_delay = operation_delay
+
+        # Current operation: requested, finished (monotonic), started (RFC 3339)
+        self.requested_at = None
+        self.synced_at = None
+        self.started_at = None
+        # What the app showed before the current operation started
+        self.previous = ("OutOfSync", "Missing", None, None)
+
+    def status(self, now):
+        """(sync, health, operation phase, operation startedAt)."""
+
+        if self.requested_at is None or now < self.requested_at + self.operation_delay:
+            return self.previous
+        if now < self.synced_at:
+            return "OutOfSync", "Progressing", "Running", self.started_at
+        return "Synced", "Degraded" if self.degrade else "Healthy", "Succeeded", self.started_at
+
+    def sync(self, now):
+        """Starts a new operation; False while one is still running."""
+
+        if self.requested_at is not None and now < self.synced_at:
+            return False
+
+        self.previous = self.status(now)
+        self.requested_at = now
+        self.synced_at = now + self.operation_delay + self.sync_seconds
+        started = datetime.now(timezone.utc) + timedelta(seconds=self.operation_delay)
+        self.started_at = started.isoformat(timespec="microseconds").replace("+00:00", "Z")
+        return True
+
+
+class FakeArgoCD:
+    """
+    In-process ArgoCD API server stand-in.
+
+    Apps added with add_app() go OutOfSync/Missing -> Progressing on sync ->
+    Synced/Healthy (or Degraded) `sync_seconds` later, and every status
+    change is pushed to open /api/v1/stream/applications watches within
+    `stream_tick` seconds. Like the real controller, a sync's operation
+    only shows up `operation_delay` seconds after it was requested; until
+    then the app reports its previous operation. That includes re-syncs of
+    apps already Synced/Healthy (healthy=True in add_app). A sync while
+    an operation is running gets a 400 "already in progress". Session tokens are JWT-shaped and expire after
+    `token_ttl`; requests with an unknown or expired token get a 401.
+    Every request is counted in `calls`.
+    """
+
+    def __init__(self, username="admin", password="admin", token_ttl=3600,
+                 stream_tick=0.01, host="127.0.0.1", port=0):
+        self.username = username
+        self.password = password
+        self.token_ttl = token_ttl
+        self.stream_tick = stream_tick
+        self.stopping = threading.Event()
+
+        self.lock = threading.Lock()
+        self.apps = {}
+        self.apps_by_cluster = {}
+        self.clusters = {}
+        self.tokens = {}
+        self.calls = Counter()
+
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self.url = f"http://{host}:{self.server.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.stopping.set()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def total_calls(self):
+        with self.lock:
+            return sum(self.calls.values())
+
+    def add_app(self, name, cluster, sync_seconds=0.2, degrade=False, operation_delay=0.05, healthy=False):
+        with self.lock:
+            app = self.apps[name] = FakeApp(name, cluster, sync_seconds, degrade, operation_delay)
+            self.apps_by_cluster.setdefault(cluster, []).append(app)
+
+            if healthy:
+                # Synced by an earlier run
+                app.sync(time.monotonic() - operation_delay - sync_seconds)
+
+    def issue_token(self, ttl=None):
+        expires = time.time() + (self.token_ttl if ttl is None else ttl)
+        payload = base64.urlsafe_b64encode(json.dumps({"exp": int(expires)}).encode()).decode().rstrip("=")
+        token = f"e30.{payload}.{uuid.uuid4().hex}"
+
+        with self.lock:
+            self.tokens[token] = expires
+        return token
+
+    # -------------------------
+    # API
+    # -------------------------
+    def authorized(self, header):
+        token = (header or "").replace("Bearer ", "", 1)
+        with self.lock:
+            return self.tokens.get(token, 0) > time.time()
+
+    def list_apps(self, selector):
+        now = time.monotonic()
+        with self.lock:
+            return [self._app_json(a, now) for a in self._select(selector)]
+
+    def changed_apps(self, selector, seen):
+        """Apps whose status differs from `seen` (name -> status), updating it."""
+
+        now = time.monotonic()
+        with self.lock:
+            changed = []
+            for app in self._select(selector):
+                status = app.status(now)
+                if seen.get(app.name) != status:
+                    changed.append(("MODIFIED" if app.name in seen else "ADDED", self._app_json(app, now)))
+                    seen[app.name] = status
+            return changed
+
+    def _select(self, selector):
+        wanted = dict(part.split("=", 1) for part in selector.split(",") if part)
+        # Index lookup for the usual cluster=<name> selector
+        apps = self.apps_by_cluster.get(wanted["cluster"], []) if "cluster" in wanted else self.apps.values()
+        return [a for a in apps if all(a.labels.get(k) == v for k, v in wanted.items())]
+
+    def ready_at(self, cluster):
+        """When the last of a cluster's apps went Synced (monotonic), or None."""
+        with self.lock:
+            times = [a.synced_at for a in self.apps_by_cluster.get(cluster, [])]
+        return None if None in times else max(times, default=None)
+
+    def sync(self, name):
+        """True if a new operation started, False if one is running, None if no such app."""
+        with self.lock:
+            app = self.apps.get(name)
+            if app is None:
+                return None
+            return app.sync(time.monotonic())
+
+    @staticmethod
+    def _app_json(app, now):
+        sync, health, phase, started_at = app.status(now)
+        return {
+            "metadata": {"name": app.name, "labels": app.labels},
+            "status": {
+                "sync": {"status": sync},
+                "health": {"status": health},
+                "operationState": {"phase": phase, "startedAt": started_at} if phase else None
+            }
+        }
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            # Chunked responses, as the real API server streams watches
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _count(self, kind):
+                with fake.lock:
+                    fake.calls[kind] += 1
+
+            def _reply(self, status, body=None):
+                data = json.dumps(body or {}).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _body(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                return json.loads(self.rfile.read(length) or b"{}")
+
+            def _stream(self, selector):
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+
+                seen = {}
+                try:
+                    while not fake.stopping.is_set():
+                        for event_type, app in fake.changed_apps(selector, seen):
+                            event = {"type": event_type, "application": app}
+                            line = json.dumps({"result": event}).encode() + b"\n"
+                            self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+                        self.wfile.flush()
+                        time.sleep(fake.stream_tick)
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                self.close_connection = True
+
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                selector = parse_qs(parsed.query).get("selector", [""])[0]
+
+                if parsed.path == "/api/v1/stream/applications":
+                    self._count("stream")
+                    if not fake.authorized(self.headers.get("Authorization")):
+                        return self._reply(401, {"error": "invalid session"})
+                    return self._stream(selector)
+
+                if parsed.path != "/api/v1/applications":
+                    return self._reply(404)
+
+                self._count("list_apps")
+                if not fake.authorized(self.headers.get("Authorization")):
+                    return self._reply(401, {"error": "invalid session"})
+
+                self._reply(200, {"items": fake.list_apps(selector)})
+
+            def do_POST(self):
+                parsed = urlparse(self.path)
+                body = self._body()
+
+                if parsed.path == "/api/v1/session":
+                    self._count("login")
+                    if body.get("username") != fake.username or body.get("password") != fake.password:
+                        return self._reply(401, {"error": "invalid credentials"})
+                    return self._reply(200, {"token": fake.issue_token()})
+
+                sync = re.fullmatch(r"/api/v1/applications/([^/]+)/sync", parsed.path)
+                kind = "sync" if sync else "register" if parsed.path == "/api/v1/clusters" else None
+                if kind is None:
+                    return self._reply(404)
+
+                self._count(kind)
+                if not fake.authorized(self.headers.get("Authorization")):
+                    return self._reply(401, {"error": "invalid session"})
+
+                if sync:
+                    started = fake.sync(sync.group(1))
+                    if started is None:
+                        return self._reply(404)
+                    if not started:
+                        return self._reply(400, {"error": "another operation is already in progress"})
+                    return self._reply(200)
+
+                with fake.lock:
+                    fake.clusters[body["name"]] = body
+                self._reply(200, body)
+
+        return Handler
@@ -0,0 +1,278 @@
+import copy
+import re
+import threading
+from collections import Counter
+from types import SimpleNamespace
+from botocore.exceptions import ClientError
+
+TOKEN = re.compile(r"\s*(<>|<=|>=|[=<>(),]|[#:]?[A-Za-z_][A-Za-z0-9_]*)")
+COMPARATORS = {
+    "=": lambda a, b: a == b,
+    "<>": lambda a, b: a != b,
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b
+}
+
+
+def tokenize(expression):
+    tokens, pos = [], 0
+    expression = expression.strip()
+    while pos < len(expression):
+        match = TOKEN.match(expression, pos)
+        if not match:
+            raise ValueError(f"Cannot parse expression at: {expression[pos:]}")
+        tokens.append(match.group(1))
+        pos = match.end()
+    return tokens
+
+
+class Condition:
+    """
+    Evaluates the subset of DynamoDB condition expressions the state
+    manager uses: comparisons, AND/OR/NOT, parentheses and
+    attribute_exists / attribute_not_exists.
+    """
+
+    def __init__(self, expression, names=None, values=None):
+        self.tokens = tokenize(expression)
+        self.names = names or {}
+        self.values = values or {}
+
+    def evaluate(self, item):
+        self.item = item or {}
+        self.pos = 0
+        result = self._or()
+        if self.pos != len(self.tokens):
+            raise ValueError(f"Unexpected token {self.tokens[self.pos]}")
+        return result
+
+    def _peek(self):
+        return self.tokens[self.pos].upper() if self.pos < len(self.tokens) else None
+
+    def _take(self):
+        self.pos += 1
+        return self.tokens[self.pos - 1]
+
+    def _or(self):
+        result = self._and()
+        while self._peek() == "OR":
+            self._take()
+            right = self._and()
+            result = result or right
+        return result
+
+    def _and(self):
+        result = self._not()
+        while self._peek() == "AND":
+            self._take()
+            right = self._not()
+            result = result and right
+        return result
+
+    def _not(self):
+        if self._peek() == "NOT":
+            self._take()
+            return not self._not()
+        return self._primary()
+
+    def _primary(self):
+
+        if self._peek() == "(":
+            self._take()
+            result = self._or()
+            self._take()  # ")"
+            return result
+
+        if self._peek() in ("ATTRIBUTE_EXISTS", "ATTRIBUTE_NOT_EXISTS"):
+            function = self._take().lower()
+            self._take()  # "("
+            name = self._name(self._take())
+            self._take()  # ")"
+            exists = name in self.item
+            return exists if function == "attribute_exists" else not exists
+
+        left = self._operand(self._take())
+        comparator = self._take()
+        right = self._operand(self._take())
+
+        # Comparisons against a missing attribute are false in DynamoDB
+        if left is None or right is None:
+            return False
+        return COMPARATORS[comparator](left, right)
+
+    def _name(self, token):
+        return self.names.get(token, token)
+
+    def _operand(self, token):
+        if token.startswith(":"):
+            return self.values[token]
+        return self.item.get(self._name(token))
+
+
+def apply_update(item, expression, names=None, values=None):
+    """Applies a `SET a = :v, ... REMOVE b, ...` update expression in place."""
+
+    names = names or {}
+    values = values or {}
+
+    for action, body in re.findall(r"(SET|REMOVE)\s+(.*?)(?=\s+(?:SET|REMOVE)\s|$)", expression.strip()):
+        for part in body.split(","):
+            part = part.strip()
+            if action == "SET":
+                name, value = [p.strip() for p in part.split("=", 1)]
+                item[names.get(name, name)] = copy.deepcopy(values[value])
+            else:
+                item.pop(names.get(part, part), None)
+
+
+def conditional_check_failed(operation):
+    return ClientError(
+        {"Error": {"Code": "ConditionalCheckFailedException", "Message": "The conditional request failed"}},
+        operation
+    )
+
+
+class FakeTable:
+
+    def __init__(self, db, name, hash_key, range_key, page_size):
+        self.db = db
+        self.name = name
+        self.hash_key = hash_key
+        self.range_key = range_key
+        self.page_size = page_size
+        self.items = {}
+
+    def _key(self, key):
+        return key[self.hash_key], key[self.range_key]
+
+    def _check(self, current, kwargs, operation):
+        expression = kwargs.get("ConditionExpression")
+        if expression and not Condition(
+            expression, kwargs.get("ExpressionAttributeNames"), kwargs.get("ExpressionAttributeValues")
+        ).evaluate(current):
+            raise conditional_check_failed(operation)
+
+    def put_item(self, Item, **kwargs):
+        with self.db.lock:
+            self.db.calls["put_item"] += 1
+            key = self._key(Item)
+            self._check(self.items.get(key), kwargs, "PutItem")
+            self.items[key] = copy.deepcopy(Item)
+        return {}
+
+    def get_item(self, Key, **kwargs):
+        with self.db.lock:
+            self.db.calls["get_item"] += 1
+            item = self.items.get(self._key(Key))
+            return {"Item": copy.deepcopy(item)} if item else {}
+
+    def update_item(self, Key, UpdateExpression, ReturnValues="NONE", **kwargs):
+        with self.db.lock:
+            self.db.calls["update_item"] += 1
+            return self._update(Key, UpdateExpression, ReturnValues, kwargs)
+
+    def _update(self, key, expression, return_values, kwargs):
+        current = self.items.get(self._key(key))
+        self._check(current, kwargs, "UpdateItem")
+
+        item = copy.deepcopy(current) if current else dict(key)
+        apply_update(item, expression, kwargs.get("ExpressionAttributeNames"), kwargs.get("ExpressionAttributeValues"))
+        self.items[self._key(key)] = item
+
+        return {"Attributes": copy.deepcopy(item)} if return_values == "ALL_NEW" else {}
+
+    def query(self, KeyConditionExpression, ExclusiveStartKey=None, **kwargs):
+
+        # Only Key(hash_key).eq(value), which is all the state manager issues
+        key, value = KeyConditionExpression.get_expression()["values"]
+
+        with self.db.lock:
+            self.db.calls["query"] += 1
+            matching = sorted(
+                (k, item) for k, item in self.items.items()
+                if item.get(key.name) == value
+            )
+
+        if ExclusiveStartKey:
+            start = self._key(ExclusiveStartKey)
+            matching = [(k, item) for k, item in matching if k > start]
+
+        page = matching[:self.page_size]
+        response = {"Items": [copy.deepcopy(item) for _, item in page], "Count": len(page)}
+
+        if len(matching) > self.page_size:
+            last = page[-1][1]
+            response["LastEvaluatedKey"] = {self.hash_key: last[self.hash_key], self.range_key: last[self.range_key]}
+
+        return response
+
+
+class FakeDynamoDBClient:
+
+    def __init__(self, db):
+        self.db = db
+
+    def transact_write_items(self, TransactItems):
+
+        with self.db.lock:
+            self.db.calls["transact_write_items"] += 1
+
+            updates = [t["Update"] for t in TransactItems]
+            reasons, failed = [], False
+
+            for update in updates:
+                table = self.db.Table(update["TableName"])
+                try:
+                    table._check(table.items.get(table._key(update["Key"])), update, "TransactWriteItems")
+                    reasons.append({"Code": "None"})
+                except ClientError:
+                    reasons.append({"Code": "ConditionalCheckFailed"})
+                    failed = True
+
+            if failed:
+                raise ClientError(
+                    {
+                        "Error": {"Code": "TransactionCanceledException", "Message": "Transaction cancelled"},
+                        "CancellationReasons": reasons
+                    },
+                    "TransactWriteItems"
+                )
+
+            for update in updates:
+                self.db.Table(update["TableName"])._update(
+                    update["Key"], update["UpdateExpression"], "NONE", update
+                )
+
+        return {}
+
+
+class FakeDynamoDB:
+    """
+    In-memory stand-in for the boto3 DynamoDB resource, covering what the
+    state manager uses: conditional put/update, get, paginated Query and
+    TransactWriteItems (via .meta.client). Every operation is counted in
+    `calls`.
+    """
+
+    def __init__(self, hash_key="tenant_env", range_key="cluster_name", page_size=100):
+        self.hash_key = hash_key
+        self.range_key = range_key
+        self.page_size = page_size
+
+        # Re-entrant: transactions validate through the table helpers
+        self.lock = threading.RLock()
+        self.tables = {}
+        self.calls = Counter()
+        self.meta = SimpleNamespace(client=FakeDynamoDBClient(self))
+
+    def Table(self, name):
+        with self.lock:
+            if name not in self.tables:
+                self.tables[name] = FakeTable(self, name, self.hash_key, self.range_key, self.page_size)
+            return self.tables[name]
+
+    def total_calls(self):
+        with self.lock:
+            return sum(self.calls.values())
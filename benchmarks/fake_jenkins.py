@@ -0,0 +1,432 @@
+import heapq
+import json
+import math
+import random
+import re
+import threading
+import time
+import urllib.request
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+class FakeBuild:
+
+    def __init__(self, job_name, queue_id, queued_at, queue_seconds, build_seconds, result):
+        self.job_name = job_name
+        self.queue_id = queue_id
+        self.queued_at = queued_at
+        self.queue_seconds = queue_seconds
+        self.build_seconds = build_seconds
+        self.final_result = result
+        self.number = None
+        # When an executor picked it up
+        self.started_at = None
+        # Taken off the queue (cancelItem) / aborted while running (stop)
+        self.cancelled = False
+        self.stopped_at = None
+        # Notification phases already posted
+        self.notified = set()
+
+    def ready_at(self):
+        return self.queued_at + self.queue_seconds
+
+    def finished_at(self):
+        return self.stopped_at if self.stopped_at is not None else self.started_at + self.build_seconds
+
+    def result(self, now):
+        if self.started_at is None:
+            return None
+        if self.stopped_at is not None:
+            return "ABORTED"
+        if now >= self.finished_at():
+            return self.final_result
+        return None
+
+
+class FakeJenkins:
+    """
+    In-process Jenkins stand-in covering the queue -> build lifecycle.
+
+    Queue and build durations are drawn per trigger from the given
+    (min, max) ranges, uniformly or, with distribution="lognormal", with
+    the range midpoint as median and a long tail past max. `failure_rate`
+    of builds finish as FAILURE. Queued items can be cancelled and running
+    builds stopped (result ABORTED), as the fast-abort path does.
+    With `executors` set, a build also waits in the queue until one is
+    free, and /computer/api/json reports busy/total executors.
+    enable_notifications() makes it post Notification plugin STARTED /
+    COMPLETED payloads to a URL, dropping `drop_rate` of them.
+    Every request is counted in `calls`, keyed by endpoint kind.
+    """
+
+    # Reported as totalExecutors when executors is unlimited
+    UNLIMITED_EXECUTORS = 10_000
+
+    def __init__(self, queue_seconds=(0.1, 0.2), build_seconds=(0.5, 1.0),
+                 failure_rate=0.0, seed=None, distribution="uniform", executors=None,
+                 host="127.0.0.1", port=0):
+        self.queue_seconds = queue_seconds
+        self.build_seconds = build_seconds
+        self.executors = executors
+        self.distribution = distribution
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+
+        self.lock = threading.Lock()
+        self.builds = {}
+        self.next_queue_id = 1
+        self.next_build_number = Counter()
+        self.calls = Counter()
+
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self.url = f"http://{host}:{self.server.server_address[1]}"
+        self._thread = None
+
+        self.notify_url = None
+        self.notify_tick = 0.01
+        self.drop_rate = 0.0
+        self._stopping = threading.Event()
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopping.set()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def enable_notifications(self, url, drop_rate=0.0):
+        self.notify_url = url
+        self.drop_rate = drop_rate
+        threading.Thread(target=self._notify_loop, daemon=True).start()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def total_calls(self):
+        with self.lock:
+            return sum(self.calls.values())
+
+    # -------------------------
+    # Lifecycle
+    # -------------------------
+    def trigger(self, job_name):
+        with self.lock:
+            queue_id = self.next_queue_id
+            self.next_queue_id += 1
+
+            failed = self.random.random() < self.failure_rate
+            self.builds[queue_id] = FakeBuild(
+                job_name=job_name,
+                queue_id=queue_id,
+                queued_at=time.monotonic(),
+                queue_seconds=self._draw(self.queue_seconds),
+                build_seconds=self._draw(self.build_seconds),
+                result="FAILURE" if failed else "SUCCESS"
+            )
+            return queue_id
+
+    def _draw(self, bounds):
+        low, high = bounds
+        if self.distribution == "lognormal" and high > 0:
+            median = (low + high) / 2
+            return max(low, self.random.lognormvariate(math.log(median), 0.5))
+        return self.random.uniform(low, high)
+
+    def _started_builds(self, now):
+        # Start builds lazily, in queue order, numbering them like Jenkins does
+        waiting = sorted(
+            (b for b in self.builds.values() if b.started_at is None and not b.cancelled),
+            key=FakeBuild.ready_at
+        )
+        if not waiting:
+            return
+
+        busy = []
+        if self.executors is not None:
+            busy = [
+                b.finished_at() for b in self.builds.values()
+                if b.started_at is not None and b.finished_at() > waiting[0].ready_at()
+            ]
+            heapq.heapify(busy)
+
+        for build in waiting:
+            start = build.ready_at()
+
+            if self.executors is not None:
+                while busy and busy[0] <= start:
+                    heapq.heappop(busy)
+                # Waits for the earliest executor to free up
+                while len(busy) >= self.executors:
+                    start = heapq.heappop(busy)
+
+            if start > now:
+                break
+
+            build.started_at = start
+            self.next_build_number[build.job_name] += 1
+            build.number = self.next_build_number[build.job_name]
+
+            if self.executors is not None:
+                heapq.heappush(busy, build.finished_at())
+
+    def computer_json(self):
+        now = time.monotonic()
+        with self.lock:
+            self._started_builds(now)
+            busy = sum(1 for b in self.builds.values() if b.started_at is not None and b.result(now) is None)
+            total = self.executors if self.executors is not None else self.UNLIMITED_EXECUTORS
+            return {"busyExecutors": busy, "totalExecutors": total}
+
+    def finished_at(self, queue_id):
+        """Monotonic time the build finished, or None."""
+        now = time.monotonic()
+        with self.lock:
+            self._started_builds(now)
+            build = self.builds.get(queue_id)
+            return build.finished_at() if build and build.result(now) else None
+
+    # -------------------------
+    # Notifications
+    # -------------------------
+    def _notify_loop(self):
+
+        while not self._stopping.wait(self.notify_tick):
+            now = time.monotonic()
+            due = []
+
+            with self.lock:
+                self._started_builds(now)
+                for build in self.builds.values():
+                    if build.started_at is None:
+                        continue
+                    for phase in ("STARTED", "COMPLETED"):
+                        if phase in build.notified or (phase == "COMPLETED" and not build.result(now)):
+                            continue
+                        build.notified.add(phase)
+                        if self.random.random() >= self.drop_rate:
+                            due.append(self._notification(build, phase, now))
+
+            for payload in due:
+                self._post_notification(payload)
+
+    def _notification(self, build, phase, now):
+        # The Notification plugin's JSON format
+        build_json = self._build_json(build, now)
+        return {
+            "name": build.job_name,
+            "url": f"job/{build.job_name}/",
+            "build": {
+                "full_url": build_json["url"],
+                "number": build.number,
+                "queue_id": build.queue_id,
+                "timestamp": build_json["timestamp"],
+                "phase": phase,
+                "status": build_json["result"] if phase == "COMPLETED" else None,
+                "url": f"job/{build.job_name}/{build.number}/"
+            }
+        }
+
+    def _post_notification(self, payload):
+
+        request = urllib.request.Request(
+            self.notify_url,
+            data=json.dumps(payload).encode(),
+            headers={"Content-Type": "application/json"},
+            method="POST"
+        )
+
+        with self.lock:
+            self.calls["notify"] += 1
+
+        try:
+            urllib.request.urlopen(request, timeout=2).close()
+        except OSError:
+            pass  # Jenkins doesn't retry either; polling has to catch it
+
+    def queue_waits(self):
+        """Seconds each started build spent in the queue."""
+        with self.lock:
+            return [b.started_at - b.queued_at for b in self.builds.values() if b.started_at is not None]
+
+    def _build_json(self, build, now):
+        return {
+            "number": build.number,
+            "url": f"{self.url}/job/{build.job_name}/{build.number}/",
+            "queueId": build.queue_id,
+            # Epoch ms the build started, as Jenkins reports it
+            "timestamp": int((time.time() - (now - build.started_at)) * 1000),
+            "building": build.result(now) is None,
+            "result": build.result(now)
+        }
+
+    def queue_json(self):
+        now = time.monotonic()
+        with self.lock:
+            self._started_builds(now)
+            return {
+                "items": [
+                    {"id": b.queue_id, "task": {"name": b.job_name}}
+                    for b in self.builds.values() if b.started_at is None and not b.cancelled
+                ]
+            }
+
+    def queue_item_json(self, queue_id):
+        now = time.monotonic()
+        with self.lock:
+            self._started_builds(now)
+            build = self.builds.get(queue_id)
+            if not build:
+                return None
+            item = {"id": queue_id, "cancelled": build.cancelled, "executable": None}
+            if build.number is not None:
+                item["executable"] = {
+                    "number": build.number,
+                    "url": f"{self.url}/job/{build.job_name}/{build.number}/"
+                }
+            return item
+
+    def job_json(self, job_name, limit):
+        now = time.monotonic()
+        with self.lock:
+            self._started_builds(now)
+            builds = [
+                b for b in self.builds.values()
+                if b.job_name == job_name and b.number is not None
+            ]
+            builds.sort(key=lambda b: b.number, reverse=True)
+            return {"builds": [self._build_json(b, now) for b in builds[:limit]]}
+
+    def cancel_item(self, queue_id):
+        now = time.monotonic()
+        with self.lock:
+            self._started_builds(now)
+            build = self.builds.get(queue_id)
+            # Jenkins ignores items that already left the queue
+            if build and build.started_at is None:
+                build.cancelled = True
+            return build is not None
+
+    def stop_build(self, job_name, number):
+        now = time.monotonic()
+        with self.lock:
+            for build in self.builds.values():
+                if build.job_name == job_name and build.number == number:
+                    if build.result(now) is None:
+                        build.stopped_at = now
+                    return True
+            return False
+
+    def build_json(self, job_name, number):
+        now = time.monotonic()
+        with self.lock:
+            self._started_builds(now)
+            for build in self.builds.values():
+                if build.job_name == job_name and build.number == number:
+                    return self._build_json(build, now)
+            return None
+
+    # -------------------------
+    # HTTP
+    # -------------------------
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body=None, headers=None):
+                payload = json.dumps(body).encode() if body is not None else b""
+                self.send_response(status)
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _count(self, kind):
+                with fake.lock:
+                    fake.calls[kind] += 1
+
+            def do_POST(self):
+                path = urlparse(self.path).path
+                m = re.fullmatch(r"/job/([^/]+)/buildWithParameters", path)
+                if m:
+                    self._count("trigger")
+                    queue_id = fake.trigger(m.group(1))
+                    self._send(201, headers={"Location": f"{fake.url}/queue/item/{queue_id}/"})
+                    return
+
+                if path == "/queue/cancelItem":
+                    self._count("cancel")
+                    queue_id = int(parse_qs(urlparse(self.path).query).get("id", ["0"])[0])
+                    self._send(204 if fake.cancel_item(queue_id) else 404)
+                    return
+
+                m = re.fullmatch(r"/job/([^/]+)/(\d+)/stop", path)
+                if m:
+                    self._count("stop")
+                    self._send(200 if fake.stop_build(m.group(1), int(m.group(2))) else 404)
+                    return
+
+                self._send(404, {})
+
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                path = parsed.path
+                query = parse_qs(parsed.query)
+
+                if path == "/crumbIssuer/api/json":
+                    self._count("crumb")
+                    self._send(200, {"crumbRequestField": "Jenkins-Crumb", "crumb": "fake-crumb"})
+                    return
+
+                if path == "/computer/api/json":
+                    self._count("computer")
+                    self._send(200, fake.computer_json())
+                    return
+
+                if path == "/queue/api/json":
+                    self._count("queue")
+                    self._send(200, fake.queue_json())
+                    return
+
+                m = re.fullmatch(r"/queue/item/(\d+)/api/json", path)
+                if m:
+                    self._count("queue_item")
+                    item = fake.queue_item_json(int(m.group(1)))
+                    self._send(200 if item else 404, item or {})
+                    return
+
+                m = re.fullmatch(r"/job/([^/]+)/api/json", path)
+                if m:
+                    self._count("job_builds")
+                    limit = 100
+                    tree = query.get("tree", [""])[0]
+                    window = re.search(r"\{0,(\d+)\}", tree)
+                    if window:
+                        limit = int(window.group(1))
+                    self._send(200, fake.job_json(m.group(1), limit))
+                    return
+
+                m = re.fullmatch(r"/job/([^/]+)/(\d+)/api/json", path)
+                if m:
+                    self._count("build")
+                    build = fake.build_json(m.group(1), int(m.group(2)))
+                    self._send(200 if build else 404, build or {})
+                    return
+
+                self._send(404, {})
+
+        return Handler
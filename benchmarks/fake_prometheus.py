@@ -0,0 +1,101 @@
+import json
+import re
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+class FakePrometheus:
+    """
+    In-process stand-in for a Prometheus /api/v1/query endpoint.
+
+    Understands the batched bake query: every label_replace(..., "signal",
+    "<name>", ...) arm yields one sample per cluster named in the
+    cluster=~"a|b" matcher, valued from set() (default 0), except for
+    silenced clusters, which return nothing.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0):
+        self.lock = threading.Lock()
+        self.values = {}
+        self.silent = set()
+        self.calls = Counter()
+
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self.url = f"http://{host}:{self.server.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def set(self, cluster, signal, value):
+        with self.lock:
+            self.values[(cluster, signal)] = value
+
+    def silence(self, cluster):
+        """cluster stops reporting: no series at all for it."""
+        with self.lock:
+            self.silent.add(cluster)
+
+    def evaluate(self, promql):
+
+        signals = re.findall(r'"signal", "([^"]+)"', promql)
+        matcher = re.search(r'cluster=~"([^"]*)"', promql)
+        clusters = [c.replace("\\\\", "\\") for c in matcher.group(1).split("|")] if matcher else []
+        clusters = [re.sub(r"\\(.)", r"\1", c) for c in clusters]
+
+        with self.lock:
+            return [
+                {
+                    "metric": {"cluster": cluster, "signal": signal},
+                    "value": [0, str(self.values.get((cluster, signal), 0))]
+                }
+                for signal in signals
+                for cluster in clusters
+                if cluster not in self.silent
+            ]
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                parsed = urlparse(self.path)
+
+                if parsed.path != "/api/v1/query":
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+
+                with fake.lock:
+                    fake.calls["query"] += 1
+
+                promql = parse_qs(parsed.query).get("query", [""])[0]
+                body = json.dumps({
+                    "status": "success",
+                    "data": {"resultType": "vector", "result": fake.evaluate(promql)}
+                }).encode()
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
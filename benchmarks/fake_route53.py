@@ -0,0 +1,150 @@
+import copy
+import itertools
+import threading
+import time
+from collections import Counter
+from botocore.exceptions import ClientError
+
+
+def route53_error(code, message, operation):
+    return ClientError({"Error": {"Code": code, "Message": message}}, operation)
+
+
+def normalize(name):
+    return name.rstrip(".").lower() + "."
+
+
+class FakeRoute53:
+    """
+    In-memory stand-in for the boto3 Route53 client, covering what the
+    traffic service uses: ChangeResourceRecordSets (all-or-nothing, at
+    most one change per record and 1000 changes per request, UPSERT
+    counting twice, records marked with reject() failing the whole set), GetChange (PENDING until propagation_seconds after
+    the change) and ListResourceRecordSets. Every operation is counted in
+    `calls`; every applied change set is kept in `change_sets`.
+    """
+
+    def __init__(self, propagation_seconds=0.5):
+        self.propagation_seconds = propagation_seconds
+
+        self.lock = threading.Lock()
+        self.zones = {}
+        self.changes = {}
+        self.change_sets = []
+        self.calls = Counter()
+        self.rejected = set()
+        self._ids = itertools.count(1)
+
+    def add_weighted_pair(self, zone_id, name, blue_value, green_value, blue="blue", green="green", type="CNAME"):
+        """Blue at weight 100 and green at 0, as Terraform leaves them before a switch."""
+
+        records = self.zones.setdefault(zone_id, {})
+        for set_identifier, value, weight in [(blue, blue_value, 100), (green, green_value, 0)]:
+            records[(normalize(name), type, set_identifier)] = {
+                "Name": normalize(name),
+                "Type": type,
+                "SetIdentifier": set_identifier,
+                "Weight": weight,
+                "TTL": 60,
+                "ResourceRecords": [{"Value": value}]
+            }
+
+    def reject(self, name):
+        """Any change set touching name fails as a whole (e.g. the record drifted out of band)."""
+        self.rejected.add(normalize(name))
+
+    def weights(self, zone_id, name):
+        with self.lock:
+            return {
+                key[2]: record["Weight"]
+                for key, record in self.zones.get(zone_id, {}).items()
+                if key[0] == normalize(name)
+            }
+
+    def change_resource_record_sets(self, HostedZoneId, ChangeBatch):
+
+        with self.lock:
+            self.calls["change_resource_record_sets"] += 1
+
+            records = self.zones.get(HostedZoneId)
+            if records is None:
+                raise route53_error("NoSuchHostedZone", f"No hosted zone {HostedZoneId}", "ChangeResourceRecordSets")
+
+            changes = ChangeBatch["Changes"]
+            if sum(2 if c["Action"] == "UPSERT" else 1 for c in changes) > 1000:
+                raise route53_error("InvalidChangeBatch", "Too many changes", "ChangeResourceRecordSets")
+
+            # Validated as a whole before anything is applied
+            updated = dict(records)
+            seen = set()
+
+            for change in changes:
+                record = copy.deepcopy(change["ResourceRecordSet"])
+                record["Name"] = normalize(record["Name"])
+                key = (record["Name"], record["Type"], record.get("SetIdentifier"))
+
+                if key in seen:
+                    raise route53_error(
+                        "InvalidChangeBatch",
+                        f"Duplicate change for {key[0]} {key[1]} {key[2]}",
+                        "ChangeResourceRecordSets"
+                    )
+                seen.add(key)
+
+                if key[0] in self.rejected:
+                    raise route53_error(
+                        "InvalidChangeBatch",
+                        f"RRSet {key[0]} {key[1]} {key[2]} does not match the existing record",
+                        "ChangeResourceRecordSets"
+                    )
+
+                if change["Action"] == "DELETE":
+                    if key not in updated:
+                        raise route53_error("InvalidChangeBatch", f"{key[0]} not found", "ChangeResourceRecordSets")
+                    del updated[key]
+                elif change["Action"] == "CREATE" and key in updated:
+                    raise route53_error("InvalidChangeBatch", f"{key[0]} already exists", "ChangeResourceRecordSets")
+                else:
+                    updated[key] = record
+
+            self.zones[HostedZoneId] = updated
+
+            change_id = f"/change/C{next(self._ids):08d}"
+            self.changes[change_id] = time.monotonic() + self.propagation_seconds
+            self.change_sets.append((HostedZoneId, len(changes)))
+
+            return {"ChangeInfo": {"Id": change_id, "Status": "PENDING", "Comment": ChangeBatch.get("Comment", "")}}
+
+    def get_change(self, Id):
+
+        with self.lock:
+            self.calls["get_change"] += 1
+
+            if Id not in self.changes:
+                raise route53_error("NoSuchChange", f"No change {Id}", "GetChange")
+
+            status = "INSYNC" if time.monotonic() >= self.changes[Id] else "PENDING"
+            return {"ChangeInfo": {"Id": Id, "Status": status}}
+
+    def list_resource_record_sets(self, HostedZoneId, StartRecordName=None, MaxItems="300", **kwargs):
+
+        with self.lock:
+            self.calls["list_resource_record_sets"] += 1
+
+            records = self.zones.get(HostedZoneId)
+            if records is None:
+                raise route53_error("NoSuchHostedZone", f"No hosted zone {HostedZoneId}", "ListResourceRecordSets")
+
+            start = normalize(StartRecordName) if StartRecordName else ""
+            matching = [copy.deepcopy(records[key]) for key in sorted(records) if key[0] >= start]
+
+        limit = int(MaxItems)
+        return {
+            "ResourceRecordSets": matching[:limit],
+            "IsTruncated": len(matching) > limit,
+            "MaxItems": MaxItems
+        }
+
+    def total_calls(self):
+        with self.lock:
+            return sum(self.calls.values())
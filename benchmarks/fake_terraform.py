@@ -0,0 +1,213 @@
+"""
+Stand-in for the terraform CLI, run as a real subprocess through a
+`terraform` shim on PATH (see install()), so TerraformService drives it
+exactly as it drives Terraform.
+
+init reads the working dir's .terraform.lock.hcl and "downloads" every
+provider it pins (FAKE_TF_PROVIDER_BYTES at FAKE_TF_BYTES_PER_SECOND),
+into TF_PLUGIN_CACHE_DIR when that is set, linking from the cache when
+the provider is already there. Two processes writing the same cache
+entry at once is what corrupts a real plugin cache; the fake detects it,
+fails the init and records a conflict.
+
+Every download and conflict is appended to FAKE_TF_LOG, one line each.
+
+plan and apply print Terraform's human output for FAKE_TF_RESOURCES
+resources (see resources()), each line padded to FAKE_TF_LINE_BYTES.
+With FAKE_TF_HANG_AFTER set they stop after that many lines, start a
+child "provider plugin" process (pid in FAKE_TF_CHILD_PID) and hang; with
+FAKE_TF_IGNORE_TERM set they also ignore SIGTERM, like a wedged plugin.
+"""
+import os
+import re
+import signal
+import subprocess
+import sys
+import time
+
+PROVIDER = re.compile(r'provider\s+"([^"]+)"\s*\{\s*version\s*=\s*"([^"]+)"')
+
+PLATFORM = "linux_amd64"
+
+
+def install(bin_dir):
+    """Writes the `terraform` shim into bin_dir and puts it first on PATH."""
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    shim = os.path.join(bin_dir, "terraform")
+
+    with open(shim, "w") as f:
+        f.write(f'#!/bin/sh\nPYTHONPATH="{root}" exec "{sys.executable}" -m benchmarks.fake_terraform "$@"\n')
+    os.chmod(shim, 0o755)
+
+    os.environ["PATH"] = bin_dir + os.pathsep + os.environ.get("PATH", "")
+    return shim
+
+
+def write_lock_file(working_dir, providers):
+    """providers: {"registry.terraform.io/hashicorp/aws": "5.31.0", ...}"""
+
+    os.makedirs(working_dir, exist_ok=True)
+    with open(os.path.join(working_dir, ".terraform.lock.hcl"), "w") as f:
+        for name, version in sorted(providers.items()):
+            f.write(f'provider "{name}" {{\n  version = "{version}"\n}}\n\n')
+
+
+def read_log(path):
+    """Counts of each event kind in FAKE_TF_LOG, plus bytes downloaded."""
+
+    counts = {"download": 0, "conflict": 0, "bytes": 0}
+    if not os.path.exists(path):
+        return counts
+
+    with open(path) as f:
+        for line in f:
+            kind, _, size = line.split()
+            counts[kind] += 1
+            counts["bytes"] += int(size)
+    return counts
+
+
+def log(kind, name, size=0):
+    path = os.environ.get("FAKE_TF_LOG")
+    if path:
+        # One short O_APPEND write per line, so concurrent processes never interleave
+        with open(path, "a") as f:
+            f.write(f"{kind} {name} {size}\n")
+
+
+def download(target):
+    size = int(os.environ.get("FAKE_TF_PROVIDER_BYTES", 2 * 2**20))
+    rate = float(os.environ.get("FAKE_TF_BYTES_PER_SECOND", 50 * 2**20))
+
+    time.sleep(size / rate)
+    os.makedirs(target, exist_ok=True)
+    with open(os.path.join(target, "terraform-provider"), "wb") as f:
+        f.write(b"\0" * size)
+    return size
+
+
+def init():
+
+    lock_file = ".terraform.lock.hcl"
+    providers = PROVIDER.findall(open(lock_file).read()) if os.path.exists(lock_file) else []
+    cache = os.environ.get("TF_PLUGIN_CACHE_DIR")
+
+    print("Initializing provider plugins...", flush=True)
+
+    for name, version in providers:
+        local = os.path.join(".terraform", "providers", name, version, PLATFORM)
+        if os.path.lexists(local):
+            continue
+
+        if not cache:
+            print(f"- Installing {name} v{version}...", flush=True)
+            log("download", name, download(local))
+            continue
+
+        entry = os.path.join(cache, name, version, PLATFORM)
+
+        if not os.path.exists(entry):
+            os.makedirs(os.path.dirname(entry), exist_ok=True)
+            try:
+                marker = os.open(entry + ".writing", os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                log("conflict", name)
+                print(f"Error: Failed to install provider {name}: text file busy", flush=True)
+                return 1
+
+            try:
+                print(f"- Installing {name} v{version} into the plugin cache...", flush=True)
+                log("download", name, download(entry))
+            finally:
+                os.close(marker)
+                os.remove(entry + ".writing")
+        else:
+            print(f"- Using {name} v{version} from the shared cache directory", flush=True)
+
+        os.makedirs(os.path.dirname(local), exist_ok=True)
+        os.symlink(os.path.abspath(entry), local)
+
+    print("Terraform has been successfully initialized!", flush=True)
+    return 0
+
+
+def resources(count):
+    """[(address, action, elapsed seconds, Terraform's elapsed text), ...] for count resources."""
+
+    planned = []
+    for i in range(count):
+        action = "modify" if i % 3 == 0 else "create"
+        seconds = (i % 5) * 60 + i % 50 + 1
+        text = f"{seconds // 60}m{seconds % 60}s" if seconds >= 60 else f"{seconds}s"
+        planned.append((f"module.eks.aws_resource.r[{i}]", action, seconds, text))
+    return planned
+
+
+def lines(command):
+
+    planned = resources(int(os.environ.get("FAKE_TF_RESOURCES", 10)))
+    adds = sum(1 for _, action, _, _ in planned if action == "create")
+    changes = len(planned) - adds
+
+    if command == "plan":
+        for address, action, _, _ in planned:
+            yield f"  # {address} will be {'created' if action == 'create' else 'updated in-place'}"
+        yield f"Plan: {adds} to add, {changes} to change, 0 to destroy."
+        return
+
+    for address, action, _, text in planned:
+        yield f"{address}: {'Creating' if action == 'create' else 'Modifying'}..."
+        yield f"{address}: {'Creation' if action == 'create' else 'Modifications'} complete after {text} [id=i-{len(address):08x}]"
+    yield f"Apply complete! Resources: {adds} added, {changes} changed, 0 destroyed."
+
+
+def plan_or_apply(command):
+
+    padding = int(os.environ.get("FAKE_TF_LINE_BYTES", 0))
+    hang_after = os.environ.get("FAKE_TF_HANG_AFTER")
+
+    if os.environ.get("FAKE_TF_IGNORE_TERM"):
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+
+    for n, line in enumerate(lines(command)):
+        if hang_after is not None and n == int(hang_after):
+            hang()
+        # Padded lines still parse: the summaries are matched with search()
+        print(line if len(line) >= padding else line + " " * (padding - len(line)), flush=padding == 0)
+
+    sys.stdout.flush()
+    # -detailed-exitcode: 2 = changes present
+    return 2 if command == "plan" else 0
+
+
+def hang():
+    sys.stdout.flush()
+
+    # Same process group, like the provider plugins terraform starts
+    child = subprocess.Popen(["sleep", "3600"])
+    path = os.environ.get("FAKE_TF_CHILD_PID")
+    if path:
+        with open(path, "w") as f:
+            f.write(str(child.pid))
+
+    while True:
+        time.sleep(3600)
+
+
+def main(argv):
+
+    command = argv[0] if argv else ""
+
+    if command == "init":
+        return init()
+
+    if command in ("plan", "apply"):
+        return plan_or_apply(command)
+
+    print(f"fake terraform: unsupported command {command!r}", flush=True)
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))